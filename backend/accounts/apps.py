@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        from .revocation import record_blacklisted
+
+        post_save.connect(record_blacklisted, sender=BlacklistedToken, dispatch_uid="accounts.revocation")
+
+        from .authentication import user_changed
+
+        User = self.get_model("User")
+        post_save.connect(user_changed, sender=User, dispatch_uid="accounts.authentication.save")
+        post_delete.connect(user_changed, sender=User, dispatch_uid="accounts.authentication.delete")
@@ -0,0 +1,54 @@
+"""
+DRF views with coroutine handlers.
+
+DRF's ``APIView`` only dispatches to synchronous handlers, so under ASGI
+Django runs the whole view on a thread through ``sync_to_async``. While a
+request waits on a password hash or a query, it holds that thread.
+``AsyncAPIView`` awaits its ``async def`` handlers on the event loop
+instead. Handlers should use the async ORM (``aget()``, ``acreate()``,
+``asave()``), ``HashingPool.arun()`` and ``aenqueue_email()``.
+
+Permission and throttle checks still run synchronously, on the event
+loop, so they must not query the database. Authentication is deferred
+until ``request.user`` is first used, which these anonymous endpoints
+never do.
+
+Under WSGI, Django runs each async view in its own event loop, so these
+views work there too, at a small cost per request.
+"""
+from inspect import isawaitable
+
+from rest_framework import generics, views
+
+
+class AsyncAPIView(views.APIView):
+    def perform_authentication(self, request):
+        # Token authentication may query the database
+        pass
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            self.initial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            # OPTIONS is answered by APIView's synchronous options()
+            if isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncGenericAPIView(AsyncAPIView, generics.GenericAPIView):
+    pass
@@ -0,0 +1,161 @@
+"""
+JWT authentication without loading the user on every request.
+
+Access tokens carry the user's ``auth_version`` and its ``is_active``,
+``is_verified``, ``is_staff`` and ``is_superuser`` flags.
+``StatelessJWTAuthentication`` builds ``request.user`` from the token and
+checks its version against a small per-process cache of user state,
+refilled from the database at most once per ``TTL`` per user. The cached
+state also supplies the current flags. A password change or deactivation
+bumps the version, which takes effect at once in the process that made it
+and within ``TTL`` everywhere else.
+
+Tokens without the claims, such as those issued before this existed, fall
+back to simplejwt's database lookup.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+DEFAULTS = {
+    # Seconds a user's auth version is trusted before it is read again
+    "TTL": 10.0,
+    # Users whose state is cached per process
+    "MAX_ENTRIES": 10_000,
+}
+
+VERSION_CLAIM = "ver"
+FLAGS = ("is_active", "is_verified", "is_staff", "is_superuser")
+
+
+def user_state_setting(name):
+    return getattr(settings, "USER_STATE_CACHE", {}).get(name, DEFAULTS[name])
+
+
+def user_claims(user):
+    """
+    Returns the claims access tokens carry for ``user``.
+    """
+    return {VERSION_CLAIM: user.auth_version, **{flag: getattr(user, flag) for flag in FLAGS}}
+
+
+class UserStateCache:
+    """
+    Maps user ids to their current claims, each entry kept for ``ttl`` seconds.
+    Missing users are cached as None.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, clock=time.monotonic):
+        self.ttl = user_state_setting("TTL") if ttl is None else ttl
+        self.max_entries = max_entries or user_state_setting("MAX_ENTRIES")
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        User = get_user_model()
+        row = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}) \
+            .values("auth_version", *FLAGS).first()
+        claims = None if row is None else {VERSION_CLAIM: row.pop("auth_version"), **row}
+        self.set(user_id, claims, now)
+        return claims
+
+    def set(self, user_id, claims, now=None):
+        expires_at = (self.clock() if now is None else now) + self.ttl
+        with self._lock:
+            self._entries[user_id] = (expires_at, claims)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_user_state_cache():
+    """
+    Returns the process-wide user state cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = UserStateCache()
+        return _cache
+
+
+def user_changed(sender, instance, **kwargs):
+    """
+    ``post_save``/``post_delete`` receiver dropping the user's cached state.
+    """
+    get_user_state_cache().invalidate(str(getattr(instance, api_settings.USER_ID_FIELD)))
+
+
+class ClaimsUser(TokenUser):
+    """
+    ``request.user`` built from access token claims instead of the database.
+    ``state`` overrides the token's flags with more recent ones.
+    """
+
+    def __init__(self, token, state=None):
+        super().__init__(token)
+        self.state = state or token
+
+    @cached_property
+    def is_active(self):
+        return self.state.get("is_active", False)
+
+    @cached_property
+    def is_verified(self):
+        return self.state.get("is_verified", False)
+
+    @cached_property
+    def is_staff(self):
+        return self.state.get("is_staff", False)
+
+    @cached_property
+    def is_superuser(self):
+        return self.state.get("is_superuser", False)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError as e:
+            raise AuthenticationFailed(_("Token contained no recognizable user identification")) from e
+
+        current = get_user_state_cache().get(user_id)
+        if current is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not current["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if validated_token[VERSION_CLAIM] != current[VERSION_CLAIM]:
+            raise AuthenticationFailed(_("Token is no longer valid"), code="token_outdated")
+        return ClaimsUser(validated_token, current)
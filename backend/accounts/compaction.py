@@ -0,0 +1,109 @@
+"""
+Incremental deletion of expired outstanding and blacklisted tokens.
+
+simplejwt's ``flushexpiredtokens`` deletes every expired row in one
+statement, holding the write lock for as long as that takes. Here expired
+tokens are deleted oldest first in small batches, each in its own short
+transaction. The batch size adapts to how long each delete takes, and the
+compactor sleeps between batches so it never holds the write lock for
+more than ``DUTY_CYCLE`` of the time.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BATCH_SIZE": 500,
+    "MIN_BATCH_SIZE": 50,
+    "MAX_BATCH_SIZE": 5000,
+    # Seconds one batch may take before the batch size is halved
+    "TARGET_LATENCY": 0.05,
+    # Largest share of wall time spent deleting
+    "DUTY_CYCLE": 0.25,
+    # Seconds one compaction pass may run for
+    "MAX_RUNTIME": 30,
+}
+
+
+def compaction_setting(name):
+    return getattr(settings, "TOKEN_COMPACTION", {}).get(name, DEFAULTS[name])
+
+
+class TokenCompactor:
+    """
+    Deletes expired tokens in adaptive batches, ordered by ``expires_at``.
+    """
+
+    def __init__(self, batch_size=None, target_latency=None, duty_cycle=None, max_runtime=None,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.batch_size = batch_size or compaction_setting("BATCH_SIZE")
+        self.min_batch_size = compaction_setting("MIN_BATCH_SIZE")
+        self.max_batch_size = compaction_setting("MAX_BATCH_SIZE")
+        self.target_latency = target_latency or compaction_setting("TARGET_LATENCY")
+        self.duty_cycle = duty_cycle or compaction_setting("DUTY_CYCLE")
+        self.max_runtime = compaction_setting("MAX_RUNTIME") if max_runtime is None else max_runtime
+        self._sleep = sleep
+        self._clock = clock
+
+    def delete_batch(self, now):
+        """
+        Deletes up to ``batch_size`` of the longest-expired tokens.
+        Returns ``(outstanding deleted, blacklisted deleted)``.
+        """
+        with transaction.atomic():
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by("expires_at").values_list("id", flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return 0, 0
+            # Delete the blacklist rows first so the cascade finds nothing to collect
+            blacklisted, _ = BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            outstanding, _ = OutstandingToken.objects.filter(id__in=ids).delete()
+        return outstanding, blacklisted
+
+    def run(self, now=None):
+        """
+        Deletes expired tokens until none are left or ``max_runtime`` is up.
+        Returns a dict of counts and the final batch size.
+        """
+        now = now or timezone.now()
+        stats = {"outstanding": 0, "blacklisted": 0, "batches": 0, "slowest": 0.0}
+        started = self._clock()
+        while self._clock() - started < self.max_runtime:
+            requested = self.batch_size
+            batch_started = self._clock()
+            outstanding, blacklisted = self.delete_batch(now)
+            elapsed = self._clock() - batch_started
+            if not outstanding:
+                break
+            stats["outstanding"] += outstanding
+            stats["blacklisted"] += blacklisted
+            stats["batches"] += 1
+            stats["slowest"] = max(stats["slowest"], elapsed)
+            self._adapt(elapsed)
+            if outstanding < requested:
+                # A partial batch means everything expired before `now` is gone
+                break
+            # Leave the write lock free for auth traffic in proportion to how long we held it
+            self._sleep(elapsed * (1 - self.duty_cycle) / self.duty_cycle)
+        stats["batch_size"] = self.batch_size
+        if stats["batches"]:
+            logger.info(
+                "Compacted %d outstanding and %d blacklisted tokens in %d batches",
+                stats["outstanding"], stats["blacklisted"], stats["batches"],
+            )
+        return stats
+
+    def _adapt(self, elapsed):
+        # Halve when a batch held the lock too long, grow gently when it was quick
+        if elapsed > self.target_latency:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        elif elapsed < self.target_latency / 2:
+            self.batch_size = min(self.max_batch_size, self.batch_size + max(1, self.batch_size // 4))
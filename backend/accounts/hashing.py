@@ -0,0 +1,245 @@
+"""
+Password hashing off the request thread.
+
+``User.set_password()`` and ``User.check_password()`` hand the hasher to a
+shared process pool, so hashing uses every core while request workers stay
+free for I/O. The pool admits at most ``WORKERS + MAX_QUEUE`` hashes at a
+time; beyond that requests fail fast with ``503 Service Unavailable``
+instead of queueing behind minutes of CPU work.
+
+Set ``WORKERS`` to 0 to hash inline, as Django does by default.
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    get_hasher,
+    identify_hasher,
+    is_password_usable,
+    make_password as django_make_password,
+)
+from rest_framework import status
+from monitoring.metrics import track
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Hashing processes; 0 hashes on the calling thread
+    "WORKERS": 2,
+    # Hashes allowed to wait for a free worker before requests are refused
+    "MAX_QUEUE": 64,
+    # Seconds to wait for a result before giving up on a hash
+    "TIMEOUT": 10,
+    # Sent as Retry-After on 503 responses
+    "RETRY_AFTER": 1,
+    # Argon2id cost parameters; calibrate with `python -m benchmarks.password_hashing`
+    "ARGON2": {"TIME_COST": 2, "MEMORY_COST": 19456, "PARALLELISM": 1},
+}
+
+
+def hashing_setting(name):
+    return getattr(settings, "PASSWORD_HASHING", {}).get(name, DEFAULTS[name])
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy, please try again shortly.'
+    default_code = 'hashing_unavailable'
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        # DRF's exception handler turns this into a Retry-After header
+        self.wait = hashing_setting("RETRY_AFTER")
+
+
+class Argon2idPasswordHasher(Argon2PasswordHasher):
+    """
+    Django's Argon2id hasher with cost parameters taken from
+    ``PASSWORD_HASHING["ARGON2"]``. Hashes made with other parameters are
+    upgraded on the user's next login.
+    """
+
+    def __init__(self):
+        costs = hashing_setting("ARGON2")
+        self.time_cost = costs["TIME_COST"]
+        self.memory_cost = costs["MEMORY_COST"]
+        self.parallelism = costs["PARALLELISM"]
+
+
+# Run in the worker processes; hashers are plain objects and pickle with
+# their cost parameters, so workers need no Django settings of their own.
+
+def _encode(hasher, password, salt):
+    return hasher.encode(password, salt)
+
+
+def _verify(hasher, password, encoded, harden):
+    if hasher.verify(password, encoded):
+        return True
+    if harden:
+        hasher.harden_runtime(password, encoded)
+    return False
+
+
+class HashingPool:
+    """
+    A bounded pool of hashing processes, started on first use.
+    """
+
+    def __init__(self, workers=None, max_queue=None, timeout=None):
+        self.workers = hashing_setting("WORKERS") if workers is None else workers
+        self.max_queue = hashing_setting("MAX_QUEUE") if max_queue is None else max_queue
+        self.timeout = timeout or hashing_setting("TIMEOUT")
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue) if self.workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned rather than forked: the parent has threads and open connections
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def run(self, fn, *args):
+        """
+        Runs ``fn(*args)`` in a worker and returns its result. Raises
+        ``HashingUnavailable`` when the queue is full or the hash times out.
+        """
+        with track("hashing", fn.__name__.lstrip("_")):
+            return self._run(fn, *args)
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            logger.warning("Password hashing queue is full")
+            raise HashingUnavailable()
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot stays taken until the worker is done, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            logger.warning("Password hash timed out after %ss", self.timeout)
+            raise HashingUnavailable()
+
+    async def arun(self, fn, *args):
+        """
+        ``run()`` for async views: waits for the worker without holding a
+        thread. Without workers the hash runs in the loop's default executor.
+        """
+        with track("hashing", fn.__name__.lstrip("_")):
+            if not self.workers:
+                return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+            if not self._slots.acquire(blocking=False):
+                logger.warning("Password hashing queue is full")
+                raise HashingUnavailable()
+            try:
+                future = self.executor.submit(fn, *args)
+            except Exception:
+                self._slots.release()
+                raise
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                # shield() leaves the hash running if we stop waiting, like run()
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Password hash timed out after %ss", self.timeout)
+                raise HashingUnavailable()
+
+    def map(self, fn, *iterables, chunksize=16):
+        """
+        Runs ``fn`` over ``iterables`` in the workers and returns the results
+        in order. Meant for batch jobs, so the queue limit does not apply.
+        """
+        if not self.workers:
+            return list(map(fn, *iterables))
+        return list(self.executor.map(fn, *iterables, chunksize=chunksize))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """
+    Returns the process-wide hashing pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool()
+        return _pool
+
+
+def make_password(password):
+    """
+    Like ``django.contrib.auth.hashers.make_password()``, hashing in the pool.
+    """
+    if password is None:
+        return django_make_password(None)
+    hasher = get_hasher()
+    return get_hashing_pool().run(_encode, hasher, password, hasher.salt())
+
+
+async def amake_password(password):
+    """
+    ``make_password()`` for async views.
+    """
+    if password is None:
+        return django_make_password(None)
+    hasher = get_hasher()
+    return await get_hashing_pool().arun(_encode, hasher, password, hasher.salt())
+
+
+def make_passwords(passwords, pool=None):
+    """
+    Hashes many passwords at once, spread over every worker.
+    """
+    hasher = get_hasher()
+    passwords = list(passwords)
+    return (pool or get_hashing_pool()).map(
+        _encode, [hasher] * len(passwords), passwords, [hasher.salt() for _ in passwords]
+    )
+
+
+def check_password(password, encoded, setter=None):
+    """
+    Like ``django.contrib.auth.hashers.check_password()``, verifying in the pool.
+    """
+    if password is None or not is_password_usable(encoded):
+        return False
+    preferred = get_hasher()
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = get_hashing_pool().run(
+        _verify, hasher, password, encoded, must_update and not hasher_changed
+    )
+    if setter and is_correct and must_update:
+        setter(password)
+    return is_correct
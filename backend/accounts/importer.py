@@ -0,0 +1,214 @@
+"""
+Bulk import of existing accounts.
+
+Rows are streamed from CSV or NDJSON and handled one batch at a time:
+validated against the batch itself and the database, passwords hashed
+across the hashing pool, then inserted with one ``bulk_create`` per
+transaction. Memory stays bounded by the batch size, whatever the input
+size. No verification emails are sent.
+"""
+import csv
+import json
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .hashing import make_passwords
+from .models import normalized_email
+
+User = get_user_model()
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+
+
+def read_rows(stream, format):
+    """
+    Yields ``(line_number, row)`` pairs from a CSV (with a header) or NDJSON stream.
+    """
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == "ndjson":
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported format: {format}")
+
+
+class UserImporter:
+    """
+    Imports users in batches of ``batch_size``.
+
+    Each row needs a ``username`` and ``email``, and either a plain-text
+    ``password`` or an already hashed ``password_hash`` in a format one of
+    ``PASSWORD_HASHERS`` understands. Rows without either get an unusable
+    password. ``first_name``, ``last_name`` and ``is_verified`` are optional;
+    ``mark_verified`` verifies every imported user.
+    """
+
+    def __init__(self, batch_size=1000, mark_verified=False, pool=None, dry_run=False):
+        self.batch_size = batch_size
+        self.mark_verified = mark_verified
+        self.pool = pool
+        self.dry_run = dry_run
+
+    def run(self, rows):
+        """
+        Imports ``(line_number, row)`` pairs and yields the stats of each batch.
+        """
+        rows = iter(rows)
+        batch_number = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return
+            batch_number += 1
+            start = time.perf_counter()
+            valid, rejected = self.validate(batch)
+            imported, conflicts = (len(valid), []) if self.dry_run else self.insert(self.build(valid))
+            elapsed = time.perf_counter() - start
+            yield {
+                "batch": batch_number,
+                "rows": len(batch),
+                "imported": imported,
+                "rejected": rejected + conflicts,
+                "seconds": elapsed,
+                "rows_per_second": len(batch) / elapsed if elapsed else 0.0,
+            }
+
+    def validate(self, batch):
+        """
+        Returns ``(valid rows, [(line_number, reason)])`` for one batch.
+        """
+        valid, rejected = [], []
+        usernames, emails = set(), set()
+        for line_number, row in batch:
+            error = self._check_row(row)
+            if error is None:
+                username, email = row["username"], normalized_email(row["email"])
+                if username in usernames:
+                    error = "duplicate username in input"
+                elif email in emails:
+                    error = "duplicate email in input"
+                usernames.add(username)
+                emails.add(email)
+            if error:
+                rejected.append((line_number, error))
+            else:
+                valid.append((line_number, row))
+
+        # One query each for the whole batch
+        taken_usernames = set(
+            User.objects.filter(username__in=[row["username"] for _, row in valid])
+            .values_list("username", flat=True)
+        )
+        taken_emails = set(
+            User.objects.filter(email_normalized__in=[normalized_email(row["email"]) for _, row in valid])
+            .values_list("email_normalized", flat=True)
+        )
+        accepted = []
+        for line_number, row in valid:
+            if row["username"] in taken_usernames:
+                rejected.append((line_number, "username already exists"))
+            elif normalized_email(row["email"]) in taken_emails:
+                rejected.append((line_number, "email already exists"))
+            else:
+                accepted.append((line_number, row))
+        return accepted, rejected
+
+    def _check_row(self, row):
+        if row is None:
+            return "malformed row"
+        username, email = row.get("username") or "", row.get("email") or ""
+        if not isinstance(username, str) or not isinstance(email, str):
+            return "malformed row"
+        if not username:
+            return "missing username"
+        try:
+            User.username_validator(username)
+        except ValidationError:
+            return "invalid username"
+        if len(username) > User._meta.get_field("username").max_length:
+            return "username too long"
+        try:
+            validate_email(email)
+        except ValidationError:
+            return "invalid email"
+        # null counts as absent; anything else must be text
+        if any(row.get(field) is not None and not isinstance(row[field], str)
+               for field in ("password", "password_hash")):
+            return "malformed password"
+        if row.get("password_hash"):
+            try:
+                identify_hasher(row["password_hash"])
+            except ValueError:
+                return "unrecognised password hash"
+        return None
+
+    def build(self, valid):
+        """
+        Returns unsaved users for validated rows, hashing plain-text passwords in the pool.
+        """
+        plain = [row["password"] for _, row in valid if row.get("password") and not row.get("password_hash")]
+        hashes = iter(make_passwords(plain, self.pool) if plain else [])
+
+        users = []
+        for line_number, row in valid:
+            if row.get("password_hash"):
+                password = row["password_hash"]
+            elif row.get("password"):
+                password = next(hashes)
+            else:
+                password = make_password(None)
+            verified = row.get("is_verified")
+            if isinstance(verified, str):
+                verified = verified.strip().lower() in TRUE_VALUES
+            user = User(
+                username=User.normalize_username(row["username"]),
+                email=User.objects.normalize_email(row["email"]),
+                email_normalized=normalized_email(row["email"]),
+                password=password,
+                first_name=row.get("first_name") or "",
+                last_name=row.get("last_name") or "",
+                is_verified=self.mark_verified or bool(verified),
+            )
+            user._import_line = line_number
+            users.append(user)
+        return users
+
+    def insert(self, users):
+        """
+        Inserts one batch in a transaction. Returns ``(imported, rejected)``.
+
+        Rows inserted concurrently by someone else fail the whole batch, in
+        which case it is retried row by row so only the conflicts are lost.
+        """
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            return len(users), []
+        except IntegrityError:
+            pass
+
+        imported, rejected = 0, []
+        with transaction.atomic():
+            for user in users:
+                try:
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                    imported += 1
+                except IntegrityError:
+                    rejected.append((user._import_line, "conflicts with an existing user"))
+        return imported, rejected
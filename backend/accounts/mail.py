@@ -0,0 +1,195 @@
+"""
+Persistent outbox for transactional email.
+
+Request handlers call ``enqueue_email()``, which only inserts a row. The
+``send_queued_mail`` management command (or ``drain_outbox()`` in tests)
+delivers queued messages in batches over a single mail connection and
+reschedules failures with exponential backoff.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from monitoring.metrics import track
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BATCH_SIZE": 50,
+    "MAX_ATTEMPTS": 5,
+    # Seconds before the first retry; doubles on every further attempt
+    "BACKOFF_BASE": 30,
+    "BACKOFF_MAX": 3600,
+    # Seconds a claimed batch stays reserved before another worker may retry it
+    "LEASE": 300,
+}
+
+
+def outbox_setting(name):
+    return getattr(settings, "MAIL_OUTBOX", {}).get(name, DEFAULTS[name])
+
+
+def enqueue_email(subject, body, from_email, recipients):
+    """
+    Queues an email for background delivery and returns the outbox row.
+    """
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email,
+        recipients=list(recipients),
+    )
+
+
+async def aenqueue_email(subject, body, from_email, recipients):
+    """
+    ``enqueue_email()`` for async views.
+    """
+    return await OutboundEmail.objects.acreate(
+        subject=subject,
+        body=body,
+        from_email=from_email,
+        recipients=list(recipients),
+    )
+
+
+def backoff_delay(attempts):
+    """
+    Returns the delay before retrying a message that has failed ``attempts`` times.
+    """
+    delay = outbox_setting("BACKOFF_BASE") * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, outbox_setting("BACKOFF_MAX")))
+
+
+def claim_batch(batch_size, now=None):
+    """
+    Reserves up to ``batch_size`` due messages for this worker.
+
+    Claimed rows move to SENDING with a lease, so a crashed worker's batch
+    becomes due again once the lease expires. Each row is claimed with an
+    UPDATE conditional on the status and time it was read with, and only
+    kept if that UPDATE matched, so concurrent workers never share a
+    message. ``skip_locked`` only keeps them apart on backends with row
+    locks; SQLite ignores it.
+    """
+    now = now or timezone.now()
+    lease = now + timedelta(seconds=outbox_setting("LEASE"))
+    messages = []
+    with transaction.atomic():
+        for message in _due_messages(batch_size, now):
+            claimed = OutboundEmail.objects.filter(
+                id=message.id, status=message.status, next_attempt_at=message.next_attempt_at
+            ).update(status=OutboundEmail.Status.SENDING, next_attempt_at=lease)
+            if claimed:
+                messages.append(message)
+    return messages
+
+
+def _due_messages(batch_size, now):
+    due = Q(status=OutboundEmail.Status.QUEUED) | Q(status=OutboundEmail.Status.SENDING)
+    return list(
+        OutboundEmail.objects.select_for_update(skip_locked=True)
+        .filter(due, next_attempt_at__lte=now)
+        .order_by("next_attempt_at", "id")[:batch_size]
+    )
+
+
+def drain_outbox(batch_size=None, connection=None, max_batches=None):
+    """
+    Delivers queued messages until the outbox has nothing due.
+
+    All messages are sent over one mail connection, opened once and reused
+    across batches. Returns a dict with ``sent``, ``retried`` and ``failed``
+    counts.
+    """
+    batch_size = batch_size or outbox_setting("BATCH_SIZE")
+    connection = connection or get_connection(fail_silently=False)
+    stats = {"sent": 0, "retried": 0, "failed": 0}
+
+    batches = 0
+    opened = False
+    try:
+        while max_batches is None or batches < max_batches:
+            messages = claim_batch(batch_size)
+            if not messages:
+                break
+            batches += 1
+
+            if not opened:
+                try:
+                    connection.open()
+                    opened = True
+                except Exception as e:
+                    for message in messages:
+                        _record_failure(message, e, stats)
+                    break
+
+            for message in messages:
+                try:
+                    _send(connection, message)
+                except Exception as e:
+                    _record_failure(message, e, stats)
+                    _reset_connection(connection)
+                else:
+                    _record_success(message, stats)
+    finally:
+        if opened:
+            connection.close()
+    return stats
+
+
+def _send(connection, message):
+    email = EmailMessage(
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email,
+        to=message.recipients,
+        connection=connection,
+    )
+    with track("mail", "send"):
+        if not connection.send_messages([email]):
+            raise RuntimeError("Mail backend did not accept the message")
+
+
+def _reset_connection(connection):
+    # A failed send may leave an SMTP session half-open; start a fresh one
+    try:
+        connection.close()
+        connection.open()
+    except Exception:
+        logger.warning("Could not reopen mail connection", exc_info=True)
+
+
+def _record_success(message, stats):
+    OutboundEmail.objects.filter(id=message.id).update(
+        status=OutboundEmail.Status.SENT,
+        attempts=message.attempts + 1,
+        sent_at=timezone.now(),
+        last_error="",
+    )
+    stats["sent"] += 1
+
+
+def _record_failure(message, error, stats):
+    attempts = message.attempts + 1
+    if attempts >= outbox_setting("MAX_ATTEMPTS"):
+        status = OutboundEmail.Status.FAILED
+        stats["failed"] += 1
+        logger.error("Giving up on outbound email %s after %d attempts: %s", message.id, attempts, error)
+    else:
+        status = OutboundEmail.Status.QUEUED
+        stats["retried"] += 1
+        logger.warning("Outbound email %s failed (attempt %d): %s", message.id, attempts, error)
+
+    OutboundEmail.objects.filter(id=message.id).update(
+        status=status,
+        attempts=attempts,
+        next_attempt_at=timezone.now() + backoff_delay(attempts),
+        last_error=str(error)[:1000],
+    )
@@ -0,0 +1,47 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.compaction import TokenCompactor
+
+
+class Command(BaseCommand):
+    help = "Deletes expired outstanding and blacklisted tokens in small, throttled batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Run one compaction pass and exit instead of repeating.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="Initial tokens deleted per batch (defaults to TOKEN_COMPACTION['BATCH_SIZE']).",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=60.0,
+            help="Seconds to sleep between passes.",
+        )
+
+    def handle(self, *args, **options):
+        compactor = TokenCompactor(batch_size=options["batch_size"])
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+
+        while True:
+            stats = compactor.run()
+            if stats["batches"] or options["once"]:
+                self.stdout.write(
+                    f"outstanding={stats['outstanding']} blacklisted={stats['blacklisted']} "
+                    f"batches={stats['batches']} slowest={stats['slowest']:.3f}s "
+                    f"batch_size={stats['batch_size']}"
+                )
+            if options["once"] or self._stopping:
+                break
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
+
+    def _stop(self, signum, frame):
+        self._stopping = True
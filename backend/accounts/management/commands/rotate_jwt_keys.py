@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.signing import generate_key, key_created, key_dir, signing_setting
+
+
+class Command(BaseCommand):
+    help = "Adds a JWT signing key and deletes keys no unexpired token can be signed with."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-new-key", action="store_true",
+            help="Only delete retired keys.",
+        )
+        parser.add_argument(
+            "--retire-after", type=float, default=None,
+            help="Seconds a key is kept after it stops signing (defaults to the refresh token lifetime).",
+        )
+
+    def handle(self, *args, **options):
+        algorithm = signing_setting("ALGORITHM")
+        if algorithm.startswith("HS"):
+            raise CommandError(f"JWT_SIGNING['ALGORITHM'] is {algorithm}; set it to RS256 or EdDSA to use keys.")
+        directory = key_dir()
+        now = time.time()
+
+        if not options["no_new_key"]:
+            kid = generate_key(directory, algorithm, now)
+            if len(list(directory.glob("*.pem"))) == 1:
+                self.stdout.write(f"Added key {kid}")
+            else:
+                self.stdout.write(
+                    f"Added key {kid}; it replaces the current key in {signing_setting('PUBLISH_DELAY')}s"
+                )
+
+        retire_after = options["retire_after"]
+        if retire_after is None:
+            retire_after = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        # A key stops signing once its successor has been published for PUBLISH_DELAY
+        paths = sorted(directory.glob("*.pem"))
+        for path, successor in zip(paths, paths[1:]):
+            replaced_at = key_created(successor.stem) + signing_setting("PUBLISH_DELAY")
+            if now - replaced_at > retire_after:
+                path.unlink()
+                self.stdout.write(f"Deleted retired key {path.stem}")
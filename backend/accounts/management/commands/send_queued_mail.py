@@ -0,0 +1,45 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.mail import drain_outbox, outbox_setting
+
+
+class Command(BaseCommand):
+    help = "Delivers queued outbound email in batches over a single mail connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Drain everything currently due and exit instead of polling.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="Messages claimed per batch (defaults to MAIL_OUTBOX['BATCH_SIZE']).",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=2.0,
+            help="Seconds to sleep when the outbox is empty.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"] or outbox_setting("BATCH_SIZE")
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+
+        while True:
+            stats = drain_outbox(batch_size=batch_size)
+            if any(stats.values()):
+                self.stdout.write(
+                    f"sent={stats['sent']} retried={stats['retried']} failed={stats['failed']}"
+                )
+            if options["once"] or self._stopping:
+                break
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
+
+    def _stop(self, signum, frame):
+        self._stopping = True
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Indexes simplejwt's outstanding tokens by expiry, so token compaction
+    can find the oldest expired rows without scanning the table.
+    """
+
+    dependencies = [
+        ("accounts", "0002_outboundemail"),
+        ("token_blacklist", "0013_alter_blacklistedtoken_options_and_more"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS accounts_outstandingtoken_expires_at "
+            "ON token_blacklist_outstandingtoken (expires_at)",
+            "DROP INDEX IF EXISTS accounts_outstandingtoken_expires_at",
+        ),
+    ]
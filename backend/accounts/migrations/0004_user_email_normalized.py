@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:18
+
+import logging
+
+from django.db import migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+
+
+def backfill_email_normalized(apps, schema_editor):
+    """
+    Fills ``email_normalized`` in primary key order, one transaction per chunk.
+
+    When several users share an email, the oldest account keeps it for
+    lookups and the others are left with no normalized email.
+    """
+    User = apps.get_model("accounts", "User")
+    db = schema_editor.connection.alias
+
+    last_pk, duplicates = 0, 0
+    while True:
+        with transaction.atomic(using=db):
+            users = list(
+                User.objects.using(db).filter(pk__gt=last_pk).order_by("pk")
+                .only("pk", "email")[:CHUNK_SIZE]
+            )
+            if not users:
+                break
+            last_pk = users[-1].pk
+
+            emails = {(user.email or "").strip().lower() for user in users} - {""}
+            # Earlier chunks are already normalized, so one query finds their claims
+            taken = set(
+                User.objects.using(db).filter(email_normalized__in=emails)
+                .values_list("email_normalized", flat=True)
+            )
+            changed = []
+            for user in users:
+                email = (user.email or "").strip().lower() or None
+                if email in taken:
+                    duplicates += 1
+                    continue
+                if email:
+                    taken.add(email)
+                user.email_normalized = email
+                changed.append(user)
+            User.objects.using(db).bulk_update(changed, ["email_normalized"])
+
+    if duplicates:
+        logger.warning("%d users share an email with an older account and were not indexed by email", duplicates)
+
+
+class Migration(migrations.Migration):
+    # Each backfill chunk commits on its own instead of locking the whole table
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0003_outstandingtoken_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_normalized',
+            field=models.CharField(editable=False, max_length=254, null=True, db_index=True),
+        ),
+        migrations.RunPython(backfill_email_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='email_normalized',
+            field=models.CharField(editable=False, max_length=254, null=True, unique=True),
+        ),
+    ]
@@ -1,5 +1,34 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.db import models
+from django.utils import timezone
+
+from . import hashing
+
+
+def normalized_email(email):
+    """
+    Returns the form of ``email`` used for lookups and uniqueness, or None if blank.
+    """
+    return (email or "").strip().lower() or None
+
+
+class UserManager(BaseUserManager):
+    """
+    Hashes new users' passwords in the worker pool. Django's manager calls
+    ``make_password()`` directly rather than ``User.set_password()``.
+    """
+
+    def _create_user_object(self, username, email, password, **extra_fields):
+        user = super()._create_user_object(username, email, None, **extra_fields)
+        user.password = hashing.make_password(password)
+        return user
+
+    async def _acreate_user(self, username, email, password, **extra_fields):
+        user = super()._create_user_object(username, email, None, **extra_fields)
+        user.password = await hashing.amake_password(password)
+        await user.asave(using=self._db)
+        return user
 
 
 class User(AbstractUser):
@@ -11,5 +40,101 @@ class User(AbstractUser):
     # Add an email verification status field
     is_verified = models.BooleanField(default=False)
 
+    # Lowercased copy of ``email``, kept in sync by save(). Its unique index
+    # makes lookups by email a single index probe at any table size.
+    email_normalized = models.CharField(max_length=254, unique=True, null=True, editable=False)
+
+    # Bumped when the password changes or the account is deactivated. Access
+    # tokens carry it, so stale tokens are refused without loading the user.
+    auth_version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = UserManager()
+
     def __str__(self):
         return self.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_active = instance.__dict__.get("is_active")
+        instance._loaded_email = instance.__dict__.get("email")
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Only a new or changed email is re-normalized, so users the backfill
+        # left unindexed as duplicates can still be saved
+        if self._state.adding or normalized_email(self.email) != normalized_email(getattr(self, "_loaded_email", None)):
+            self.email_normalized = normalized_email(self.email)
+        self._loaded_email = self.email
+        if getattr(self, "_loaded_is_active", None) and not self.is_active:
+            self.auth_version += 1
+        self._loaded_is_active = self.is_active
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if "email" in update_fields:
+                update_fields.add("email_normalized")
+            if update_fields & {"password", "is_active"}:
+                update_fields.add("auth_version")
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
+    def set_password(self, raw_password):
+        # Hashed in the shared worker pool instead of on the request thread
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+        self.auth_version += 1
+
+    async def aset_password(self, raw_password):
+        self.password = await hashing.amake_password(raw_password)
+        self._password = raw_password
+        self.auth_version += 1
+
+    def set_unusable_password(self):
+        super().set_unusable_password()
+        self.auth_version += 1
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            # Rehashing the same password keeps existing tokens valid
+            self.password = hashing.make_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return hashing.check_password(raw_password, self.password, setter)
+
+
+class OutboundEmail(models.Model):
+    """
+    An email queued for delivery by the ``send_queued_mail`` worker.
+    Views enqueue rows here instead of talking to the mail server inline.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        SENDING = "sending", "Sending"
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    # When the message is next due; for SENDING rows this is the lease expiry
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)}"
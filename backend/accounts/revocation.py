@@ -0,0 +1,204 @@
+"""
+In-process revocation checks for blacklisted refresh tokens.
+
+simplejwt checks the blacklist with one query per refresh. Instead, each
+process keeps a Bloom filter of revoked JTIs, synced incrementally from
+``BlacklistedToken`` at most once per ``SYNC_INTERVAL``. A token the filter
+has never seen is not revoked, which is the common case and needs no query.
+Only filter hits are confirmed against the database, and confirmed
+revocations are remembered in a small exact set.
+
+Tokens blacklisted in this process are added immediately; those
+blacklisted by other processes are picked up on the next sync. Syncs read
+the primary, since a lagging replica would hide fresh revocations, and
+re-scan the last ``RESCAN_WINDOW`` ids below the cursor: ids are assigned
+when rows are inserted, not when they commit, so a row can appear after
+one with a higher id has already been synced.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Disable to fall back to simplejwt's per-request blacklist query
+    "ENABLED": True,
+    # Revoked tokens the filter holds at ERROR_RATE before it is resized
+    "CAPACITY": 100_000,
+    # False-positive rate; each false positive costs one query
+    "ERROR_RATE": 0.001,
+    # Seconds between syncs with the blacklist table
+    "SYNC_INTERVAL": 1.0,
+    # Seconds between full rebuilds, which drop expired tokens from the filter
+    "REBUILD_INTERVAL": 3600,
+    # Ids below the cursor read again on every sync, for rows that commit late
+    "RESCAN_WINDOW": 1000,
+    # Confirmed revocations remembered exactly
+    "CONFIRMED_SIZE": 10_000,
+}
+
+
+def revocation_setting(name):
+    return getattr(settings, "TOKEN_REVOCATION", {}).get(name, DEFAULTS[name])
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter of strings, using double hashing over one blake2b digest.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationCache:
+    """
+    Answers "is this JTI blacklisted?" for one process.
+    """
+
+    def __init__(self, capacity=None, error_rate=None, sync_interval=None,
+                 rebuild_interval=None, confirmed_size=None, rescan_window=None):
+        self.capacity = capacity or revocation_setting("CAPACITY")
+        self.error_rate = error_rate or revocation_setting("ERROR_RATE")
+        self.sync_interval = revocation_setting("SYNC_INTERVAL") if sync_interval is None else sync_interval
+        self.rebuild_interval = rebuild_interval or revocation_setting("REBUILD_INTERVAL")
+        self.confirmed_size = confirmed_size or revocation_setting("CONFIRMED_SIZE")
+        self.rescan_window = revocation_setting("RESCAN_WINDOW") if rescan_window is None else rescan_window
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(("checks", "negatives", "confirmed_hits", "db_checks", "false_positives"), 0)
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets everything; the next check rebuilds from the database.
+        """
+        with self._lock:
+            self._filter = BloomFilter(self.capacity, self.error_rate)
+            self._confirmed = OrderedDict()
+            self._cursor = None
+            self._synced_at = self._built_at = float("-inf")
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "revoked": self._filter.count}
+
+    def add(self, jti):
+        """
+        Records a revocation made in this process.
+        """
+        with self._lock:
+            self._filter.add(jti)
+            self._remember(jti)
+
+    def is_revoked(self, jti):
+        self.sync()
+        with self._lock:
+            self._counters["checks"] += 1
+            if jti not in self._filter:
+                self._counters["negatives"] += 1
+                return False
+            if jti in self._confirmed:
+                self._counters["confirmed_hits"] += 1
+                self._confirmed.move_to_end(jti)
+                return True
+            self._counters["db_checks"] += 1
+
+        revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        with self._lock:
+            if revoked:
+                self._remember(jti)
+            else:
+                self._counters["false_positives"] += 1
+        return revoked
+
+    def sync(self, force=False):
+        """
+        Adds tokens blacklisted since the last sync, or rebuilds the filter
+        when it is full or ``REBUILD_INTERVAL`` has passed.
+        """
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if not force and now - self._synced_at < self.sync_interval:
+                return
+            if self._cursor is None or now - self._built_at >= self.rebuild_interval \
+                    or self._filter.count > self.capacity:
+                self._rebuild(now)
+            else:
+                rows = BlacklistedToken.objects.filter(id__gt=self._cursor - self.rescan_window) \
+                    .order_by("id").values_list("id", "token__jti")
+                for row_id, jti in rows.iterator():
+                    # Rows in the re-scanned window are mostly known already
+                    if jti not in self._filter:
+                        self._filter.add(jti)
+                    self._cursor = max(self._cursor, row_id)
+            self._synced_at = now
+
+    def _rebuild(self, now):
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()) \
+            .order_by("id").values_list("id", "token__jti")
+        live = rows.count()
+        # Leave headroom so the filter is not rebuilt again straight away
+        self.capacity = max(self.capacity, live * 2)
+        self._filter = BloomFilter(self.capacity, self.error_rate)
+        self._cursor = BlacklistedToken.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        for row_id, jti in rows.filter(id__lte=self._cursor).iterator():
+            self._filter.add(jti)
+        self._built_at = now
+        logger.info("Rebuilt token revocation filter with %d tokens", self._filter.count)
+
+    def _remember(self, jti):
+        self._confirmed[jti] = True
+        self._confirmed.move_to_end(jti)
+        while len(self._confirmed) > self.confirmed_size:
+            self._confirmed.popitem(last=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_revocation_cache():
+    """
+    Returns the process-wide revocation cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RevocationCache()
+        return _cache
+
+
+def record_blacklisted(sender, instance, created, **kwargs):
+    """
+    ``post_save`` receiver adding new blacklist entries to this process's cache.
+    """
+    if created:
+        get_revocation_cache().add(instance.token.jti)
@@ -1,14 +1,50 @@
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.utils.encoding import smart_str, DjangoUnicodeDecodeError
 from django.utils.http import urlsafe_base64_decode
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed
 
+from .hashing import HashingUnavailable
+from .models import normalized_email
+
 User = get_user_model()
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class AsyncValidationMixin:
+    """
+    Adds ``ais_valid()`` for async views. ``validate()`` skips its database
+    checks while ``validating_async`` is set, and ``avalidate()`` runs them
+    once the field checks have passed.
+    """
+    validating_async = False
+
+    async def ais_valid(self, raise_exception=False):
+        self.validating_async = True
+        try:
+            valid = self.is_valid()
+        finally:
+            self.validating_async = False
+        if valid:
+            try:
+                self._validated_data = await self.avalidate(self._validated_data)
+            except serializers.ValidationError as exc:
+                self._validated_data = {}
+                self._errors = serializers.as_serializer_error(exc)
+        if self._errors and raise_exception:
+            raise serializers.ValidationError(self.errors)
+        return not self._errors
+
+    async def avalidate(self, attrs):
+        return attrs
+
+
+class RegisterSerializer(AsyncValidationMixin, serializers.ModelSerializer):
     """
     Serializer for user registration.
     Handles creation of a new user.
@@ -20,12 +56,64 @@ class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'email', 'password')
+        extra_kwargs = {
+            'email': {'required': True, 'allow_blank': False},
+            # Uniqueness is checked in validate(), together with the email
+            'username': {'validators': [User.username_validator]},
+        }
+
+    def validate(self, attrs):
+        if self.validating_async:
+            return attrs
+        return self.check_available(attrs, list(self.taken(attrs)))
+
+    async def avalidate(self, attrs):
+        return self.check_available(attrs, [row async for row in self.taken(attrs)])
+
+    def taken(self, attrs):
+        # One query checks both the username and the email
+        return User.objects.filter(
+            Q(username=attrs['username']) | Q(email_normalized=normalized_email(attrs['email']))
+        ).values_list('username', 'email_normalized')[:2]
+
+    def check_available(self, attrs, taken):
+        email = normalized_email(attrs['email'])
+        errors = {}
+        for username, existing_email in taken:
+            if username == attrs['username']:
+                errors['username'] = ['A user with that username already exists.']
+            if existing_email == email:
+                errors['email'] = ['A user with that email already exists.']
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
 
     def create(self, validated_data):
         # Create a new user with a hashed password
-        user = User.objects.create_user(**validated_data)
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(**validated_data)
+        except IntegrityError:
+            # Registered concurrently since validate()
+            raise serializers.ValidationError({'detail': ['A user with that username or email already exists.']})
+
+    async def acreate(self, validated_data):
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
+        )
+        await user.aset_password(validated_data['password'])
+        await sync_to_async(self.insert)(user)
+        self.instance = user
         return user
 
+    def insert(self, user):
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError:
+            raise serializers.ValidationError({'detail': ['A user with that username or email already exists.']})
+
 
 class PasswordResetRequestSerializer(serializers.Serializer):
     """
@@ -38,7 +126,7 @@ class PasswordResetRequestSerializer(serializers.Serializer):
         fields = ['email']
 
 
-class SetNewPasswordSerializer(serializers.Serializer):
+class SetNewPasswordSerializer(AsyncValidationMixin, serializers.Serializer):
     """
     Serializer for resetting a user's password.
     Requires a token, uidb64, and a new password.
@@ -53,22 +141,37 @@ class SetNewPasswordSerializer(serializers.Serializer):
         fields = ['password', 'token', 'uidb64']
 
     def validate(self, attrs):
-        try:
-            password = attrs.get('password')
-            token = attrs.get('token')
-            uidb64 = attrs.get('uidb64')
+        if self.validating_async:
+            return attrs
+        with self.reset_errors():
+            user = User.objects.get(id=self.user_id(attrs))
+            self.check_token(user, attrs)
+            user.set_password(attrs['password'])
+            user.save()
+            return user
 
-            user_id = smart_str(urlsafe_base64_decode(uidb64))
-            user = User.objects.get(id=user_id)
+    async def avalidate(self, attrs):
+        with self.reset_errors():
+            user = await User.objects.aget(id=self.user_id(attrs))
+            self.check_token(user, attrs)
+            await user.aset_password(attrs['password'])
+            await user.asave()
+            return user
 
-            if not PasswordResetTokenGenerator().check_token(user, token):
-                raise AuthenticationFailed('The reset link is invalid', 401)
+    def user_id(self, attrs):
+        return smart_str(urlsafe_base64_decode(attrs['uidb64']))
 
-            user.set_password(password)
-            user.save()
+    def check_token(self, user, attrs):
+        if not PasswordResetTokenGenerator().check_token(user, attrs['token']):
+            raise AuthenticationFailed('The reset link is invalid', 401)
 
-            return user
+    @contextmanager
+    def reset_errors(self):
+        try:
+            yield
         except (DjangoUnicodeDecodeError, User.DoesNotExist) as e:
             raise AuthenticationFailed('The reset link is invalid', 401)
+        except HashingUnavailable:
+            raise
         except Exception as e:
             raise AuthenticationFailed('Something went wrong', 401)
@@ -0,0 +1,233 @@
+"""
+Asymmetric JWT signing with rotating keys.
+
+With ``JWT_SIGNING["ALGORITHM"]`` set to RS256 or EdDSA, tokens are signed
+with private keys kept as PEM files in ``KEY_DIR``, one per key, named by
+creation time plus a random suffix. The name is the token's ``kid``
+header. Every key is published at ``/.well-known/jwks.json`` so other
+services can verify tokens with ``accounts.verifier`` instead of sharing
+``SECRET_KEY``.
+
+A new key is published for ``PUBLISH_DELAY`` seconds before it signs
+anything, so verifiers holding a cached key set see it before its first
+token. ``rotate_jwt_keys`` adds keys and deletes those whose tokens have
+all expired. Each process rereads the directory when it changes.
+
+With HS256, the default, simplejwt's own backend and ``SECRET_KEY`` are used.
+"""
+import hashlib
+import json
+import os
+import secrets
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+DEFAULTS = {
+    # HS256 signs with SECRET_KEY; RS256 and EdDSA sign with keys from KEY_DIR
+    # and require the cryptography package
+    "ALGORITHM": "HS256",
+    "KEY_DIR": "jwt_keys",
+    # Seconds verifiers may cache /.well-known/jwks.json
+    "JWKS_MAX_AGE": 300,
+    # Seconds a new key is published before it signs tokens; keep >= JWKS_MAX_AGE
+    "PUBLISH_DELAY": 600,
+}
+
+KID_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+def signing_setting(name):
+    return getattr(settings, "JWT_SIGNING", {}).get(name, DEFAULTS[name])
+
+
+def key_dir():
+    return Path(settings.BASE_DIR) / signing_setting("KEY_DIR")
+
+
+def key_created(kid):
+    return datetime.strptime(kid.split("-")[0], KID_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+
+
+def generate_key(directory, algorithm, now=None):
+    """
+    Writes a new private key for ``algorithm`` and returns its kid.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+
+    created = datetime.fromtimestamp(now or datetime.now(timezone.utc).timestamp(), timezone.utc)
+    # The suffix keeps keys generated within the same second apart
+    kid = f"{created.strftime(KID_FORMAT)}-{secrets.token_hex(4)}"
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    fd = os.open(directory / f"{kid}.pem", os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pem)
+    return kid
+
+
+class KeyRing:
+    """
+    The private keys in one directory, reloaded whenever it changes.
+    """
+
+    def __init__(self, directory, algorithm, publish_delay):
+        self.directory = Path(directory)
+        self.algorithm = algorithm
+        self.publish_delay = publish_delay
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self._keys = {}
+        self._public_keys = {}
+        self._jwks = None
+
+    def _reload(self):
+        try:
+            mtime = self.directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._loaded_mtime and self._jwks is not None:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime and self._jwks is not None:
+                return
+            from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+            keys = {}
+            for path in sorted(self.directory.glob("*.pem")) if mtime is not None else ():
+                keys[path.stem] = load_pem_private_key(path.read_bytes(), password=None)
+            algorithm = jwt.get_algorithm_by_name(self.algorithm)
+            public = []
+            for kid, key in keys.items():
+                jwk = algorithm.to_jwk(key.public_key(), as_dict=True)
+                public.append({**jwk, "kid": kid, "alg": self.algorithm, "use": "sig"})
+            body = json.dumps({"keys": public}, sort_keys=True).encode()
+            self._keys = keys
+            self._public_keys = {kid: key.public_key() for kid, key in keys.items()}
+            self._jwks = (body, '"%s"' % hashlib.sha256(body).hexdigest()[:32])
+            self._loaded_mtime = mtime
+
+    def signing_key(self, now=None):
+        """
+        Returns ``(kid, private key)`` of the newest key published for at least
+        ``publish_delay`` seconds, or of the newest key if none has been.
+        """
+        self._reload()
+        if not self._keys:
+            raise ImproperlyConfigured(f"No JWT signing keys in {self.directory}; run rotate_jwt_keys")
+        now = now or datetime.now(timezone.utc).timestamp()
+        kids = sorted(self._keys)
+        active = [kid for kid in kids if key_created(kid) <= now - self.publish_delay]
+        kid = (active or kids)[-1]
+        return kid, self._keys[kid]
+
+    def public_key(self, kid):
+        self._reload()
+        return self._public_keys.get(kid)
+
+    def jwks(self):
+        """
+        Returns the JSON Web Key Set as ``(body bytes, ETag)``.
+        """
+        self._reload()
+        return self._jwks
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """
+    simplejwt backend that signs with the key ring's active key and
+    verifies with whichever key the token's ``kid`` names.
+    """
+
+    def __init__(self, key_ring):
+        super().__init__(
+            key_ring.algorithm,
+            audience=api_settings.AUDIENCE,
+            issuer=api_settings.ISSUER,
+            leeway=api_settings.LEEWAY,
+            json_encoder=api_settings.JSON_ENCODER,
+        )
+        self.key_ring = key_ring
+
+    def encode(self, payload):
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload["aud"] = self.audience
+        if self.issuer is not None:
+            jwt_payload["iss"] = self.issuer
+        kid, key = self.key_ring.signing_key()
+        return jwt.encode(
+            jwt_payload, key, algorithm=self.algorithm, headers={"kid": kid}, json_encoder=self.json_encoder
+        )
+
+    def get_verifying_key(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.InvalidTokenError as e:
+            raise TokenBackendError(_("Token is invalid")) from e
+        key = self.key_ring.public_key(kid) if isinstance(kid, str) else None
+        if key is None:
+            raise TokenBackendError(_("Token is invalid"))
+        return key
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_token_backend():
+    """
+    Returns the process-wide token backend for ``JWT_SIGNING``.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            algorithm = signing_setting("ALGORITHM")
+            if algorithm.startswith("HS"):
+                from rest_framework_simplejwt.state import token_backend
+
+                _backend = token_backend
+            else:
+                _backend = KeyRingTokenBackend(
+                    KeyRing(key_dir(), algorithm, signing_setting("PUBLISH_DELAY"))
+                )
+        return _backend
+
+
+def jwks():
+    """
+    Returns the published JSON Web Key Set as ``(body bytes, ETag)``.
+    """
+    backend = get_token_backend()
+    if isinstance(backend, KeyRingTokenBackend):
+        return backend.key_ring.jwks()
+    body = b'{"keys": []}'
+    return body, '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting == "JWT_SIGNING":
+        with _backend_lock:
+            _backend = None
+
+
+setting_changed.connect(_reset_backend, dispatch_uid="accounts.signing")
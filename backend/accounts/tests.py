@@ -1,8 +1,49 @@
+import json
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+from importlib import import_module
+from importlib.util import find_spec
+from pathlib import Path
+from types import SimpleNamespace
+from io import StringIO
+from unittest import mock, skipUnless
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import connection
+from django.db.utils import ConnectionHandler
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from jwt import algorithms as jwt_algorithms
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from auth_project.db import ReplicaRouter, database, read_replica
+
+from .authentication import UserStateCache, get_user_state_cache
+from .compaction import TokenCompactor
+from .hashing import HashingPool, HashingUnavailable
+from .mail import _due_messages, claim_batch, drain_outbox, enqueue_email
+from .models import OutboundEmail
+from .revocation import BloomFilter, RevocationCache, get_revocation_cache
+from .serializers import RegisterSerializer
+from .signing import generate_key, get_token_backend, key_created
+from .throttling import FileBucketStore, MemoryBucketStore, parse_rate
+from .tokens import AccessToken, RefreshToken
+from .verifier import TokenVerifier
+from .views import LogoutView, PasswordResetConfirmView, PasswordResetRequestView, RegisterView, VerifyEmailView
 
 User = get_user_model()
 
@@ -36,6 +77,8 @@ class AuthTests(APITestCase):
         response = self.client.post(self.register_url, self.user_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(User.objects.count(), 2) # 1 from setUp, 1 from this test
+        self.assertEqual(len(mail.outbox), 0) # Queued, not sent inline
+        drain_outbox()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].subject, 'Verify your email')
         self.assertIn('testuser', response.data['user']['username'])
@@ -180,6 +223,7 @@ class PasswordResetTests(APITestCase):
         """
         response = self.client.post(self.request_url, {'email': 'reset@example.com'}, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        drain_outbox()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].subject, 'Reset your password')
 
@@ -189,6 +233,7 @@ class PasswordResetTests(APITestCase):
         """
         response = self.client.post(self.request_url, {'email': 'no-such-email@example.com'}, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        drain_outbox()
         self.assertEqual(len(mail.outbox), 0) # No email should be sent
 
     def test_password_reset_confirm_success(self):
@@ -233,3 +278,953 @@ class PasswordResetTests(APITestCase):
 
         response = self.client.patch(confirm_url, {'password': 'anypassword'}, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class OutboxTests(TestCase):
+    def test_drain_sends_queued_messages_over_one_connection(self):
+        """
+        Ensure queued messages are delivered in batches through a single connection.
+        """
+        for i in range(5):
+            enqueue_email(f'Subject {i}', 'Body', 'noreply@yourdomain.com', [f'user{i}@example.com'])
+
+        with mock.patch('accounts.mail.get_connection', wraps=get_connection) as get_conn:
+            stats = drain_outbox(batch_size=2)
+
+        self.assertEqual(get_conn.call_count, 1)
+        self.assertEqual(stats, {'sent': 5, 'retried': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.Status.SENT).count(), 5)
+
+    def test_failed_send_is_retried_with_backoff(self):
+        """
+        Ensure a failed delivery is rescheduled with exponential backoff and later sent.
+        """
+        message = enqueue_email('Subject', 'Body', 'noreply@yourdomain.com', ['user@example.com'])
+        connection = get_connection()
+
+        with mock.patch.object(connection, 'send_messages', side_effect=OSError('mail server down')):
+            stats = drain_outbox(connection=connection)
+        self.assertEqual(stats['retried'], 1)
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundEmail.Status.QUEUED)
+        self.assertEqual(message.attempts, 1)
+        self.assertIn('mail server down', message.last_error)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+
+        # Not due yet, so a second drain leaves it alone
+        self.assertEqual(drain_outbox()['sent'], 0)
+
+        OutboundEmail.objects.filter(id=message.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_outbox()['sent'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(MAIL_OUTBOX={'MAX_ATTEMPTS': 2, 'BACKOFF_BASE': 0})
+    def test_message_fails_after_max_attempts(self):
+        """
+        Ensure a message is marked failed once it runs out of attempts.
+        """
+        message = enqueue_email('Subject', 'Body', 'noreply@yourdomain.com', ['user@example.com'])
+        connection = get_connection()
+
+        with mock.patch.object(connection, 'send_messages', side_effect=OSError('rejected')):
+            stats = drain_outbox(connection=connection)
+
+        self.assertEqual(stats, {'sent': 0, 'retried': 1, 'failed': 1})
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundEmail.Status.FAILED)
+        self.assertEqual(message.attempts, 2)
+
+    def test_expired_lease_is_reclaimed(self):
+        """
+        Ensure messages claimed by a crashed worker are sent once their lease expires.
+        """
+        enqueue_email('Subject', 'Body', 'noreply@yourdomain.com', ['user@example.com'])
+        OutboundEmail.objects.update(
+            status=OutboundEmail.Status.SENDING,
+            next_attempt_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(drain_outbox()['sent'], 1)
+
+    def test_message_read_by_two_workers_is_claimed_once(self):
+        """
+        Ensure a worker that read due messages another worker has since claimed gets none of them.
+        """
+        for _ in range(2):
+            enqueue_email('Subject', 'Body', 'noreply@yourdomain.com', ['user@example.com'])
+        stale = _due_messages(10, timezone.now())
+
+        self.assertEqual(len(claim_batch(10)), 2)
+        with mock.patch('accounts.mail._due_messages', return_value=stale):
+            self.assertEqual(claim_batch(10), [])
+
+    def test_send_queued_mail_command(self):
+        """
+        Ensure the worker command drains the outbox when run with --once.
+        """
+        enqueue_email('Subject', 'Body', 'noreply@yourdomain.com', ['user@example.com'])
+        out = StringIO()
+        call_command('send_queued_mail', '--once', stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('sent=1', out.getvalue())
+
+
+class HashingPoolTests(APITestCase):
+    def setUp(self):
+        self.pool = HashingPool(workers=1, max_queue=0)
+        self.addCleanup(self.pool.shutdown)
+        patcher = mock.patch('accounts.hashing.get_hashing_pool', return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_passwords_are_hashed_in_worker_process(self):
+        """
+        Ensure hashing runs outside the request process and hashes still verify.
+        """
+        self.assertNotEqual(self.pool.run(os.getpid), os.getpid())
+
+        with mock.patch.object(self.pool.executor, 'submit', wraps=self.pool.executor.submit) as submit:
+            user = User.objects.create_user('pooled', 'pooled@example.com', 'testpassword123')
+        # create_user() hashes with make_password(), not set_password()
+        self.assertEqual(submit.call_count, 1)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('testpassword123'))
+        self.assertFalse(user.check_password('wrongpassword'))
+
+    async def test_registration_hashes_in_worker(self):
+        """
+        Ensure users created by registration, sync or async, have their passwords hashed in the pool.
+        """
+        with mock.patch.object(self.pool.executor, 'submit', wraps=self.pool.executor.submit) as submit:
+            serializer = RegisterSerializer(data={
+                'username': 'registered', 'email': 'registered@example.com', 'password': 'testpassword123',
+            })
+            await sync_to_async(serializer.is_valid)(raise_exception=True)
+            await sync_to_async(serializer.save)()
+            user = await User.objects.acreate_user('async', 'async@example.com', 'testpassword123')
+        self.assertEqual(submit.call_count, 2)
+        self.assertTrue(await sync_to_async(user.check_password)('testpassword123'))
+
+    async def test_async_hash_waits_on_worker(self):
+        """
+        Ensure async views can await a hash in the worker and still fail fast when the pool is full.
+        """
+        self.assertNotEqual(await self.pool.arun(os.getpid), os.getpid())
+        self.pool._slots.acquire()
+        self.addCleanup(self.pool._slots.release)
+        with self.assertRaises(HashingUnavailable):
+            await self.pool.arun(os.getpid)
+
+    def test_login_fails_fast_when_queue_is_full(self):
+        """
+        Ensure login returns 503 with Retry-After instead of waiting for a busy pool.
+        """
+        User.objects.create_user('busy', 'busy@example.com', 'testpassword123')
+        self.pool._slots.acquire()
+        self.addCleanup(self.pool._slots.release)
+
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'busy', 'password': 'testpassword123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @skipUnless(find_spec('argon2'), 'requires argon2-cffi')
+    @override_settings(PASSWORD_HASHERS=[
+        'accounts.hashing.Argon2idPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ])
+    def test_pbkdf2_hash_is_upgraded_to_argon2id(self):
+        """
+        Ensure a successful login rehashes older hashes with the configured Argon2id costs.
+        """
+        user = User.objects.create_user('upgrade', 'upgrade@example.com')
+        user.password = make_password('testpassword123', hasher='pbkdf2_sha256')
+        user.save()
+
+        self.assertTrue(user.check_password('testpassword123'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('argon2$argon2id$v=19$m=19456,t=2,p=1$'))
+        self.assertTrue(user.check_password('testpassword123'))
+
+
+class ImportUsersTests(TestCase):
+    def write(self, name, content):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / name
+        path.write_text(content)
+        return str(path)
+
+    def test_imports_csv_in_batches(self):
+        """
+        Ensure CSV rows are hashed, inserted in batches and reported per batch.
+        """
+        rows = ['username,email,password']
+        rows += [f'user{i},user{i}@example.com,password{i}' for i in range(5)]
+        path = self.write('users.csv', '\n'.join(rows) + '\n')
+
+        out = StringIO()
+        call_command('import_users', path, '--batch-size', '2', '--workers', '0', stdout=out)
+
+        self.assertEqual(User.objects.count(), 5)
+        user = User.objects.get(username='user3')
+        self.assertTrue(user.check_password('password3'))
+        self.assertFalse(user.is_verified)
+        output = out.getvalue()
+        self.assertIn('batch=3 rows=1 imported=1', output)
+        self.assertIn('total rows=5 imported=5 rejected=0', output)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_imports_prehashed_ndjson_and_rejects_bad_rows(self):
+        """
+        Ensure pre-hashed passwords are kept and invalid or duplicate rows are reported.
+        """
+        User.objects.create_user('taken', 'taken@example.com', 'password')
+        encoded = make_password('secret123')
+        lines = [
+            {'username': 'alice', 'email': 'alice@example.com', 'password_hash': encoded},
+            {'username': 'taken', 'email': 'other@example.com'},
+            {'username': 'bob', 'email': 'not-an-email'},
+            {'username': 'carol', 'email': 'ALICE@example.com'},
+            {'username': 'dave', 'email': 'dave@example.com', 'password_hash': 'plaintext'},
+        ]
+        path = self.write('users.ndjson', '\n'.join(json.dumps(line) for line in lines) + '\nnot json\n')
+        rejects = self.write('rejects.ndjson', '')
+
+        call_command(
+            'import_users', path, '--mark-verified', '--rejects', rejects, stdout=StringIO()
+        )
+
+        alice = User.objects.get(username='alice')
+        self.assertEqual(alice.password, encoded)
+        self.assertTrue(alice.is_verified)
+        self.assertTrue(alice.check_password('secret123'))
+        self.assertEqual(User.objects.count(), 2)
+
+        reasons = {
+            reject['line']: reject['reason']
+            for reject in map(json.loads, Path(rejects).read_text().splitlines())
+        }
+        self.assertEqual(reasons, {
+            2: 'username already exists',
+            3: 'invalid email',
+            4: 'duplicate email in input',
+            5: 'unrecognised password hash',
+            6: 'malformed row',
+        })
+
+    def test_rejects_passwords_that_are_not_text(self):
+        """
+        Ensure a password of the wrong JSON type rejects its row instead of aborting the import.
+        """
+        lines = [
+            {'username': 'erin', 'email': 'erin@example.com', 'password': 12345678},
+            {'username': 'frank', 'email': 'frank@example.com', 'password_hash': ['pbkdf2']},
+            {'username': 'grace', 'email': 'grace@example.com', 'password': None},
+            {'username': 'heidi', 'email': 'heidi@example.com', 'password': 'secret123'},
+        ]
+        path = self.write('users.ndjson', '\n'.join(json.dumps(line) for line in lines) + '\n')
+        rejects = self.write('rejects.ndjson', '')
+
+        call_command('import_users', path, '--workers', '0', '--rejects', rejects, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(User.objects.values_list('username', flat=True)), ['grace', 'heidi']
+        )
+        self.assertFalse(User.objects.get(username='grace').has_usable_password())
+        reasons = {
+            reject['line']: reject['reason']
+            for reject in map(json.loads, Path(rejects).read_text().splitlines())
+        }
+        self.assertEqual(reasons, {1: 'malformed password', 2: 'malformed password'})
+
+    def test_dry_run_writes_nothing(self):
+        """
+        Ensure --dry-run validates rows without creating users.
+        """
+        path = self.write('users.csv', 'username,email\nalice,alice@example.com\n')
+        out = StringIO()
+        call_command('import_users', path, '--dry-run', stdout=out)
+        self.assertFalse(User.objects.filter(username='alice').exists())
+        self.assertIn('imported=1', out.getvalue())
+
+
+class TokenRevocationTests(APITestCase):
+    def setUp(self):
+        get_revocation_cache().reset()
+        self.user = User.objects.create_user('revoked', 'revoked@example.com', 'testpassword123')
+
+    def blacklist_directly(self, token):
+        """
+        Blacklists ``token`` the way another process would, without this process's signal.
+        """
+        outstanding = OutstandingToken.objects.get(jti=token['jti'])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=outstanding)])
+
+    def test_refresh_with_logged_out_token_is_rejected(self):
+        """
+        Ensure a refresh token stops working once it has been blacklisted by logout.
+        """
+        refresh = str(RefreshToken.for_user(self.user))
+        url = reverse('token_refresh')
+        self.assertEqual(self.client.post(url, {'refresh': refresh}, format='json').status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('logout'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+        response = self.client.post(url, {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unrevoked_token_is_checked_without_query(self):
+        """
+        Ensure tokens missing from the filter are accepted without touching the blacklist.
+        """
+        cache = RevocationCache(sync_interval=60)
+        cache.sync()
+        with self.assertNumQueries(0):
+            self.assertFalse(cache.is_revoked('never-revoked'))
+        self.assertEqual(cache.stats()['negatives'], 1)
+
+    def test_picks_up_revocations_from_other_processes(self):
+        """
+        Ensure tokens blacklisted elsewhere are revoked after the next sync and confirmed once.
+        """
+        cache = RevocationCache(sync_interval=60)
+        cache.sync()
+        token = RefreshToken.for_user(self.user)
+        self.blacklist_directly(token)
+        self.assertFalse(cache.is_revoked(token['jti']))
+
+        cache.sync(force=True)
+        self.assertTrue(cache.is_revoked(token['jti']))
+        with self.assertNumQueries(0):
+            self.assertTrue(cache.is_revoked(token['jti']))
+        self.assertEqual(cache.stats()['db_checks'], 1)
+
+    def test_sync_picks_up_rows_committed_out_of_order(self):
+        """
+        Ensure a blacklist row that appears below the sync cursor is still picked up.
+        """
+        early, late = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        self.blacklist_directly(early)
+        self.blacklist_directly(late)
+        # Stands in for a transaction that took the lower id but committed after the sync
+        delayed = BlacklistedToken.objects.get(token__jti=early['jti'])
+        delayed_id = delayed.id
+        delayed.delete()
+
+        cache = RevocationCache(sync_interval=60)
+        cache.sync()
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(id=delayed_id, token=delayed.token)])
+        cache.sync(force=True)
+
+        self.assertTrue(cache.is_revoked(early['jti']))
+        self.assertEqual(cache.stats()['revoked'], 2)
+
+    def test_rebuild_keeps_only_unexpired_tokens(self):
+        """
+        Ensure a rebuilt filter drops tokens that have already expired.
+        """
+        live, expired = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        self.blacklist_directly(live)
+        self.blacklist_directly(expired)
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now())
+
+        cache = RevocationCache()
+        cache.sync()
+        self.assertEqual(cache.stats()['revoked'], 1)
+        self.assertTrue(cache.is_revoked(live['jti']))
+
+    def test_bloom_filter_error_rate(self):
+        """
+        Ensure the filter has no false negatives and stays near its false-positive target.
+        """
+        bloom = BloomFilter(capacity=5000, error_rate=0.01)
+        for i in range(5000):
+            bloom.add(f'revoked-{i}')
+        self.assertTrue(all(f'revoked-{i}' in bloom for i in range(5000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 200)
+
+
+class TokenCompactionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('compact', 'compact@example.com', 'testpassword123')
+
+    def create_tokens(self, count, expires_in, blacklist=False):
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(
+                user=self.user, jti=f'{expires_in}-{i}', token='',
+                expires_at=timezone.now() + timedelta(seconds=expires_in + i),
+            )
+            for i in range(count)
+        ])
+        if blacklist:
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens])
+        return tokens
+
+    def test_deletes_expired_tokens_in_batches(self):
+        """
+        Ensure only expired tokens are deleted, with their blacklist entries, in several batches.
+        """
+        self.create_tokens(7, -3600, blacklist=True)
+        self.create_tokens(5, -1800)
+        self.create_tokens(4, 3600, blacklist=True)
+        sleeps = []
+
+        stats = TokenCompactor(batch_size=5, sleep=sleeps.append).run()
+
+        self.assertEqual(stats['outstanding'], 12)
+        self.assertEqual(stats['blacklisted'], 7)
+        self.assertEqual(stats['batches'], 3)
+        self.assertEqual(len(sleeps), 2)
+        self.assertEqual(OutstandingToken.objects.count(), 4)
+        self.assertEqual(BlacklistedToken.objects.count(), 4)
+
+    def test_deletes_oldest_first(self):
+        """
+        Ensure each batch takes the longest-expired tokens.
+        """
+        self.create_tokens(3, -60)
+        self.create_tokens(3, -7200)
+        TokenCompactor(batch_size=3).delete_batch(timezone.now())
+        self.assertEqual(
+            sorted(OutstandingToken.objects.values_list('jti', flat=True)), ['-60-0', '-60-1', '-60-2']
+        )
+
+    def test_slow_deletes_shrink_batches_and_back_off(self):
+        """
+        Ensure slow batches halve the batch size and sleep in proportion to the duty cycle.
+        """
+        self.create_tokens(6, -3600)
+        ticks = iter(range(1000))
+        sleeps = []
+        # Every clock read advances 100ms, so each batch appears to take 0.1s
+        compactor = TokenCompactor(
+            batch_size=4, target_latency=0.05, duty_cycle=0.5, max_runtime=100,
+            sleep=sleeps.append, clock=lambda: next(ticks) / 10,
+        )
+        compactor.min_batch_size = 1
+        stats = compactor.run()
+
+        self.assertEqual(stats['outstanding'], 6)
+        self.assertEqual(stats['batch_size'], 1)
+        self.assertAlmostEqual(sleeps[0], 0.1)
+
+    def test_compact_tokens_command(self):
+        """
+        Ensure the command runs one pass with --once and reports what it deleted.
+        """
+        self.create_tokens(3, -60, blacklist=True)
+        out = StringIO()
+        call_command('compact_tokens', '--once', stdout=out)
+        self.assertIn('outstanding=3 blacklisted=3', out.getvalue())
+        self.assertFalse(OutstandingToken.objects.exists())
+
+
+class DatabaseTests(TestCase):
+    def test_sqlite_connections_use_wal_and_busy_timeout(self):
+        """
+        Ensure SQLite files open in WAL mode with the configured busy timeout.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        env = {'SQLITE_BUSY_TIMEOUT': '7', 'DB_REPLICA_NAME': str(Path(directory.name) / 'replica.sqlite3')}
+        with mock.patch.dict(os.environ, env):
+            handler = ConnectionHandler({
+                'default': database('DB', Path(directory.name) / 'primary.sqlite3'),
+                'replica': database('DB_REPLICA', None),
+            })
+        self.addCleanup(handler.close_all)
+
+        for alias in ('default', 'replica'):
+            with handler[alias].cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 7000)
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        self.assertTrue(Path(directory.name, 'replica.sqlite3').exists())
+
+    def test_connections_are_not_kept_under_asgi(self):
+        """
+        Ensure persistent connections default to off under ASGI, and an explicit setting still wins.
+        """
+        with mock.patch.dict(os.environ, {'DJANGO_ASGI': '1'}):
+            os.environ.pop('DB_CONN_MAX_AGE', None)
+            self.assertEqual(database('DB', 'db.sqlite3')['CONN_MAX_AGE'], 0)
+            os.environ['DB_CONN_MAX_AGE'] = '30'
+            self.assertEqual(database('DB', 'db.sqlite3')['CONN_MAX_AGE'], 30)
+        with mock.patch.dict(os.environ, {'DJANGO_ASGI': ''}):
+            os.environ.pop('DB_CONN_MAX_AGE', None)
+            self.assertEqual(database('DB', 'db.sqlite3')['CONN_MAX_AGE'], 60)
+
+    def test_router_sends_marked_reads_to_replica(self):
+        """
+        Ensure only reads inside read_replica() use the replica, and writes never do.
+        """
+        router = ReplicaRouter()
+        databases = {**settings.DATABASES, 'replica': settings.DATABASES['default']}
+        with override_settings(DATABASES=databases):
+            self.assertIsNone(router.db_for_read(User))
+            with read_replica():
+                self.assertEqual(router.db_for_read(User), 'replica')
+                self.assertEqual(router.db_for_write(User), 'default')
+
+        # Without a replica alias, marked reads stay on the primary
+        with read_replica():
+            self.assertIsNone(router.db_for_read(User))
+
+
+class EmailIdentityTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='existing', email='Existing@Example.com', password='x' * 12)
+
+    def test_email_is_stored_normalized(self):
+        """
+        Ensure the lookup email is lowercased and follows changes to the email.
+        """
+        self.assertEqual(self.user.email_normalized, 'existing@example.com')
+        self.user.email = 'Moved@Example.com'
+        self.user.save(update_fields=['email'])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email_normalized, 'moved@example.com')
+
+    def test_registration_checks_username_and_email_in_one_query(self):
+        """
+        Ensure registration rejects taken usernames and emails, ignoring email case, with one query.
+        """
+        data = {'username': 'existing', 'email': 'EXISTING@example.com', 'password': 'x' * 12}
+        serializer = RegisterSerializer(data=data)
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+        self.assertEqual(set(serializer.errors), {'username', 'email'})
+
+        data = {'username': 'newuser', 'email': 'new@example.com', 'password': 'x' * 12}
+        with self.assertNumQueries(1):
+            self.assertTrue(RegisterSerializer(data=data).is_valid())
+
+    def test_password_reset_finds_email_in_any_case(self):
+        """
+        Ensure password reset looks users up by normalized email.
+        """
+        response = self.client.post(reverse('password-reset'), {'email': 'EXISTING@example.COM'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(OutboundEmail.objects.get().recipients, ['Existing@example.com'])
+
+    def test_backfill_keeps_oldest_of_duplicate_emails(self):
+        """
+        Ensure the migration backfill normalizes emails and leaves later duplicates unindexed.
+        """
+        migration = import_module('accounts.migrations.0004_user_email_normalized')
+        newer = User.objects.create_user(username='newer', email='other@example.com')
+        blank = User.objects.create_user(username='blank', email='')
+        User.objects.update(email_normalized=None)
+        User.objects.filter(pk=newer.pk).update(email='EXISTING@example.com')
+
+        with mock.patch.object(migration, 'CHUNK_SIZE', 1):
+            migration.backfill_email_normalized(django_apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(
+            dict(User.objects.values_list('username', 'email_normalized')),
+            {'existing': 'existing@example.com', 'newer': None, 'blank': None},
+        )
+
+        # Saving a duplicate keeps it unindexed instead of colliding with the oldest account
+        newer = User.objects.get(username='newer')
+        newer.is_verified = True
+        newer.save()
+        newer.refresh_from_db()
+        self.assertIsNone(newer.email_normalized)
+
+        newer.email = 'Fresh@example.com'
+        newer.save()
+        newer.refresh_from_db()
+        self.assertEqual(newer.email_normalized, 'fresh@example.com')
+
+
+@skipUnless(jwt_algorithms.has_crypto, 'requires cryptography')
+class JWTSigningTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.key_dir = Path(directory.name)
+        self.user = User.objects.create_user('signer', 'signer@example.com', 'testpassword123')
+
+    def signing(self, algorithm='RS256', **overrides):
+        return override_settings(JWT_SIGNING={'ALGORITHM': algorithm, 'KEY_DIR': str(self.key_dir), **overrides})
+
+    def login(self):
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'signer', 'password': 'testpassword123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def verifier(self, fetches):
+        def urlopen(request, timeout):
+            fetches.append(request.full_url)
+            response = self.client.get(reverse('jwks'))
+            return nullcontext(SimpleNamespace(
+                read=lambda *args: response.content, headers={'Cache-Control': response['Cache-Control']},
+            ))
+
+        patcher = mock.patch('accounts.verifier.urllib.request.urlopen', urlopen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return TokenVerifier('http://auth/.well-known/jwks.json')
+
+    def test_tokens_are_signed_with_key_pairs_and_verified_locally(self):
+        """
+        Ensure issued tokens carry a kid, authenticate here and verify elsewhere from the JWKS alone.
+        """
+        for algorithm in ('RS256', 'EdDSA'):
+            with self.subTest(algorithm=algorithm), self.signing(algorithm):
+                kid = generate_key(self.key_dir, algorithm)
+                tokens = self.login()
+                header = jwt.get_unverified_header(tokens['access'])
+                self.assertEqual((header['alg'], header['kid']), (algorithm, kid))
+
+                fetches = []
+                verifier = self.verifier(fetches)
+                self.assertEqual(verifier.verify(tokens['access'])['user_id'], str(self.user.id))
+                verifier.verify(tokens['access'])
+                self.assertEqual(len(fetches), 1)
+                with self.assertRaises(jwt.InvalidTokenError):
+                    verifier.verify(tokens['refresh'])
+
+                refreshed = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+                self.assertEqual(refreshed.status_code, status.HTTP_200_OK)
+                (self.key_dir / f'{kid}.pem').unlink()
+
+    def test_jwks_cache_headers(self):
+        """
+        Ensure the key set is cacheable and revalidates with its ETag.
+        """
+        with self.signing(JWKS_MAX_AGE=120):
+            kid = generate_key(self.key_dir, 'RS256')
+            response = self.client.get(reverse('jwks'))
+            self.assertEqual([key['kid'] for key in response.json()['keys']], [kid])
+            self.assertNotIn('d', response.json()['keys'][0])  # no private parts
+            self.assertIn('max-age=120', response['Cache-Control'])
+            self.assertIn('public', response['Cache-Control'])
+
+            for header in (response['ETag'], f'"other", W/{response["ETag"]}', '*'):
+                cached = self.client.get(reverse('jwks'), HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED, header)
+            # A tag that merely contains the current one does not match
+            stale = self.client.get(reverse('jwks'), HTTP_IF_NONE_MATCH=f'"x{response["ETag"][1:-1]}x"')
+            self.assertEqual(stale.status_code, status.HTTP_200_OK)
+
+    def test_keys_generated_in_the_same_second_get_distinct_kids(self):
+        """
+        Ensure two keys created at the same moment do not share a kid.
+        """
+        now = time.time()
+        first = generate_key(self.key_dir, 'EdDSA', now)
+        second = generate_key(self.key_dir, 'EdDSA', now)
+        self.assertNotEqual(first, second)
+        self.assertEqual(key_created(first), key_created(second))
+        self.assertEqual(len(list(self.key_dir.glob('*.pem'))), 2)
+
+    def test_new_keys_are_published_before_they_sign(self):
+        """
+        Ensure rotation keeps signing with the old key until the new one has been published long enough.
+        """
+        with self.signing(PUBLISH_DELAY=600):
+            old = generate_key(self.key_dir, 'RS256', time.time() - 3600)
+            new = generate_key(self.key_dir, 'RS256')
+            self.assertEqual(jwt.get_unverified_header(self.login()['access'])['kid'], old)
+            ring = get_token_backend().key_ring
+            self.assertEqual(ring.signing_key(time.time() + 601)[0], new)
+
+    def test_rotate_jwt_keys_deletes_retired_keys(self):
+        """
+        Ensure the command adds a key and deletes keys retired for longer than --retire-after.
+        """
+        with self.signing(PUBLISH_DELAY=60):
+            retired = generate_key(self.key_dir, 'EdDSA', time.time() - 7200)
+            current = generate_key(self.key_dir, 'EdDSA', time.time() - 3600)
+            out = StringIO()
+            call_command('rotate_jwt_keys', '--retire-after', '1800', stdout=out)
+
+            kids = sorted(path.stem for path in self.key_dir.glob('*.pem'))
+            self.assertEqual(len(kids), 2)
+            self.assertNotIn(retired, kids)
+            self.assertEqual(kids[0], current)
+            self.assertIn(f'Deleted retired key {retired}', out.getvalue())
+
+    def test_verifier_refetches_unknown_keys_at_most_once_per_interval(self):
+        """
+        Ensure tokens with an unknown kid cannot force a fetch on every request.
+        """
+        with self.signing():
+            generate_key(self.key_dir, 'RS256')
+            access = self.login()['access']
+            fetches = []
+            verifier = self.verifier(fetches)
+            verifier.verify(access)
+            forged = jwt.encode({'token_type': 'access'}, 's' * 32, algorithm='HS256', headers={'kid': 'unknown'})
+            for _ in range(3):
+                with self.assertRaises(jwt.InvalidTokenError):
+                    verifier.verify(forged)
+            self.assertEqual(len(fetches), 1)
+
+    def test_verifier_rejects_tokens_when_keys_cannot_be_fetched(self):
+        """
+        Ensure an unreachable or malformed JWKS endpoint fails verification instead of raising other errors.
+        """
+        with self.signing():
+            generate_key(self.key_dir, 'RS256')
+            access = self.login()['access']
+        failures = [
+            OSError('connection refused'),
+            nullcontext(SimpleNamespace(read=lambda *args: b'not json', headers={})),
+            nullcontext(SimpleNamespace(read=lambda *args: b'[]', headers={})),
+            nullcontext(SimpleNamespace(read=lambda *args: b'{"keys": [{"kid": "k", "alg": "RS256"}]}', headers={})),
+        ]
+        for failure in failures:
+            with self.subTest(failure=failure), \
+                    mock.patch('accounts.verifier.urllib.request.urlopen', side_effect=[failure]):
+                with self.assertRaises(jwt.InvalidTokenError):
+                    TokenVerifier('http://auth/.well-known/jwks.json').verify(access)
+
+
+class StatelessAuthenticationTests(APITestCase):
+    def setUp(self):
+        get_user_state_cache().reset()
+        self.user = User.objects.create_user('stateless', 'stateless@example.com', 'testpassword123', is_staff=True)
+        self.url = reverse('token-metadata-stats')
+
+    def login(self):
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'stateless', 'password': 'testpassword123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def get(self, access):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_authenticates_from_claims_without_queries(self):
+        """
+        Ensure a fresh access token authenticates, with its flags, without touching the database.
+        """
+        access = self.login()['access']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(access).status_code, status.HTTP_200_OK)
+
+    def test_password_change_and_deactivation_revoke_tokens(self):
+        """
+        Ensure tokens issued before a password change or deactivation stop working.
+        """
+        access = self.login()['access']
+        self.user.set_password('newpassword123')
+        self.user.save()
+        self.assertEqual(self.get(access).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'stateless', 'password': 'newpassword123'}, format='json'
+        )
+        access = response.data['access']
+        self.assertEqual(self.get(access).status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.get(access).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refreshed_access_token_has_current_flags(self):
+        """
+        Ensure refreshing picks up flags changed since the refresh token was issued.
+        """
+        refresh = self.login()['refresh']
+        User.objects.filter(pk=self.user.pk).update(is_verified=True)
+        get_user_state_cache().reset()
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+        self.assertTrue(AccessToken(response.data['access'])['is_verified'])
+
+    def test_refresh_token_issued_before_password_change_is_rejected(self):
+        """
+        Ensure a refresh token from before a password change cannot mint new access tokens.
+        """
+        refresh = self.login()['refresh']
+        self.user.set_password('newpassword123')
+        self.user.save()
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn('access', response.data)
+
+    def test_state_cache_expires(self):
+        """
+        Ensure cached user state is read again once its TTL has passed.
+        """
+        now = [0.0]
+        cache = UserStateCache(ttl=10, clock=lambda: now[0])
+        user_id = str(self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cache.get(user_id)['ver'], self.user.auth_version)
+            cache.get(user_id)
+        now[0] = 11
+        with self.assertNumQueries(1):
+            cache.get(user_id)
+        self.assertIsNone(cache.get('0'))
+
+
+THROTTLE_RATES = {
+    'password_reset': {'ip': '3/min', 'email': '2/min', 'global': '5/min'},
+}
+
+
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        # Overriding THROTTLING per test gives each test empty buckets
+        throttling = override_settings(THROTTLING={'ENABLED': True, 'STORE': 'memory', 'RATES': THROTTLE_RATES})
+        throttling.enable()
+        self.addCleanup(throttling.disable)
+
+    def reset(self, email, ip):
+        return self.client.post(reverse('password-reset'), {'email': email}, format='json', REMOTE_ADDR=ip)
+
+    def test_ip_bucket_sets_retry_after(self):
+        """
+        Ensure a client over its per-IP rate gets 429 with the seconds until its next token.
+        """
+        for i in range(3):
+            self.assertEqual(self.reset(f'user{i}@example.com', '10.0.0.1').status_code, status.HTTP_200_OK)
+        response = self.reset('user3@example.com', '10.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(int(response['Retry-After']), (19, 20))
+        self.assertEqual(self.reset('user3@example.com', '10.0.0.2').status_code, status.HTTP_200_OK)
+
+    def test_email_bucket_spans_ips(self):
+        """
+        Ensure one email is limited however many IPs it is requested from, ignoring case.
+        """
+        self.reset('victim@example.com', '10.0.0.1')
+        self.reset('Victim@Example.com', '10.0.0.2')
+        response = self.reset('VICTIM@example.com', '10.0.0.3')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(int(response['Retry-After']), (29, 30))
+
+    def test_refused_requests_do_not_drain_global_bucket(self):
+        """
+        Ensure requests refused per IP leave the endpoint-wide allowance for other clients.
+        """
+        for i in range(10):
+            self.reset(f'user{i}@example.com', '10.0.0.1')
+        for i in range(2):
+            self.assertEqual(self.reset(f'other{i}@example.com', f'10.0.1.{i}').status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.reset('last@example.com', '10.0.2.1').status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    @override_settings(THROTTLING={'ENABLED': False, 'RATES': THROTTLE_RATES})
+    def test_disabled(self):
+        """
+        Ensure nothing is throttled when throttling is disabled.
+        """
+        for _ in range(5):
+            self.assertEqual(self.reset('same@example.com', '10.0.0.1').status_code, status.HTTP_200_OK)
+
+    def test_bucket_refills(self):
+        """
+        Ensure a bucket allows bursts up to its size and then refills at its rate.
+        """
+        self.assertEqual(parse_rate('10/15m'), (10, 10 / 900))
+        now = [0.0]
+        store = MemoryBucketStore(clock=lambda: now[0])
+        capacity, refill_rate = parse_rate('2/min')
+        self.assertEqual([store.take('k', capacity, refill_rate) for _ in range(3)], [0, 0, 30.0])
+        now[0] = 29
+        self.assertAlmostEqual(store.take('k', capacity, refill_rate), 1.0)
+        now[0] = 30
+        self.assertEqual(store.take('k', capacity, refill_rate), 0)
+
+    def test_file_store_is_shared(self):
+        """
+        Ensure stores opened on the same file share their buckets.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'buckets')
+            first, second = FileBucketStore(path, slots=128), FileBucketStore(path, slots=128)
+            self.assertEqual(first.take('k', 2, 1 / 60), 0)
+            self.assertEqual(second.take('k', 2, 1 / 60), 0)
+            self.assertGreater(first.take('k', 2, 1 / 60), 0)
+            self.assertEqual(second.take('other', 2, 1 / 60), 0)
+            first.close()
+            second.close()
+
+
+@override_settings(THROTTLING={'ENABLED': False})
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        pool = HashingPool(workers=0)
+        patcher = mock.patch('accounts.hashing.get_hashing_pool', return_value=pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def link(self, email):
+        body = OutboundEmail.objects.filter(recipients=[email]).latest('id').body
+        return body.rsplit('\n', 1)[1].split('testserver', 1)[1]
+
+    def test_views_are_async(self):
+        """
+        Ensure the anonymous auth views are dispatched as coroutines.
+        """
+        for view in (RegisterView, VerifyEmailView, PasswordResetRequestView, PasswordResetConfirmView, LogoutView):
+            self.assertTrue(view.view_is_async, view.__name__)
+
+    async def test_register_and_verify(self):
+        """
+        Ensure registration and email verification work end to end through the async client.
+        """
+        data = {'username': 'async', 'email': 'Async@Example.com', 'password': 'testpassword123'}
+        response = await self.async_client.post(reverse('register'), data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['user'], {'username': 'async', 'email': 'Async@example.com'})
+        user = await User.objects.aget(username='async')
+        self.assertTrue(await sync_to_async(user.check_password)('testpassword123'))
+
+        response = await self.async_client.post(reverse('register'), data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.json()), {'username', 'email'})
+
+        link = await sync_to_async(self.link)('Async@example.com')
+        response = await self.async_client.get(link)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue((await User.objects.aget(username='async')).is_verified)
+
+    async def test_password_reset_and_logout(self):
+        """
+        Ensure password reset and logout work through the async client.
+        """
+        user = await sync_to_async(User.objects.create_user)('resetter', 'reset@example.com', 'oldpassword123')
+        response = await self.async_client.post(
+            reverse('password-reset'), {'email': 'RESET@example.com'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        link = await sync_to_async(self.link)('reset@example.com')
+        uidb64, token = link.strip('/').split('/')[-2:]
+        url = reverse('password-reset-confirm', kwargs={'uidb64': uidb64, 'token': token})
+        body = {'password': 'newpassword123', 'uidb64': uidb64, 'token': token}
+        response = await self.async_client.patch(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changed = await User.objects.aget(pk=user.pk)
+        self.assertEqual(changed.auth_version, user.auth_version + 1)
+        self.assertTrue(await sync_to_async(changed.check_password)('newpassword123'))
+
+        response = await self.async_client.patch(url, {**body, 'token': 'bad'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        refresh = str(await sync_to_async(RefreshToken.for_user)(changed))
+        for expected in (status.HTTP_205_RESET_CONTENT, status.HTTP_400_BAD_REQUEST):
+            response = await self.async_client.post(
+                reverse('logout'), {'refresh': refresh}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, expected)
@@ -0,0 +1,214 @@
+"""
+Token-bucket throttling for expensive anonymous endpoints.
+
+Each view names a scope in ``THROTTLING["RATES"]``, which sets a rate
+such as ``"5/min"`` for any of three keys: the client IP, the submitted
+email and the endpoint as a whole. A bucket holds up to the rate's count
+of tokens and refills continuously. Requests take one token from each of
+the scope's buckets in that order, stopping at the first empty one, so a
+client that is already refused does not drain the shared buckets.
+
+Buckets live in process memory by default. With ``STORE`` set to
+``"file"`` they live in a memory-mapped file and are shared by every
+worker on the machine, with each bucket locked on its own.
+"""
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from rest_framework.throttling import BaseThrottle
+
+from .models import normalized_email
+
+DEFAULTS = {
+    "ENABLED": True,
+    # "memory" keeps buckets per process; "file" shares them through FILE
+    "STORE": "memory",
+    "FILE": "throttle.buckets",
+    # Bucket slots in the shared file; keys that hash to a taken slot replace it
+    "SLOTS": 65536,
+    # Buckets kept per process by the memory store
+    "MAX_KEYS": 100_000,
+    "RATES": {},
+}
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+KEYS = ("ip", "email", "global")
+
+
+def throttle_setting(name):
+    return getattr(settings, "THROTTLING", {}).get(name, DEFAULTS[name])
+
+
+def parse_rate(rate):
+    """
+    Returns ``(capacity, tokens per second)`` for a rate like ``"5/min"`` or ``"10/15m"``.
+    """
+    match = re.fullmatch(r"(\d+)/(\d*)([a-z]+)", rate)
+    if match is None or match.group(3) not in PERIODS:
+        raise ImproperlyConfigured(f"Invalid throttle rate {rate!r}")
+    count = int(match.group(1))
+    seconds = int(match.group(2) or 1) * PERIODS[match.group(3)]
+    return count, count / seconds
+
+
+def _refill(tokens, updated, capacity, refill_rate, now):
+    return min(capacity, tokens + max(0.0, now - updated) * refill_rate)
+
+
+class MemoryBucketStore:
+    """
+    Buckets in process memory, split over independently locked stripes.
+    """
+    STRIPES = 64
+
+    def __init__(self, max_keys=None, clock=time.monotonic):
+        self.clock = clock
+        self.max_keys_per_stripe = max(1, (max_keys or throttle_setting("MAX_KEYS")) // self.STRIPES)
+        self._stripes = [(threading.Lock(), OrderedDict()) for _ in range(self.STRIPES)]
+
+    def take(self, key, capacity, refill_rate):
+        """
+        Takes one token from ``key``'s bucket. Returns 0 if it had one,
+        otherwise the seconds until it will.
+        """
+        now = self.clock()
+        lock, buckets = self._stripes[hash(key) % self.STRIPES]
+        with lock:
+            tokens, updated = buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, capacity, refill_rate, now)
+            if tokens >= 1:
+                buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                buckets[key] = (tokens, now)
+                wait = (1 - tokens) / refill_rate
+            buckets.move_to_end(key)
+            if len(buckets) > self.max_keys_per_stripe:
+                buckets.popitem(last=False)
+        return wait
+
+
+class FileBucketStore:
+    """
+    Buckets in a memory-mapped file shared by the processes on one machine.
+
+    Each slot holds a key hash, a token count and a wall-clock timestamp,
+    and is locked with ``fcntl`` on its own byte range.
+    """
+    SLOT = struct.Struct("<Qdd")
+
+    def __init__(self, path=None, slots=None, clock=time.time):
+        try:
+            import fcntl
+        except ImportError:
+            raise ImproperlyConfigured('THROTTLING["STORE"] = "file" requires fcntl (POSIX)')
+        self._fcntl = fcntl
+        self.clock = clock
+        self.slots = slots or throttle_setting("SLOTS")
+        path = path or os.path.join(settings.BASE_DIR, throttle_setting("FILE"))
+        size = self.slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        offset = (digest % self.slots) * self.SLOT.size
+        # fcntl locks are per process, so threads also need the thread lock
+        with self._lock:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, self.SLOT.size, offset)
+            try:
+                now = self.clock()
+                owner, tokens, updated = self.SLOT.unpack_from(self._map, offset)
+                if owner != digest:
+                    tokens, updated = capacity, now
+                tokens = _refill(tokens, updated, capacity, refill_rate, now)
+                if tokens >= 1:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = (1 - tokens) / refill_rate
+                self.SLOT.pack_into(self._map, offset, digest, tokens, now)
+            finally:
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, self.SLOT.size, offset)
+        return wait
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    """
+    Returns the process-wide bucket store for ``THROTTLING["STORE"]``.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FileBucketStore() if throttle_setting("STORE") == "file" else MemoryBucketStore()
+        return _store
+
+
+def _reset_store(setting, **kwargs):
+    global _store
+    if setting == "THROTTLING":
+        with _store_lock:
+            _store = None
+
+
+setting_changed.connect(_reset_store, dispatch_uid="accounts.throttling")
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles a view by the buckets configured for its ``throttle_scope``.
+    """
+
+    def allow_request(self, request, view):
+        self._wait = None
+        if not throttle_setting("ENABLED"):
+            return True
+        scope = getattr(view, "throttle_scope", None)
+        rates = throttle_setting("RATES").get(scope)
+        if not rates:
+            return True
+
+        store = get_bucket_store()
+        for kind in KEYS:
+            if kind not in rates:
+                continue
+            value = self.get_key(request, kind)
+            if value is None:
+                continue
+            capacity, refill_rate = parse_rate(rates[kind])
+            wait = store.take(f"{scope}:{kind}:{value}", capacity, refill_rate)
+            if wait:
+                self._wait = wait
+                return False
+        return True
+
+    def get_key(self, request, kind):
+        if kind == "ip":
+            return self.get_ident(request)
+        if kind == "email":
+            email = request.data.get("email") if hasattr(request.data, "get") else None
+            return normalized_email(email) if isinstance(email, str) else None
+        return ""
+
+    def wait(self):
+        return self._wait
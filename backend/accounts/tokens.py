@@ -0,0 +1,81 @@
+"""
+JWT token classes used by the auth endpoints.
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from auth_project.db import read_replica
+
+from .authentication import VERSION_CLAIM, get_user_state_cache, user_claims
+from .revocation import get_revocation_cache, revocation_setting
+from .signing import get_token_backend
+
+
+class KeyRingMixin:
+    """
+    Signs and verifies with the ``JWT_SIGNING`` backend instead of simplejwt's.
+    """
+
+    @property
+    def token_backend(self):
+        return get_token_backend()
+
+
+class AccessToken(KeyRingMixin, tokens.AccessToken):
+    pass
+
+
+class RefreshToken(KeyRingMixin, tokens.RefreshToken):
+    """
+    A refresh token whose blacklist check goes through the in-process
+    revocation cache instead of querying the blacklist every time.
+    """
+    access_token_class = AccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        claims = user_claims(user)
+        for claim, value in claims.items():
+            token[claim] = value
+        # The first requests with the new access token need no lookup
+        get_user_state_cache().set(str(token[api_settings.USER_ID_CLAIM]), claims)
+        return token
+
+    @property
+    def access_token(self):
+        """
+        Returns an access token carrying the user's current flags. Raises
+        ``TokenError`` if the user's password or status has changed since
+        this refresh token was issued.
+        """
+        access = super().access_token
+        version = self.payload.get(VERSION_CLAIM)
+        if version is None:
+            # Issued before tokens carried claims; the access token falls back to a user lookup
+            return access
+        claims = get_user_state_cache().get(str(self[api_settings.USER_ID_CLAIM]))
+        if claims is None or claims[VERSION_CLAIM] != version:
+            raise TokenError(_("Token was issued before the user's credentials changed"))
+        # Flags copied from the refresh token may be out of date
+        for claim, value in claims.items():
+            access[claim] = value
+        return access
+
+    def check_blacklist(self):
+        if not revocation_setting("ENABLED"):
+            with read_replica():
+                return super().check_blacklist()
+        if get_revocation_cache().is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
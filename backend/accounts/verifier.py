@@ -0,0 +1,103 @@
+"""
+Local verification of tokens issued by this service, for other services.
+
+This module needs only PyJWT with cryptography, not Django, so other
+services can import or copy it::
+
+    verifier = TokenVerifier("https://auth.example.com/.well-known/jwks.json")
+    payload = verifier.verify(access_token)
+
+Keys are fetched from the JWKS endpoint and kept in memory for as long as
+its ``Cache-Control: max-age`` allows. Verifying a token makes no network
+call unless the cache has expired or the token names a key not yet seen,
+and unknown keys trigger at most one refetch per ``min_refresh`` seconds.
+"""
+import json
+import re
+import threading
+import time
+import urllib.request
+
+import jwt
+
+ALGORITHMS = ("RS256", "EdDSA")
+
+
+class TokenVerifier:
+    def __init__(self, jwks_url, audience=None, issuer=None, token_type="access",
+                 default_max_age=300, min_refresh=30, timeout=5, clock=time.monotonic):
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self.issuer = issuer
+        self.token_type = token_type
+        self.default_max_age = default_max_age
+        self.min_refresh = min_refresh
+        self.timeout = timeout
+        self.clock = clock
+        self._keys = {}
+        self._expires_at = 0
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def verify(self, token):
+        """
+        Returns the payload of a valid, unexpired token of ``token_type``.
+        Raises ``jwt.InvalidTokenError`` otherwise.
+        """
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.get_key(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key {kid!r}")
+        payload = jwt.decode(
+            token, key.key, algorithms=[key.algorithm_name], audience=self.audience, issuer=self.issuer,
+            options={"verify_aud": self.audience is not None},
+        )
+        if self.token_type and payload.get("token_type") != self.token_type:
+            raise jwt.InvalidTokenError("Wrong token type")
+        return payload
+
+    def get_key(self, kid):
+        """
+        Returns the ``jwt.PyJWK`` for ``kid``, refetching the key set if it is
+        stale or, rate limited, if ``kid`` is not in it. Stale keys keep
+        working if the endpoint cannot be reached; otherwise a failed fetch
+        raises ``jwt.InvalidTokenError``.
+        """
+        now = self.clock()
+        key = self._keys.get(kid)
+        if key is not None and now < self._expires_at:
+            return key
+        with self._lock:
+            key = self._keys.get(kid)
+            if key is not None and now < self._expires_at:
+                return key
+            if self._fetched_at is None or now >= self._expires_at \
+                    or now - self._fetched_at >= self.min_refresh:
+                try:
+                    self._fetch(now)
+                except (OSError, ValueError, jwt.PyJWTError) as exc:
+                    # Keep verifying with the keys we have while the endpoint is down
+                    if key is None:
+                        raise jwt.InvalidTokenError(f"Could not fetch signing keys: {exc}") from exc
+                    self._fetched_at = now
+                    self._expires_at = now + self.min_refresh
+            return self._keys.get(kid)
+
+    def _fetch(self, now):
+        request = urllib.request.Request(self.jwks_url, headers={"Accept": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            document = json.load(response)
+            max_age = self._max_age(response.headers.get("Cache-Control", ""))
+        if not isinstance(document, dict) or not isinstance(document.get("keys", []), list):
+            raise ValueError("Not a JWK set")
+        keys = {}
+        for data in document.get("keys", []):
+            if isinstance(data, dict) and data.get("alg") in ALGORITHMS and data.get("kid"):
+                keys[data["kid"]] = jwt.PyJWK(data)
+        self._keys = keys
+        self._fetched_at = now
+        self._expires_at = now + max_age
+
+    def _max_age(self, cache_control):
+        match = re.search(r"max-age=(\d+)", cache_control)
+        return int(match.group(1)) if match else self.default_max_age
@@ -1,57 +1,71 @@
-import jwt
-from django.conf import settings
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
+from django.http import HttpResponse, HttpResponseNotModified
 from django.urls import reverse
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.encoding import smart_bytes
-from django.utils.http import urlsafe_base64_encode
-from rest_framework import generics, status, views
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, urlsafe_base64_encode
+from django.views.decorators.http import require_GET
+from rest_framework import status
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-
+from rest_framework_simplejwt.exceptions import ExpiredTokenError, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from auth_project.db import read_replica
+from . import signing
+from .async_views import AsyncAPIView, AsyncGenericAPIView
+from .authentication import user_claims
+from .mail import aenqueue_email
+from .models import normalized_email
 from .serializers import (
     RegisterSerializer,
     SetNewPasswordSerializer,
     PasswordResetRequestSerializer,
 )
+from .throttling import TokenBucketThrottle
+from .tokens import AccessToken, RefreshToken
 
 User = get_user_model()
 
 
-def send_verification_email(user, request):
+def verification_token(user):
+    """
+    Returns the access token sent in a user's verification link.
+    """
+    token = AccessToken.for_user(user)
+    for claim, value in user_claims(user).items():
+        token[claim] = value
+    return token
+
+
+async def send_verification_email(user, request):
     """
-    Sends a verification email to the user.
+    Queues a verification email for the user.
     """
-    token = RefreshToken.for_user(user).access_token
     relative_link = reverse('verify-email')
-    abs_url = request.build_absolute_uri(relative_link) + "?token=" + str(token)
+    abs_url = request.build_absolute_uri(relative_link) + "?token=" + str(verification_token(user))
 
     email_subject = 'Verify your email'
     email_body = f'Hi {user.username}, please use the link below to verify your email:\n{abs_url}'
 
-    send_mail(
-        email_subject,
-        email_body,
-        'noreply@yourdomain.com',
-        [user.email],
-        fail_silently=False,
-    )
+    await aenqueue_email(email_subject, email_body, 'noreply@yourdomain.com', [user.email])
 
 
-class RegisterView(generics.GenericAPIView):
+class RegisterView(AsyncGenericAPIView):
     """
     API view for user registration.
     """
     serializer_class = RegisterSerializer
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "register"
 
-    def post(self, request):
+    async def post(self, request):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        user = serializer.save()
+        await serializer.ais_valid(raise_exception=True)
+        user = await serializer.acreate(serializer.validated_data)
 
-        # Send verification email
-        send_verification_email(user, request)
+        # Queue verification email
+        await send_verification_email(user, request)
 
         return Response(
             {
@@ -62,39 +76,57 @@ class RegisterView(generics.GenericAPIView):
         )
 
 
-class VerifyEmailView(views.APIView):
+class VerifyEmailView(AsyncAPIView):
     """
     API view to verify user's email.
     """
-    def get(self, request):
-        token = request.GET.get('token')
+    async def get(self, request):
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            user = User.objects.get(id=payload['user_id'])
+            payload = AccessToken(request.GET.get('token') or '').payload
+            user = await User.objects.aget(id=payload[api_settings.USER_ID_CLAIM])
             if not user.is_verified:
                 user.is_verified = True
-                user.save()
+                await user.asave()
             return Response({'message': 'Successfully activated'}, status=status.HTTP_200_OK)
-        except jwt.ExpiredSignatureError:
+        except ExpiredTokenError:
             return Response({'error': 'Activation link expired'}, status=status.HTTP_400_BAD_REQUEST)
-        except jwt.exceptions.DecodeError:
+        except TokenError:
             return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PasswordResetRequestView(generics.GenericAPIView):
+@require_GET
+def jwks(request):
+    """
+    Serves the public keys tokens are signed with, for verification by other services.
+    """
+    body, etag = signing.jwks()
+    tags = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in tags or etag in (tag.removeprefix('W/') for tag in tags):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=signing.signing_setting('JWKS_MAX_AGE'))
+    return response
+
+
+class PasswordResetRequestView(AsyncGenericAPIView):
     """
     API view to request a password reset.
     """
     serializer_class = PasswordResetRequestSerializer
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "password_reset"
 
-    def post(self, request):
+    async def post(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         email = serializer.validated_data['email']
 
-        user = User.objects.filter(email=email).first()
+        with read_replica():
+            user = await User.objects.filter(email_normalized=normalized_email(email)).afirst()
         if user:
-            # Generate token and send email
+            # Generate token and queue the email
             uidb64 = urlsafe_base64_encode(smart_bytes(user.id))
             token = PasswordResetTokenGenerator().make_token(user)
 
@@ -104,13 +136,7 @@ class PasswordResetRequestView(generics.GenericAPIView):
             email_subject = 'Reset your password'
             email_body = f'Hi {user.username}, please use the link below to reset your password:\n{abs_url}'
 
-            send_mail(
-                email_subject,
-                email_body,
-                'noreply@yourdomain.com',
-                [user.email],
-                fail_silently=False,
-            )
+            await aenqueue_email(email_subject, email_body, 'noreply@yourdomain.com', [user.email])
 
         return Response(
             {'message': 'If an account with this email exists, a password reset link has been sent.'},
@@ -118,27 +144,30 @@ class PasswordResetRequestView(generics.GenericAPIView):
         )
 
 
-class PasswordResetConfirmView(generics.GenericAPIView):
+class PasswordResetConfirmView(AsyncGenericAPIView):
     """
     API view to confirm a password reset.
     """
     serializer_class = SetNewPasswordSerializer
 
-    def patch(self, request, *args, **kwargs):
+    async def patch(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        await serializer.ais_valid(raise_exception=True)
         return Response({'message': 'Password reset successful'}, status=status.HTTP_200_OK)
 
 
-class LogoutView(views.APIView):
+class LogoutView(AsyncAPIView):
     """
     API view for user logout.
     """
-    def post(self, request):
+    async def post(self, request):
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
-            token.blacklist()
+            # simplejwt's blacklist has no async API
+            await sync_to_async(self.blacklist)(refresh_token)
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    def blacklist(self, refresh_token):
+        RefreshToken(refresh_token).blacklist()
@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The escrow event stream (/api/escrows/stream/) holds connections open and
+must be served through this module, e.g. ``uvicorn auth_project.asgi:application``.
 """
 
 import os
@@ -12,5 +15,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auth_project.settings")
+# Read by auth_project.db to default DB_CONN_MAX_AGE to 0
+os.environ.setdefault("DJANGO_ASGI", "1")
 
 application = get_asgi_application()
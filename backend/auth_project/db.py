@@ -0,0 +1,95 @@
+"""
+Database connection settings and read-replica routing.
+
+``database()`` builds a ``DATABASES`` entry from environment variables.
+SQLite connections run in WAL mode with a busy timeout, so concurrent
+writers wait for the lock instead of failing with "database is locked".
+Transactions start with ``BEGIN IMMEDIATE`` for the same reason: a
+deferred transaction that reads and then writes cannot wait for the lock.
+
+``ReplicaRouter`` sends reads made inside ``read_replica()`` to the
+``replica`` alias when one is configured. Everything else, and every
+write, goes to ``default``. Only wrap reads that tolerate replication lag.
+"""
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = "replica"
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def database(prefix, default_name):
+    """
+    Returns a ``DATABASES`` entry configured from ``<prefix>_*`` variables:
+    ``ENGINE`` (``sqlite3`` or ``postgresql``), ``NAME``, ``HOST``, ``PORT``,
+    ``USER`` and ``PASSWORD``. Connection reuse is set by ``DB_CONN_MAX_AGE``
+    and, for PostgreSQL, ``DB_POOL``; it defaults to 0 under ASGI.
+    Variables missing under ``prefix`` fall back to their ``DB_*`` value,
+    so a replica only needs what differs.
+    """
+    def env(name, default=""):
+        return os.environ.get(f"{prefix}_{name}") or os.environ.get(f"DB_{name}", default)
+
+    engine = env("ENGINE", "sqlite3")
+    config = {
+        "ENGINE": f"django.db.backends.{engine}",
+        "NAME": env("NAME") or default_name,
+        # Seconds a connection is kept for later requests on the same thread.
+        # ASGI runs each request's sync code in a thread of its own, where a
+        # kept connection is never reused and stays open, so keep none there.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0 if os.environ.get("DJANGO_ASGI") == "1" else 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    if engine == "sqlite3":
+        config["OPTIONS"] = {
+            # Seconds to wait for a lock; sets SQLite's busy_timeout
+            "timeout": float(os.environ.get("SQLITE_BUSY_TIMEOUT", 20)),
+            "transaction_mode": "IMMEDIATE",
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                f"PRAGMA synchronous={os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')};"
+            ),
+        }
+    else:
+        config.update(HOST=env("HOST"), PORT=env("PORT"), USER=env("USER"), PASSWORD=env("PASSWORD"))
+        if os.environ.get("DB_POOL") == "1":
+            # psycopg's pool replaces persistent connections (needs psycopg[pool])
+            config["OPTIONS"]["pool"] = True
+            config["CONN_MAX_AGE"] = 0
+    return config
+
+
+@contextmanager
+def read_replica():
+    """
+    Routes reads in this block to the replica, if one is configured.
+    Also usable as a decorator.
+    """
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and REPLICA_DB_ALIAS in settings.DATABASES:
+            return REPLICA_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects read from the replica would otherwise be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .db import database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,14 +43,20 @@ INSTALLED_APPS = [
     # 3rd party apps
     "rest_framework",
     "rest_framework_simplejwt",
+    "rest_framework_simplejwt.token_blacklist",
     # local apps
     "accounts",
+    "escrows",
+    "monitoring",
 ]
 
 # Custom user model
 AUTH_USER_MODEL = "accounts.User"
 
 MIDDLEWARE = [
+    "monitoring.middleware.MetricsMiddleware",
+    "monitoring.shedding.LoadSheddingMiddleware",
+    "monitoring.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -80,12 +89,34 @@ WSGI_APPLICATION = "auth_project.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Configured from DB_* variables (see auth_project.db). Setting DB_REPLICA_NAME
+# or DB_REPLICA_HOST adds a "replica" alias for reads that tolerate lag.
+
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+    "default": database("DB", BASE_DIR / "db.sqlite3"),
+}
+if os.environ.get("DB_REPLICA_NAME") or os.environ.get("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **database("DB_REPLICA", DATABASES["default"]["NAME"]),
+        "TEST": {"MIRROR": "default"},
     }
+
+DATABASE_ROUTERS = ["auth_project.db.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Per process by default; set CACHE_REDIS_URL (requires redis) to share
+# cached responses between workers.
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
 }
+if os.environ.get("CACHE_REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["CACHE_REDIS_URL"],
+    }
 
 
 # Password validation
@@ -134,11 +165,211 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.StatelessJWTAuthentication",
     ),
 }
 
+SIMPLE_JWT = {
+    "AUTH_TOKEN_CLASSES": ("accounts.tokens.AccessToken",),
+    "TOKEN_OBTAIN_SERIALIZER": "accounts.tokens.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "accounts.tokens.TokenRefreshSerializer",
+}
+
+# Authenticated requests build request.user from access token claims and
+# check the user's auth version against this per-process cache (see
+# accounts.authentication).
+USER_STATE_CACHE = {
+    "TTL": 10.0,
+    "MAX_ENTRIES": 10_000,
+}
+
+# Registration and password reset requests are rate limited by token buckets
+# per client IP, per email and per endpoint (see accounts.throttling). Set
+# THROTTLE_STORE=file to share the buckets between worker processes.
+THROTTLING = {
+    "ENABLED": os.environ.get("THROTTLE_ENABLED", "1") == "1",
+    "STORE": os.environ.get("THROTTLE_STORE", "memory"),
+    "FILE": "throttle.buckets",
+    "SLOTS": 65536,
+    "MAX_KEYS": 100_000,
+    "RATES": {
+        "register": {"ip": "10/hour", "global": "300/min"},
+        "password_reset": {"ip": "10/hour", "email": "3/hour", "global": "300/min"},
+    },
+}
+
+# Set JWT_ALGORITHM=RS256 or EdDSA (requires cryptography) to sign tokens with
+# rotating key pairs published at /.well-known/jwks.json (see accounts.signing).
+# Create the first key with `python manage.py rotate_jwt_keys`.
+JWT_SIGNING = {
+    "ALGORITHM": os.environ.get("JWT_ALGORITHM", "HS256"),
+    "KEY_DIR": os.environ.get("JWT_KEY_DIR", "jwt_keys"),
+    "JWKS_MAX_AGE": 300,
+    "PUBLISH_DELAY": 600,
+}
+
+# Blacklisted refresh tokens are checked against an in-process Bloom filter
+# (see accounts.revocation) rather than with a query per refresh.
+TOKEN_REVOCATION = {
+    "ENABLED": True,
+    "CAPACITY": 100_000,
+    "ERROR_RATE": 0.001,
+    "SYNC_INTERVAL": 1.0,
+    "REBUILD_INTERVAL": 3600,
+    "RESCAN_WINDOW": 1000,
+    "CONFIRMED_SIZE": 10_000,
+}
+
+# Expired tokens are deleted by `python manage.py compact_tokens` in batches
+# that shrink when deletes get slow (see accounts.compaction).
+TOKEN_COMPACTION = {
+    "BATCH_SIZE": 500,
+    "MIN_BATCH_SIZE": 50,
+    "MAX_BATCH_SIZE": 5000,
+    "TARGET_LATENCY": 0.05,
+    "DUTY_CYCLE": 0.25,
+    "MAX_RUNTIME": 30,
+}
+
+# Request metrics, served in Prometheus format at /metrics
+MONITORING = {
+    "METRICS_ENABLED": os.environ.get("METRICS_ENABLED", "1") == "1",
+    "METRICS_TOKEN": os.environ.get("METRICS_TOKEN") or None,
+    # Sampled cProfile dumps, summarized by `python manage.py profile_report`
+    "PROFILE_SAMPLE_RATE": float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+    "PROFILE_HEADER": "X-Profile-Token",
+    "PROFILE_TOKEN_MAX_AGE": 3600,
+    "PROFILE_DIR": os.environ.get("PROFILE_DIR", "profiles"),
+    "PROFILE_MAX_FILES": 500,
+}
+
+# Each process adapts how many requests it works on at once to their latency
+# and sheds the rest with 503, lowest priority first (see monitoring.shedding).
+LOAD_SHEDDING = {
+    "ENABLED": os.environ.get("LOAD_SHEDDING_ENABLED", "1") == "1",
+    "INITIAL_LIMIT": 20,
+    "MIN_LIMIT": 4,
+    "MAX_LIMIT": 200,
+    "SMOOTHING": 0.2,
+    "TOLERANCE": 1.5,
+    "LONG_WINDOW": 600,
+    "MAX_QUEUE": 50,
+    "QUEUE_TIMEOUT": 0.05,
+    "PRIORITIES": {"critical": 1.0, "default": 0.8, "low": 0.5},
+    "ROUTES": {
+        "token_obtain_pair": "critical",
+        "token_refresh": "critical",
+        "logout": "critical",
+        "register": "low",
+        "password-reset": "low",
+        "escrow-summary": "low",
+    },
+    "EXEMPT": ("metrics",),
+    "RETRY_AFTER": 1,
+}
+
 # Email backend
 # https://docs.djangoproject.com/en/5.2/topics/email/
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+
+# Outbound mail queue, drained by `python manage.py send_queued_mail`
+MAIL_OUTBOX = {
+    "BATCH_SIZE": 50,
+    "MAX_ATTEMPTS": 5,
+    "BACKOFF_BASE": 30,
+    "BACKOFF_MAX": 3600,
+    "LEASE": 300,
+}
+
+# Password hashing
+# Hashes run in a process pool (see accounts.hashing). Set PASSWORD_HASHER=argon2
+# to hash new passwords with Argon2id (requires argon2-cffi); existing PBKDF2
+# hashes keep working and are upgraded on the next login.
+
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "accounts.hashing.Argon2idPasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+if os.environ.get("PASSWORD_HASHER") == "argon2":
+    PASSWORD_HASHERS[:2] = PASSWORD_HASHERS[1::-1]
+
+PASSWORD_HASHING = {
+    "WORKERS": int(os.environ.get("PASSWORD_HASHING_WORKERS", os.cpu_count() or 1)),
+    "MAX_QUEUE": 64,
+    "TIMEOUT": 10,
+    "RETRY_AFTER": 1,
+    "ARGON2": {"TIME_COST": 2, "MEMORY_COST": 19456, "PARALLELISM": 1},
+}
+
+# Ethereum node and escrow indexer
+# The factory default matches the first deployment on a local Hardhat node.
+
+ETH_RPC_URL = os.environ.get("ETH_RPC_URL", "http://127.0.0.1:8545")
+
+ETH_RPC = {
+    "TIMEOUT": 10,
+    "POOL_SIZE": 8,
+    "MAX_CONCURRENCY": int(os.environ.get("ETH_RPC_MAX_CONCURRENCY", 8)),
+    "MAX_BATCH_SIZE": 100,
+    # Multicall3 address; when set, eth_calls are aggregated into aggregate3 calls
+    "MULTICALL_ADDRESS": os.environ.get("ETH_MULTICALL_ADDRESS") or None,
+}
+
+ESCROW_FACTORY_ADDRESS = os.environ.get(
+    "ESCROW_FACTORY_ADDRESS", "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+)
+
+# In-process LRU in front of the TokenMetadata table
+TOKEN_METADATA = {
+    "CACHE_SIZE": 1024,
+}
+
+# Server-sent escrow deltas, per ASGI worker
+ESCROW_STREAM = {
+    "POLL_INTERVAL": 1.0,
+    "BUFFER_SIZE": 100,
+    "HEARTBEAT": 15.0,
+    "BACKLOG_LIMIT": 500,
+}
+
+ESCROW_INDEXER = {
+    "START_BLOCK": int(os.environ.get("ESCROW_INDEXER_START_BLOCK", 0)),
+    "CHUNK_SIZE": 2000,
+    "BATCH_SIZE": 5,
+    "CONFIRMATIONS": int(os.environ.get("ESCROW_INDEXER_CONFIRMATIONS", 0)),
+}
+
+# Batched allowance and balance reads at /api/escrows/allowances/, cached per
+# block; the chain head is rechecked every HEAD_TTL seconds
+ESCROW_ALLOWANCES = {
+    "MAX_ITEMS": 200,
+    "CACHE_SIZE": 10000,
+    "HEAD_TTL": 1.0,
+}
+
+# Rendered escrow list and detail responses, stored under versioned ETags
+# (see escrows.caching). Point CACHES at Redis to share them between workers.
+ESCROW_RESPONSE_CACHE = {
+    "ENABLED": os.environ.get("ESCROW_RESPONSE_CACHE_ENABLED", "1") == "1",
+    "CACHE": "default",
+    "TIMEOUT": 300,
+}
+
+# `python manage.py reconcile_escrows` compares indexed escrows with their
+# contracts and repairs drift (see escrows.reconcile). RPC_BUDGET caps its
+# eth_calls per second so it can share a rate-limited node.
+ESCROW_RECONCILER = {
+    "BATCH_SIZE": 200,
+    "WORKERS": 4,
+    "RPC_BUDGET": float(os.environ.get("ESCROW_RECONCILER_RPC_BUDGET", 0)),
+}
+
+# History exports at /api/escrows/export/ and `python manage.py
+# export_escrow_history`, streamed a chunk of rows at a time
+ESCROW_EXPORT = {
+    "CHUNK_SIZE": 2000,
+    "EVENTS": ("EscrowCreated", "Deposited", "Released", "Refunded", "DisputeResolved"),
+}
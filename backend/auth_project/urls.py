@@ -18,7 +18,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from accounts.views import jwks
+from monitoring.views import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/", include("accounts.urls")),
+    path("api/escrows/", include("escrows.urls")),
+    path("metrics", metrics, name="metrics"),
+    path(".well-known/jwks.json", jwks, name="jwks"),
 ]
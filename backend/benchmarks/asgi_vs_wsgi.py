@@ -0,0 +1,138 @@
+"""
+Auth endpoints served through Django's WSGI and ASGI handlers.
+
+Sends ``--requests`` registrations and password reset requests through
+the WSGI handler from a pool of ``--threads`` threads, like a threaded
+WSGI server, then through the ASGI handler on one event loop with up to
+``--concurrency`` requests in flight. It reports throughput, latency
+and the most threads the process used::
+
+    python -m benchmarks.asgi_vs_wsgi --requests 200 --threads 8 --concurrency 100
+
+Registration spends most of its time waiting on the password hashing
+pool. A WSGI worker holds a thread for every request it waits on, while
+the ASGI handler serves them all from one loop. Requests past what the
+pool can hash within its timeout get 503, counted as errors.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .common import print_table, setup_django, summarize, write_json
+
+ENDPOINTS = ("register", "password-reset")
+
+
+def payload(endpoint):
+    if endpoint == "register":
+        name = uuid.uuid4().hex[:12]
+        return {"username": name, "email": f"{name}@example.com", "password": "benchmark-password"}
+    return {"email": "nobody@example.com"}
+
+
+class PeakThreads:
+    """
+    Samples the process's thread count in the background.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_wsgi(url, endpoint, requests, threads):
+    from django.test import Client
+
+    local = threading.local()
+
+    def send(_):
+        if not hasattr(local, "client"):
+            local.client = Client()
+        client = local.client
+        start = time.perf_counter()
+        response = client.post(url, payload(endpoint), content_type="application/json")
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(send, range(requests)))
+
+
+async def run_asgi(url, endpoint, requests, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send():
+        async with slots:
+            start = time.perf_counter()
+            response = await client.post(url, payload(endpoint), content_type="application/json")
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+    return await asyncio.gather(*(send() for _ in range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=str(Path(tempfile.gettempdir()) / "asgi-bench.sqlite3"))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and handler.")
+    parser.add_argument("--threads", type=int, default=8, help="WSGI worker threads.")
+    parser.add_argument("--concurrency", type=int, default=100, help="ASGI requests in flight.")
+    parser.add_argument("--json", help="Write results to this file.")
+    args = parser.parse_args()
+
+    # Every request comes from one client and would otherwise be limited
+    os.environ.setdefault("THROTTLE_ENABLED", "0")
+    os.environ.setdefault("LOAD_SHEDDING_ENABLED", "0")
+    setup_django(args.db)
+    from django.urls import reverse
+
+    results = []
+    for endpoint in ENDPOINTS:
+        url = reverse(endpoint)
+        for handler in ("wsgi", "asgi"):
+            start = time.perf_counter()
+            with PeakThreads() as threads:
+                if handler == "wsgi":
+                    samples = run_wsgi(url, endpoint, args.requests, args.threads)
+                else:
+                    samples = asyncio.run(run_asgi(url, endpoint, args.requests, args.concurrency))
+            elapsed = time.perf_counter() - start
+            summary = summarize([ms for ms, _ in samples])
+            results.append({
+                "endpoint": endpoint,
+                "handler": handler,
+                "errors": sum(1 for _, code in samples if code >= 400),
+                "req_per_s": len(samples) / elapsed,
+                "p50_ms": summary["p50"],
+                "p99_ms": summary["p99"],
+                "threads": threads.peak,
+            })
+
+    print_table(results, ["endpoint", "handler", "errors", "req_per_s", "p50_ms", "p99_ms", "threads"])
+    if args.json:
+        write_json(args.json, {"results": results, **vars(args)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Auth flow load test: register, verify email, log in, refresh and log out.
+
+Runs the whole flow for ``--users`` new accounts from ``--concurrency``
+threads and reports requests per second and p50/p95/p99 latency for each
+endpoint. Requests go through the Django test client in this process, or
+with ``--url`` to a running server::
+
+    python -m benchmarks.auth_flow --users 200 --concurrency 8 --json auth.json
+    python -m benchmarks.auth_flow --url http://127.0.0.1:8000 --db db.sqlite3
+
+Verification links are read from the mail outbox, so against a server
+``--db`` must point at the server's database. With ``--baseline`` the run
+exits with status 1 if any endpoint is more than ``--threshold`` slower
+than in a previous ``--json`` file.
+
+Every flow comes from one client IP, so throttling is turned off for
+in-process runs; start a server under test with ``THROTTLE_ENABLED=0``.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from .common import print_table, read_json, regressions, setup_django, summarize, write_json
+
+ENDPOINTS = ["register", "verify-email", "login", "refresh", "logout"]
+PASSWORD = "correct horse battery staple"
+
+
+class InProcessClient:
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client()
+
+    def request(self, method, path, data=None, token=None):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        if method == "GET":
+            response = self.client.get(path, **headers)
+        else:
+            response = self.client.post(path, data, content_type="application/json", **headers)
+        return response.status_code, json.loads(response.content) if response.content else None
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, data=None, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, content = e.code, e.read()
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+
+def verification_path(username):
+    """
+    Returns the path and query of the link in ``username``'s verification email.
+    """
+    from accounts.models import OutboundEmail
+
+    message = OutboundEmail.objects.filter(body__contains=f"Hi {username},").latest("id")
+    url = urlsplit(message.body.split()[-1])
+    return f"{url.path}?{url.query}"
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.lock = threading.Lock()
+
+    def call(self, client, endpoint, expected, method, path, data=None, token=None):
+        start = time.perf_counter()
+        status, body = client.request(method, path, data, token)
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            if status != expected:
+                self.errors[endpoint] += 1
+                return None
+            self.latencies[endpoint].append(elapsed)
+        return body if body is not None else {}
+
+
+def flow(client, recorder, username):
+    """
+    Runs the flow for one new user, stopping at the first failed step.
+    """
+    body = recorder.call(client, "register", 201, "POST", "/api/auth/register/", {
+        "username": username, "email": f"{username}@example.com", "password": PASSWORD,
+    })
+    if body is None:
+        return False
+    if recorder.call(client, "verify-email", 200, "GET", verification_path(username)) is None:
+        return False
+    tokens = recorder.call(client, "login", 200, "POST", "/api/auth/login/", {
+        "username": username, "password": PASSWORD,
+    })
+    if tokens is None:
+        return False
+    refresh = {"refresh": tokens["refresh"]}
+    if recorder.call(client, "refresh", 200, "POST", "/api/auth/login/refresh/", refresh) is None:
+        return False
+    return recorder.call(client, "logout", 205, "POST", "/api/auth/logout/", refresh, tokens["access"]) is not None
+
+
+def run(make_client, users, concurrency, warmup):
+    run_id = uuid.uuid4().hex[:8]
+    local = threading.local()
+
+    def worker(recorder, username):
+        if not hasattr(local, "client"):
+            local.client = make_client()
+        return flow(local.client, recorder, username)
+
+    # Warm-up flows start the hashing pool and fill caches
+    with ThreadPoolExecutor(concurrency) as threads:
+        list(threads.map(lambda i: worker(Recorder(), f"warm-{run_id}-{i}"), range(warmup)))
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as threads:
+        completed = sum(threads.map(lambda i: worker(recorder, f"bench-{run_id}-{i}"), range(users)))
+    elapsed = time.perf_counter() - start
+
+    rows = []
+    for endpoint in ENDPOINTS:
+        latency = summarize(recorder.latencies[endpoint])
+        rows.append({
+            "endpoint": endpoint,
+            "requests": latency["count"],
+            "errors": recorder.errors[endpoint],
+            "req_per_s": latency["count"] / elapsed,
+            "p50_ms": latency.get("p50"),
+            "p95_ms": latency.get("p95"),
+            "p99_ms": latency.get("p99"),
+        })
+    return {"flows_per_s": completed / elapsed, "completed": completed, "endpoints": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="Flows to run, one new user each.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Flows running at once.")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--url", help="Send requests to this server instead of the in-process test client.")
+    parser.add_argument("--db", help="SQLite database; with --url, the server's database.")
+    parser.add_argument("--json", help="Write results to this file.")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline, as a fraction.")
+    args = parser.parse_args()
+
+    if args.url:
+        setup_django(args.db, migrate=False)
+        results = run(lambda: HTTPClient(args.url), args.users, args.concurrency, args.warmup)
+    else:
+        os.environ.setdefault("THROTTLE_ENABLED", "0")
+        setup_django(args.db or Path(tempfile.gettempdir()) / "auth-flow-bench.sqlite3")
+        results = run(InProcessClient, args.users, args.concurrency, args.warmup)
+    results.update(mode="server" if args.url else "in-process", users=args.users, concurrency=args.concurrency)
+
+    print_table(results["endpoints"], ["endpoint", "requests", "errors", "req_per_s", "p50_ms", "p95_ms", "p99_ms"])
+    print(f"\n{results['completed']}/{args.users} flows completed, {results['flows_per_s']:.1f} flows/s")
+    if args.json:
+        write_json(args.json, results)
+
+    if args.baseline:
+        found = regressions(
+            results["endpoints"], read_json(args.baseline)["endpoints"], "endpoint", args.threshold,
+            higher_is_better=["req_per_s"], lower_is_better=["p95_ms", "p99_ms"],
+        )
+        if found:
+            sys.exit("Regressions against {}:\n  {}".format(args.baseline, "\n  ".join(found)))
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Shared helpers for the scripts in this package.
+
+Benchmarks run against their own SQLite file rather than the development
+database, and are started from the ``backend`` directory, e.g.::
+
+    python -m benchmarks.escrow_list --rows 1000000
+"""
+import json
+import os
+import statistics
+import time
+
+
+def setup_django(db_path=None, migrate=True):
+    """
+    Configures Django for a standalone script, optionally pointing the
+    default database at ``db_path``, and applies migrations unless
+    ``migrate`` is false.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auth_project.settings")
+    import django
+    from django.conf import settings
+
+    if db_path is not None:
+        settings.DATABASES["default"]["NAME"] = str(db_path)
+    django.setup()
+    if not migrate:
+        return
+
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+
+    # Allows the test client and keeps mail in memory
+    setup_test_environment()
+    call_command("migrate", verbosity=0)
+
+
+def measure(fn, repeat=50, warmup=3):
+    """
+    Calls ``fn`` repeatedly and returns the latencies in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    """
+    Returns count, mean and p50/p95/p99 of a list of latencies.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "p99": percentile(99),
+    }
+
+
+def print_table(rows, columns):
+    """
+    Prints ``rows`` (a list of dicts) as an aligned text table.
+    """
+    widths = {
+        column: max(len(column), *(len(_format(row.get(column))) for row in rows))
+        for column in columns
+    }
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(_format(row.get(column)).ljust(widths[column]) for column in columns))
+
+
+def write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(rows, baseline, key, threshold, higher_is_better=(), lower_is_better=()):
+    """
+    Compares ``rows`` against ``baseline`` rows matched on ``key`` and
+    returns a message for every metric that got worse by more than
+    ``threshold`` (a fraction, e.g. 0.2 for 20%). A metric the baseline has
+    but this run lacks, such as latency for an endpoint whose requests all
+    failed, is reported as missing; one the baseline lacks is skipped.
+    """
+    previous = {row[key]: row for row in baseline}
+    found = []
+    for row in rows:
+        old = previous.get(row[key])
+        if old is None:
+            continue
+        for metric in (*higher_is_better, *lower_is_better):
+            if old.get(metric) and row.get(metric) is None:
+                found.append(f"{row[key]}: {metric} is missing, was {old[metric]:.3f}")
+        for metric in higher_is_better:
+            if old.get(metric) and row.get(metric) is not None and row[metric] < old[metric] * (1 - threshold):
+                found.append(f"{row[key]}: {metric} fell from {old[metric]:.3f} to {row[metric]:.3f}")
+        for metric in lower_is_better:
+            if old.get(metric) and row.get(metric) is not None and row[metric] > old[metric] * (1 + threshold):
+                found.append(f"{row[key]}: {metric} rose from {old[metric]:.3f} to {row[metric]:.3f}")
+    return found
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return "" if value is None else str(value)
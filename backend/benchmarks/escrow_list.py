@@ -0,0 +1,116 @@
+"""
+Escrow list latency: keyset vs offset pagination as the table grows.
+
+Seeds a SQLite database with synthetic escrows and times the
+``/api/escrows/`` endpoint at the first page, the middle and the end of
+the result set, next to the equivalent OFFSET query::
+
+    python -m benchmarks.escrow_list --rows 10000,100000,1000000
+
+The database is grown in place between sizes and reused across runs.
+"""
+import argparse
+import random
+import tempfile
+from pathlib import Path
+
+from .common import measure, print_table, setup_django, summarize, write_json
+
+BUYERS = [f"0x{i:040x}" for i in range(1, 501)]
+SELLERS = [f"0x{i:040x}" for i in range(1001, 1501)]
+TOKENS = [f"0x{i:040x}" for i in range(2001, 2006)]
+LOGS_PER_BLOCK = 4
+PAGE_SIZE = 50
+
+
+def seed(rows, batch_size=20000):
+    from escrows.models import Escrow
+
+    existing = Escrow.objects.count()
+    rng = random.Random(existing)
+    for start in range(existing, rows, batch_size):
+        Escrow.objects.bulk_create([
+            Escrow(
+                address=f"0x{i + 1:040x}",
+                buyer=rng.choice(BUYERS),
+                seller=rng.choice(SELLERS),
+                arbiter=BUYERS[0],
+                token=rng.choice(TOKENS),
+                amount=10 ** 18,
+                state=rng.randrange(6),
+                block_number=i // LOGS_PER_BLOCK,
+                log_index=i % LOGS_PER_BLOCK,
+                transaction_hash="0x" + "0" * 64,
+            )
+            for i in range(start, min(start + batch_size, rows))
+        ])
+    return rows - existing
+
+
+def run(rows, repeat):
+    from django.test import Client
+
+    from escrows.models import Escrow
+    from escrows.pagination import KeysetPagination
+
+    client = Client()
+    paginator = KeysetPagination()
+    results = []
+
+    scenarios = [("all", {}), ("buyer", {"buyer": BUYERS[7]})]
+    for name, filters in scenarios:
+        queryset = Escrow.objects.filter(**filters).order_by("-block_number", "-log_index")
+        total = queryset.count()
+        for depth_name, fraction in (("first", 0.0), ("middle", 0.5), ("last", 0.99)):
+            offset = int(total * fraction)
+            anchor = queryset.values("block_number", "log_index")[offset] if offset else None
+            params = dict(filters, page_size=PAGE_SIZE)
+            if anchor:
+                params["cursor"] = paginator.encode_cursor(anchor["block_number"], anchor["log_index"])
+
+            endpoint = summarize(measure(lambda: client.get("/api/escrows/", params), repeat))
+            keyset_query = queryset
+            if anchor:
+                keyset_query = queryset.filter(block_number__lte=anchor["block_number"]).exclude(
+                    block_number=anchor["block_number"], log_index__gte=anchor["log_index"]
+                )
+            keyset = summarize(measure(lambda: list(keyset_query[:PAGE_SIZE]), repeat))
+            offset_result = summarize(measure(lambda: list(queryset[offset:offset + PAGE_SIZE]), repeat))
+
+            results.append({
+                "rows": rows,
+                "filter": name,
+                "depth": depth_name,
+                "offset": offset,
+                "endpoint_p50_ms": endpoint["p50"],
+                "keyset_p50_ms": keyset["p50"],
+                "offset_p50_ms": offset_result["p50"],
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="10000,100000",
+                        help="Comma-separated table sizes to measure, ascending.")
+    parser.add_argument("--db", default=str(Path(tempfile.gettempdir()) / "escrow-list-bench.sqlite3"))
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--json", help="Write results to this file.")
+    args = parser.parse_args()
+
+    setup_django(args.db)
+
+    results = []
+    for rows in sorted(int(r) for r in args.rows.split(",")):
+        seed(rows)
+        results.extend(run(rows, args.repeat))
+
+    print_table(results, [
+        "rows", "filter", "depth", "offset", "endpoint_p50_ms", "keyset_p50_ms", "offset_p50_ms",
+    ])
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == "__main__":
+    main()
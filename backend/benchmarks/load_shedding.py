@@ -0,0 +1,107 @@
+"""
+Goodput under overload with and without the adaptive concurrency limiter.
+
+Simulates a backend that can work on ``--workers`` requests at a time,
+each taking ``--service-ms``, driven by ``--clients`` threads that send
+requests back to back. A response slower than ``--deadline-ms`` counts as
+a timeout, because its client has already given up, though the work was
+still done. Shed requests return at once and their client retries after
+``--backoff-ms``::
+
+    python -m benchmarks.load_shedding --clients 200 --duration 5
+
+Without a limiter, every request queues behind the others and almost none
+meet the deadline. With one, the limit settles near what the backend can
+serve in time and the rest are shed.
+"""
+import argparse
+import queue
+import threading
+import time
+
+from .common import print_table, setup_django, summarize, write_json
+
+
+def run(limiter, clients, workers, service_ms, deadline_ms, backoff_ms, duration):
+    jobs = queue.Queue()
+    lock = threading.Lock()
+    latencies, counts = [], {"good": 0, "timeouts": 0, "shed": 0}
+    stop = time.perf_counter() + duration
+
+    def worker():
+        while (done := jobs.get()) is not None:
+            time.sleep(service_ms / 1000)
+            done.set()
+
+    def handle():
+        done = threading.Event()
+        jobs.put(done)
+        done.wait()
+
+    def client():
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            if limiter is not None and not limiter.acquire():
+                with lock:
+                    counts["shed"] += 1
+                time.sleep(backoff_ms / 1000)
+                continue
+            try:
+                handle()
+            finally:
+                if limiter is not None:
+                    limiter.release(time.perf_counter() - start)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if elapsed <= deadline_ms:
+                    counts["good"] += 1
+                    latencies.append(elapsed)
+                else:
+                    counts["timeouts"] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(workers)]
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in pool + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for _ in pool:
+        jobs.put(None)
+
+    summary = summarize(latencies)
+    return {
+        **counts,
+        "goodput_per_s": counts["good"] / duration,
+        "p50_ms": summary.get("p50"),
+        "p99_ms": summary.get("p99"),
+        "limit": None if limiter is None else round(limiter.limit, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8, help="Requests the backend serves at once.")
+    parser.add_argument("--service-ms", type=float, default=10)
+    parser.add_argument("--deadline-ms", type=float, default=100)
+    parser.add_argument("--backoff-ms", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=5, help="Seconds per mode.")
+    parser.add_argument("--json", help="Write results to this file.")
+    args = parser.parse_args()
+
+    setup_django(migrate=False)
+    from monitoring.shedding import AdaptiveLimiter
+
+    results = []
+    for mode, limiter in (("unlimited", None), ("adaptive", AdaptiveLimiter())):
+        row = run(limiter, args.clients, args.workers, args.service_ms, args.deadline_ms,
+                  args.backoff_ms, args.duration)
+        results.append({"mode": mode, **row})
+
+    print_table(results, ["mode", "good", "timeouts", "shed", "goodput_per_s", "p50_ms", "p99_ms", "limit"])
+    if args.json:
+        write_json(args.json, {"modes": results, **vars(args)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Request overhead of the metrics middleware.
+
+Times a few endpoints through the full middleware stack with and without
+``MetricsMiddleware``, and the cost of a single histogram observation::
+
+    python -m benchmarks.metrics_overhead --repeat 2000
+"""
+import argparse
+import logging
+import tempfile
+import timeit
+from pathlib import Path
+
+from .common import measure, print_table, setup_django, summarize, write_json
+
+ENDPOINTS = [
+    ("escrow-list", "/api/escrows/"),
+    ("verify-email", "/api/auth/verify-email/?token=invalid"),
+    ("unmatched", "/no-such-page/"),
+]
+
+
+def run(repeat):
+    from django.conf import settings
+    from django.test import Client, override_settings
+
+    with_metrics = list(settings.MIDDLEWARE)
+    without_metrics = [m for m in with_metrics if m != "monitoring.middleware.MetricsMiddleware"]
+
+    results = []
+    for name, url in ENDPOINTS:
+        row = {"endpoint": name}
+        for label, middleware in (("without", without_metrics), ("with", with_metrics)):
+            with override_settings(MIDDLEWARE=middleware):
+                client = Client()
+                row[f"{label}_p50_ms"] = summarize(measure(lambda: client.get(url), repeat))["p50"]
+        row["overhead_us"] = (row["with_p50_ms"] - row["without_p50_ms"]) * 1000
+        results.append(row)
+    return results
+
+
+def observe_cost():
+    from monitoring.metrics import Histogram
+
+    histogram = Histogram("bench_seconds", "Benchmark.", ("view", "method", "status"))
+    number = 100_000
+    seconds = timeit.timeit(
+        lambda: histogram.observe(0.012, view="escrow-list", method="GET", status=200), number=number
+    )
+    return seconds / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=str(Path(tempfile.gettempdir()) / "metrics-bench.sqlite3"))
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--json", help="Write results to this file.")
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    # The unmatched endpoint would log a warning per request
+    logging.getLogger("django.request").setLevel(logging.ERROR)
+
+    results = run(args.repeat)
+    print_table(results, ["endpoint", "without_p50_ms", "with_p50_ms", "overhead_us"])
+    observe_us = observe_cost()
+    print(f"\nHistogram.observe(): {observe_us:.2f} us")
+    if args.json:
+        write_json(args.json, {"endpoints": results, "observe_us": observe_us})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Password hashing cost and throughput.
+
+Calibrates Argon2id: times one hash for each time/memory cost pair and
+recommends the most expensive pair under a latency target. Then compares
+hashing throughput on request threads against the ``accounts.hashing``
+process pool at the same concurrency::
+
+    python -m benchmarks.password_hashing --target-ms 100 --concurrency 16
+
+Argon2id requires ``argon2-cffi``; without it only PBKDF2 is measured.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import measure, print_table, setup_django, summarize, write_json
+
+TIME_COSTS = (1, 2, 3, 4)
+MEMORY_COSTS = (19456, 47104, 65536, 102400)  # KiB
+PASSWORD = "correct horse battery staple"
+
+
+def argon2_hasher(time_cost, memory_cost, parallelism=1):
+    from accounts.hashing import Argon2idPasswordHasher
+
+    hasher = Argon2idPasswordHasher()
+    hasher.time_cost, hasher.memory_cost, hasher.parallelism = time_cost, memory_cost, parallelism
+    return hasher
+
+
+def calibrate(target_ms, repeat):
+    """
+    Returns one row per Argon2id cost pair, marking the recommended one.
+    """
+    rows = []
+    for time_cost in TIME_COSTS:
+        for memory_cost in MEMORY_COSTS:
+            hasher = argon2_hasher(time_cost, memory_cost)
+            salt = hasher.salt()
+            latency = summarize(measure(lambda: hasher.encode(PASSWORD, salt), repeat, warmup=1))
+            rows.append({
+                "hasher": "argon2id",
+                "time_cost": time_cost,
+                "memory_kib": memory_cost,
+                "p50_ms": latency["p50"],
+                "p95_ms": latency["p95"],
+            })
+
+    # Memory cost is what makes GPU attacks expensive, so prefer it over time cost
+    within = [row for row in rows if row["p95_ms"] <= target_ms]
+    if within:
+        best = max(within, key=lambda row: (row["memory_kib"], row["time_cost"]))
+        best["recommended"] = "yes"
+    return rows
+
+
+def throughput(hasher, hashes, concurrency, workers):
+    """
+    Hashes ``hashes`` passwords from ``concurrency`` request threads, either
+    inline (``workers=0``) or through a pool of ``workers`` processes.
+    """
+    from accounts.hashing import HashingPool, _encode
+
+    pool = HashingPool(workers=workers, max_queue=hashes)
+    try:
+        pool.run(_encode, hasher, PASSWORD, hasher.salt())  # start the workers
+        latencies = []
+
+        def request():
+            start = time.perf_counter()
+            pool.run(_encode, hasher, PASSWORD, hasher.salt())
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as threads:
+            for future in [threads.submit(request) for _ in range(hashes)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+    latency = summarize(latencies)
+    return {
+        "mode": f"pool x{workers}" if workers else "inline",
+        "hashes_per_s": hashes / elapsed,
+        "p50_ms": latency["p50"],
+        "p99_ms": latency["p99"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target-ms", type=float, default=100,
+                        help="Latency budget for one Argon2id hash.")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--hashes", type=int, default=200,
+                        help="Hashes per throughput run.")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Simulated request threads.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", help="Write results to this file.")
+    args = parser.parse_args()
+
+    setup_django(migrate=False)
+    from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+    hashers = [("pbkdf2_sha256", PBKDF2PasswordHasher())]
+    results = {"calibration": [], "throughput": []}
+    try:
+        import argon2  # noqa: F401
+    except ImportError:
+        print("argon2-cffi is not installed; skipping Argon2id calibration.\n")
+    else:
+        results["calibration"] = calibrate(args.target_ms, args.repeat)
+        print_table(results["calibration"], [
+            "hasher", "time_cost", "memory_kib", "p50_ms", "p95_ms", "recommended",
+        ])
+        print()
+        best = next((row for row in results["calibration"] if row.get("recommended")), None)
+        if best:
+            hashers.append(("argon2id", argon2_hasher(best["time_cost"], best["memory_kib"])))
+            print(
+                'PASSWORD_HASHING["ARGON2"] = '
+                f'{{"TIME_COST": {best["time_cost"]}, "MEMORY_COST": {best["memory_kib"]}, "PARALLELISM": 1}}\n'
+            )
+
+    for name, hasher in hashers:
+        for workers in (0, args.workers):
+            row = throughput(hasher, args.hashes, args.concurrency, workers)
+            results["throughput"].append({"hasher": name, **row})
+    print_table(results["throughput"], ["hasher", "mode", "hashes_per_s", "p50_ms", "p99_ms"])
+
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == "__main__":
+    main()
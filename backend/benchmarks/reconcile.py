@@ -0,0 +1,130 @@
+"""
+Reconciliation throughput by worker count and RPC budget.
+
+Seeds a SQLite database with synthetic escrows, serves matching contracts
+from the stub JSON-RPC server with ``--latency-ms`` added to every
+response, and runs full reconciliation passes with each ``--workers``
+count. ``--drift`` of the escrows disagree with the chain and are
+repaired on every pass::
+
+    python -m benchmarks.reconcile --escrows 5000 --workers 1,2,4,8 --latency-ms 20
+
+Each batch waits on one round trip, so throughput grows with the workers
+until the node, the database or ``--rpc-budget`` becomes the limit.
+"""
+import argparse
+import random
+import tempfile
+from pathlib import Path
+
+from .common import print_table, setup_django, write_json
+
+TOKEN = "0x" + "70" * 20
+
+
+def reset_aggregates(count):
+    # Every escrow starts awaiting payment, as the indexer would have recorded it
+    from escrows.models import EscrowAggregate
+
+    EscrowAggregate.objects.all().delete()
+    rows = [
+        EscrowAggregate(address=f"0x{i + 10 ** 6:040x}", role="buyer", token=TOKEN, state=0,
+                        count=1, total_amount=10 ** 18)
+        for i in range(count)
+    ]
+    rows += [
+        EscrowAggregate(address=address, role=role, token=TOKEN, state=0, count=count, total_amount=count * 10 ** 18)
+        for role, address in (("seller", "0x" + "5e" * 20), ("arbiter", "0x" + "a1" * 20))
+    ]
+    EscrowAggregate.objects.bulk_create(rows, batch_size=5000)
+
+
+def seed(count, drift):
+    from escrows.indexer import EscrowIndexer
+    from escrows.models import Escrow, IndexerCheckpoint
+
+    Escrow.objects.all().delete()
+    Escrow.objects.bulk_create([
+        Escrow(
+            address=f"0x{i + 1:040x}", buyer=f"0x{i + 10 ** 6:040x}", seller="0x" + "5e" * 20,
+            arbiter="0x" + "a1" * 20, token=TOKEN, amount=10 ** 18,
+            block_number=i // 4, log_index=i % 4, transaction_hash="0x" + "0" * 64,
+        )
+        for i in range(count)
+    ], batch_size=5000)
+    IndexerCheckpoint.objects.update_or_create(
+        name=EscrowIndexer.checkpoint_name, defaults={"block_number": count // 4 + 1}
+    )
+
+    rng = random.Random(count)
+    return {
+        f"0x{i + 1:040x}": 1 if rng.random() < drift else 0
+        for i in range(count)
+    }
+
+
+def serve(states, latency):
+    from escrows.testing import FakeRPCServer
+
+    server = FakeRPCServer()
+    server.delay = latency
+    for address, state in states.items():
+        server.chain.add_contract(address, {"currentState()": ("uint8", state)})
+    # Deposited escrows hold their amount
+    server.chain.add_contract(TOKEN, {
+        "balanceOf(address)": ("uint256", lambda owner: 10 ** 18 if states.get(owner) else 0),
+    })
+    return server.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=str(Path(tempfile.gettempdir()) / "reconcile-bench.sqlite3"))
+    parser.add_argument("--escrows", type=int, default=5000)
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=20, help="Added to every RPC response.")
+    parser.add_argument("--drift", type=float, default=0.01, help="Share of escrows to repair.")
+    parser.add_argument("--rpc-budget", type=float, default=0, help="eth_calls per second, 0 for no limit.")
+    parser.add_argument("--json", help="Write results to this file.")
+    args = parser.parse_args()
+
+    setup_django(args.db)
+    from escrows.models import Escrow, EscrowRepair
+    from escrows.reconcile import EscrowReconciler
+    from escrows.rpc import JSONRPCClient
+
+    states = seed(args.escrows, args.drift)
+    server = serve(states, args.latency_ms / 1000)
+    results = []
+    try:
+        for workers in (int(value) for value in args.workers.split(",")):
+            Escrow.objects.update(state=0, released=False)
+            reset_aggregates(args.escrows)
+            EscrowRepair.objects.all().delete()
+            client = JSONRPCClient(server.url, max_concurrency=max(workers, 8), pool_size=max(workers, 8))
+            try:
+                reconciler = EscrowReconciler(
+                    client=client, batch_size=args.batch_size, workers=workers, rpc_budget=args.rpc_budget,
+                )
+                stats = reconciler.run(restart=True)
+            finally:
+                client.close()
+            results.append({
+                "workers": workers,
+                "checked": stats["checked"],
+                "repaired": stats["repaired"],
+                "seconds": stats["elapsed"],
+                "escrows_per_s": stats["per_second"],
+                "rpc_calls_per_s": 2 * stats["per_second"],
+            })
+    finally:
+        server.stop()
+
+    print_table(results, ["workers", "checked", "repaired", "seconds", "escrows_per_s", "rpc_calls_per_s"])
+    if args.json:
+        write_json(args.json, {"results": results, **vars(args)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Token refresh throughput with and without the in-process revocation cache.
+
+Seeds a SQLite database with blacklisted refresh tokens and times
+``/api/auth/login/refresh/`` with ``TOKEN_REVOCATION["ENABLED"]`` on and
+off, counting the queries each refresh makes::
+
+    python -m benchmarks.token_refresh --blacklisted 10000,100000
+"""
+import argparse
+import tempfile
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from .common import measure, print_table, setup_django, summarize, write_json
+
+
+def seed(blacklisted, batch_size=20000):
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    user, _ = get_user_model().objects.get_or_create(username="bench", defaults={"email": "bench@example.com"})
+    existing = BlacklistedToken.objects.count()
+    expires_at = timezone.now() + timedelta(days=1)
+    for start in range(existing, blacklisted, batch_size):
+        count = min(batch_size, blacklisted - start)
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=user, jti=uuid.uuid4().hex, token="", expires_at=expires_at)
+            for _ in range(count)
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens])
+    return user
+
+
+def run(user, blacklisted, repeat):
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from accounts.revocation import get_revocation_cache
+    from accounts.tokens import RefreshToken
+
+    client = Client()
+    url = reverse("token_refresh")
+    refresh = str(RefreshToken.for_user(user))
+    results = []
+    for enabled in (False, True):
+        with override_settings(TOKEN_REVOCATION={"ENABLED": enabled}):
+            get_revocation_cache().reset()
+
+            def request():
+                response = client.post(url, {"refresh": refresh}, content_type="application/json")
+                assert response.status_code == 200, response.content
+
+            # Warm-up requests load the filter, so it is not in the timings
+            samples = measure(request, repeat)
+            latency = summarize(samples)
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            results.append({
+                "blacklisted": blacklisted,
+                "revocation_cache": "on" if enabled else "off",
+                "refresh_per_s": len(samples) / (sum(samples) / 1000),
+                "p50_ms": latency["p50"],
+                "p99_ms": latency["p99"],
+                "queries": len(queries),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--blacklisted", default="10000,100000",
+                        help="Comma-separated blacklist sizes to measure, ascending.")
+    parser.add_argument("--db", default=str(Path(tempfile.gettempdir()) / "token-refresh-bench.sqlite3"))
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--json", help="Write results to this file.")
+    args = parser.parse_args()
+
+    setup_django(args.db)
+
+    results = []
+    for blacklisted in sorted(int(n) for n in args.blacklisted.split(",")):
+        user = seed(blacklisted)
+        results.extend(run(user, blacklisted, args.repeat))
+
+    print_table(results, ["blacklisted", "revocation_cache", "refresh_per_s", "p50_ms", "p99_ms", "queries"])
+    if args.json:
+        write_json(args.json, results)
+
+
+if __name__ == "__main__":
+    main()
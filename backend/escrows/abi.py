@@ -0,0 +1,273 @@
+"""
+Minimal ABI encoding and decoding for the Escrow, EscrowFactory, ERC20 and
+Multicall3 contracts.
+
+Only the handful of types these contracts use are supported, so this
+avoids pulling in a full Ethereum library. Topic hashes and selectors are
+the keccak256 of the signatures shown beside them.
+"""
+
+ZERO_ADDRESS = "0x" + "0" * 40
+
+# keccak256(event signature)
+EVENT_TOPICS = {
+    # EscrowCreated(address,address,address,address,address,uint256)
+    "EscrowCreated": "0xae5622945a7d8967e676d08786ed01239e57a0f397e4c17e711d51d106a59150",
+    # Deposited(address,uint256)
+    "Deposited": "0x2da466a7b24304f47e87fa2e1e5a81b9831ce54fec19055ce277ca2f39ba42c4",
+    # ItemShipped(address)
+    "ItemShipped": "0x9ef187ef1edc55003d878adbf39e85f00be1c004111e00a0852b44502d879ca4",
+    # DisputeRaised(address)
+    "DisputeRaised": "0x0b3cd97b16a08a5c77357c276d248827ad32dfd56060f7c55d6255537ba3d962",
+    # Released(address,uint256)
+    "Released": "0xb21fb52d5749b80f3182f8c6992236b5e5576681880914484d7f4c9b062e619e",
+    # Refunded(address,uint256)
+    "Refunded": "0xd7dee2702d63ad89917b6a4da9981c90c4d24f8c2bdfd64c604ecae57d8d0651",
+    # DisputeResolved(address,address,uint256)
+    "DisputeResolved": "0xc98fd1f80a8937b1fdeb951d0b63bf7c924a1872543ae2499295625b18abe70e",
+}
+EVENT_NAMES = {topic: name for name, topic in EVENT_TOPICS.items()}
+
+# First 4 bytes of keccak256(function signature)
+SELECTORS = {
+    "buyer()": "0x7150d8ae",
+    "seller()": "0x08551a53",
+    "arbiter()": "0xfe25e00a",
+    "currentState()": "0x0c3f6acf",
+    "token()": "0xfc0c546a",
+    "amount()": "0xaa8c217c",
+    "symbol()": "0x95d89b41",
+    "decimals()": "0x313ce567",
+    "name()": "0x06fdde03",
+    "balanceOf(address)": "0x70a08231",
+    "allowance(address,address)": "0xdd62ed3e",
+    "aggregate3((address,bool,bytes)[])": "0x82ad56cb",
+}
+
+# (argument name, indexed, type) in declaration order
+EVENT_ARGS = {
+    "EscrowCreated": [
+        ("escrowAddress", True, "address"),
+        ("buyer", True, "address"),
+        ("seller", True, "address"),
+        ("arbiter", False, "address"),
+        ("token", False, "address"),
+        ("amount", False, "uint256"),
+    ],
+    "Deposited": [("buyer", True, "address"), ("depositedAmount", False, "uint256")],
+    "ItemShipped": [("seller", True, "address")],
+    "DisputeRaised": [("raisedBy", True, "address")],
+    "Released": [("seller", True, "address"), ("releasedAmount", False, "uint256")],
+    "Refunded": [("buyer", True, "address"), ("refundedAmount", False, "uint256")],
+    "DisputeResolved": [
+        ("resolver", True, "address"),
+        ("winner", True, "address"),
+        ("resolvedAmount", False, "uint256"),
+    ],
+}
+
+
+def normalize_address(address):
+    """
+    Returns ``address`` as a lowercase 0x-prefixed hex string.
+    """
+    address = address.lower()
+    if not address.startswith("0x"):
+        address = "0x" + address
+    if len(address) != 42:
+        raise ValueError(f"Invalid address: {address}")
+    int(address, 16)
+    return address
+
+
+def split_words(data):
+    """
+    Splits ABI-encoded hex data into 32-byte words.
+    """
+    data = data[2:] if data.startswith("0x") else data
+    return [data[i:i + 64] for i in range(0, len(data), 64)]
+
+
+def decode_word(word, type_):
+    if type_ == "address":
+        return "0x" + word[-40:].lower()
+    if type_ in ("uint256", "uint8"):
+        return int(word, 16)
+    if type_ == "bool":
+        return int(word, 16) != 0
+    raise ValueError(f"Unsupported ABI type: {type_}")
+
+
+def encode_word(value, type_):
+    if type_ == "address":
+        return normalize_address(value)[2:].rjust(64, "0")
+    if type_ in ("uint256", "uint8"):
+        return format(int(value), "x").rjust(64, "0")
+    if type_ == "bool":
+        return format(int(bool(value)), "x").rjust(64, "0")
+    raise ValueError(f"Unsupported ABI type: {type_}")
+
+
+def encode_call(signature, *args):
+    """
+    Builds calldata for ``signature`` with static ``args``.
+    """
+    types = signature[signature.index("(") + 1:-1].split(",") if not signature.endswith("()") else []
+    return SELECTORS[signature] + "".join(encode_word(arg, type_) for arg, type_ in zip(args, types))
+
+
+def decode_result(data, type_):
+    """
+    Decodes the return value of a single-output call.
+    """
+    data = data[2:] if data.startswith("0x") else data
+    if type_ == "string":
+        return decode_string(data)
+    words = split_words(data)
+    if not words:
+        raise ValueError("Empty return data")
+    return decode_word(words[0], type_)
+
+
+def encode_result(value, type_):
+    if type_ == "string":
+        return "0x" + encode_word(32, "uint256") + _encode_bytes(value.encode())
+    return "0x" + encode_word(value, type_)
+
+
+def decode_string(data):
+    """
+    Decodes an ABI ``string``, falling back to ``bytes32`` as returned by
+    some older ERC20 tokens.
+    """
+    data = data[2:] if data.startswith("0x") else data
+    raw = bytes.fromhex(data)
+    if len(raw) == 32:
+        return raw.rstrip(b"\0").decode("utf-8", errors="replace")
+    offset = int.from_bytes(raw[0:32], "big")
+    length = int.from_bytes(raw[offset:offset + 32], "big")
+    return raw[offset + 32:offset + 32 + length].decode("utf-8", errors="replace")
+
+
+def _encode_bytes(raw):
+    padded = raw + b"\0" * (-len(raw) % 32)
+    return encode_word(len(raw), "uint256") + padded.hex()
+
+
+def encode_aggregate3(calls):
+    """
+    Encodes a Multicall3 ``aggregate3`` call for ``[(target, calldata), ...]``.
+    Every call is allowed to fail without reverting the batch.
+    """
+    tuples = []
+    for target, calldata in calls:
+        raw = bytes.fromhex(calldata[2:] if calldata.startswith("0x") else calldata)
+        # target, allowFailure, offset of callData within the tuple
+        tuples.append(
+            encode_word(target, "address") + encode_word(True, "bool")
+            + encode_word(96, "uint256") + _encode_bytes(raw)
+        )
+    return SELECTORS["aggregate3((address,bool,bytes)[])"] + encode_word(32, "uint256") + _encode_array(tuples)
+
+
+def decode_aggregate3(data):
+    """
+    Decodes ``aggregate3`` return data into ``[(success, returnData), ...]``.
+    """
+    return [
+        (decode_word(head[0:64], "bool"), "0x" + _read_bytes(head, int(head[64:128], 16)))
+        for head in _read_array(data)
+    ]
+
+
+def decode_aggregate3_calls(calldata):
+    """
+    Decodes ``aggregate3`` calldata into ``[(target, allowFailure, callData), ...]``.
+    The inverse of ``encode_aggregate3``, used by the stub RPC server.
+    """
+    return [
+        (
+            decode_word(head[0:64], "address"),
+            decode_word(head[64:128], "bool"),
+            "0x" + _read_bytes(head, int(head[128:192], 16)),
+        )
+        for head in _read_array(calldata[10:])
+    ]
+
+
+def encode_aggregate3_result(results):
+    """
+    Encodes ``[(success, returnData), ...]`` as ``aggregate3`` return data.
+    """
+    tuples = [
+        encode_word(success, "bool") + encode_word(64, "uint256")
+        + _encode_bytes(bytes.fromhex(data[2:] if data.startswith("0x") else data))
+        for success, data in results
+    ]
+    return "0x" + encode_word(32, "uint256") + _encode_array(tuples)
+
+
+def _encode_array(encoded_tuples):
+    # Dynamic array of dynamic tuples: length, per-element offsets, elements
+    offsets, position = [], 32 * len(encoded_tuples)
+    for encoded in encoded_tuples:
+        offsets.append(encode_word(position, "uint256"))
+        position += len(encoded) // 2
+    return encode_word(len(encoded_tuples), "uint256") + "".join(offsets) + "".join(encoded_tuples)
+
+
+def _read_array(data):
+    # Returns the hex of each element of the dynamic array at offset word 0
+    data = data[2:] if data.startswith("0x") else data
+    start = int(data[0:64], 16) * 2
+    length = int(data[start:start + 64], 16)
+    base = start + 64
+    return [
+        data[base + int(data[base + i * 64:base + (i + 1) * 64], 16) * 2:]
+        for i in range(length)
+    ]
+
+
+def _read_bytes(head, offset):
+    start = offset * 2
+    length = int(head[start:start + 64], 16)
+    return head[start + 64:start + 64 + length * 2]
+
+
+def decode_event(log):
+    """
+    Decodes a raw ``eth_getLogs`` entry for one of our events.
+
+    Returns ``(name, args)``, or ``(None, None)`` for unrelated logs.
+    uint256 values are returned as ints. Raises ``ValueError`` if the log
+    has one of our topics but not that event's layout.
+    """
+    topics = log.get("topics") or []
+    name = EVENT_NAMES.get(topics[0].lower()) if topics else None
+    if name is None:
+        return None, None
+
+    indexed = iter(topics[1:])
+    words = iter(split_words(log.get("data", "0x")))
+    args = {}
+    for arg, is_indexed, type_ in EVENT_ARGS[name]:
+        word = next(indexed, None) if is_indexed else next(words, None)
+        if word is None:
+            raise ValueError(f"{name} log is missing {arg}")
+        args[arg] = decode_word(word[2:] if word.startswith("0x") else word, type_)
+    return name, args
+
+
+def encode_event(name, **args):
+    """
+    Builds the ``topics`` and ``data`` of an event log. Used by test fixtures.
+    """
+    topics = [EVENT_TOPICS[name]]
+    data = ""
+    for arg, is_indexed, type_ in EVENT_ARGS[name]:
+        word = encode_word(args[arg], type_)
+        if is_indexed:
+            topics.append("0x" + word)
+        else:
+            data += word
+    return topics, "0x" + data
@@ -0,0 +1,63 @@
+"""
+Incremental maintenance of ``EscrowAggregate`` rows.
+
+Every escrow counts once for each of its buyer, seller and arbiter under
+its current state. The indexer calls these helpers inside its
+transaction, so the totals move by exactly one escrow per event and are
+never recomputed.
+"""
+from .abi import ZERO_ADDRESS
+from .models import EscrowAggregate, EscrowState
+
+LOCKED_STATES = (EscrowState.AWAITING_DELIVERY, EscrowState.DISPUTED, EscrowState.COMPLETE)
+
+
+def locked_amount(escrow):
+    """
+    Returns how much of ``escrow.amount`` the contract still holds.
+    """
+    if escrow.state in LOCKED_STATES and not escrow.released:
+        return escrow.amount
+    return 0
+
+
+def participants(escrow):
+    roles = [
+        (EscrowAggregate.Role.BUYER, escrow.buyer),
+        (EscrowAggregate.Role.SELLER, escrow.seller),
+    ]
+    if escrow.arbiter != ZERO_ADDRESS:
+        roles.append((EscrowAggregate.Role.ARBITER, escrow.arbiter))
+    return roles
+
+
+def _apply(escrow, state, count, locked):
+    for role, address in participants(escrow):
+        aggregate, _ = EscrowAggregate.objects.select_for_update().get_or_create(
+            address=address, role=role, token=escrow.token, state=state,
+        )
+        aggregate.count += count
+        aggregate.total_amount += count * escrow.amount
+        aggregate.locked_amount += locked
+        aggregate.save(update_fields=["count", "total_amount", "locked_amount"])
+
+
+def record_created(escrow):
+    """
+    Adds a newly indexed escrow to its participants' totals.
+    """
+    _apply(escrow, escrow.state, 1, locked_amount(escrow))
+
+
+def record_transition(escrow, old_state, old_locked):
+    """
+    Moves an escrow from ``old_state`` to its current state.
+    ``old_locked`` is ``locked_amount()`` before the event was applied.
+    """
+    new_locked = locked_amount(escrow)
+    if escrow.state == old_state:
+        if new_locked != old_locked:
+            _apply(escrow, old_state, 0, new_locked - old_locked)
+        return
+    _apply(escrow, old_state, -1, -old_locked)
+    _apply(escrow, escrow.state, 1, new_locked)
@@ -0,0 +1,176 @@
+"""
+Batched ERC20 allowance and balance snapshots.
+
+A client checking whether a buyer has approved their escrows sends every
+``(token, owner, spender)`` triple in one request. The snapshot reads each
+distinct ``allowance()`` and ``balanceOf()`` once, as batched ``eth_call``s
+pinned to one block, so all results are consistent with each other.
+
+Results are cached per block. The chain head is itself cached for
+``HEAD_TTL`` seconds, so repeated views within a block are answered from
+memory without any RPC, and a new block makes every cached value stale at
+once.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .abi import decode_result, encode_call, normalize_address
+from .rpc import RPCError, get_client
+from .tokens import LRUCache
+
+DEFAULTS = {
+    # Triples accepted per request
+    "MAX_ITEMS": 200,
+    # Cached allowance and balance values, across blocks
+    "CACHE_SIZE": 10000,
+    # Seconds the chain head is trusted before asking the node again
+    "HEAD_TTL": 1.0,
+}
+
+# Distinguishes an uncached value from a cached revert, which is None
+MISSING = object()
+
+
+def allowance_setting(name):
+    return getattr(settings, "ESCROW_ALLOWANCES", {}).get(name, DEFAULTS[name])
+
+
+class ChainUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The node could not be reached, please try again shortly.'
+    default_code = 'chain_unavailable'
+
+
+class AllowanceService:
+    """
+    Reads allowances and balances for many ``(token, owner, spender)`` triples.
+    """
+
+    def __init__(self, client=None, maxsize=None, head_ttl=None):
+        self._client = client
+        self.cache = LRUCache(maxsize or allowance_setting("CACHE_SIZE"))
+        self.head_ttl = allowance_setting("HEAD_TTL") if head_ttl is None else head_ttl
+        self._head = None
+        self._head_expires = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(("cache_hits", "rpc_calls", "head_fetches"), 0)
+
+    @property
+    def client(self):
+        return self._client or get_client()
+
+    def stats(self):
+        """
+        Returns a snapshot of the hit/miss counters and the cache size.
+        """
+        with self._lock:
+            return {**self._counters, "cache_size": len(self.cache)}
+
+    def head(self):
+        """
+        Returns the latest block number, asking the node at most once per ``HEAD_TTL``.
+        """
+        with self._lock:
+            if self._head is not None and time.monotonic() < self._head_expires:
+                return self._head
+        block = self.client.block_number()
+        with self._lock:
+            self._counters["head_fetches"] += 1
+            # Never move backwards if a slower fetch finishes last
+            self._head = max(block, self._head or 0)
+            self._head_expires = time.monotonic() + self.head_ttl
+            return self._head
+
+    def snapshot(self, items):
+        """
+        Returns ``(block, results)`` where ``results`` holds, in order, a dict
+        per ``(token, owner, spender)`` with its ``allowance`` and the owner's
+        ``balance``. Values are ``None`` where the token call reverted.
+        Raises ``ChainUnavailable`` if the node cannot be read.
+        """
+        items = [tuple(normalize_address(address) for address in item) for item in items]
+        try:
+            block = self.head()
+            values = self._read(block, items)
+        except RPCError:
+            raise ChainUnavailable()
+
+        return block, [
+            {
+                "token": token,
+                "owner": owner,
+                "spender": spender,
+                "allowance": values[("allowance", token, owner, spender)],
+                "balance": values[("balance", token, owner)],
+            }
+            for token, owner, spender in items
+        ]
+
+    def _read(self, block, items):
+        keys = []
+        for token, owner, spender in items:
+            keys += [("allowance", token, owner, spender), ("balance", token, owner)]
+
+        values, misses = {}, []
+        for key in dict.fromkeys(keys):
+            cached = self.cache.get((block, *key), MISSING)
+            if cached is MISSING:
+                misses.append(key)
+            else:
+                values[key] = cached
+        self._count("cache_hits", len(values))
+        if not misses:
+            return values
+
+        calls = []
+        for key in misses:
+            if key[0] == "allowance":
+                calls.append((key[1], encode_call("allowance(address,address)", key[2], key[3])))
+            else:
+                calls.append((key[1], encode_call("balanceOf(address)", key[2])))
+        self._count("rpc_calls", len(calls))
+
+        for key, data in zip(misses, self.client.call_many(calls, block=hex(block))):
+            try:
+                value = decode_result(data, "uint256") if data and data != "0x" else None
+            except ValueError:
+                value = None
+            values[key] = value
+            self.cache.set((block, *key), value)
+        return values
+
+    def _count(self, counter, amount=1):
+        if amount:
+            with self._lock:
+                self._counters[counter] += amount
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_allowance_service():
+    """
+    Returns the process-wide allowance service.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AllowanceService()
+        return _service
+
+
+def _reset_service(setting, **kwargs):
+    global _service
+    # Cached heads and values belong to one node
+    if setting in ("ESCROW_ALLOWANCES", "ETH_RPC_URL"):
+        with _service_lock:
+            _service = None
+
+
+setting_changed.connect(_reset_service, dispatch_uid="escrows.allowances")
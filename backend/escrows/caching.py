@@ -0,0 +1,132 @@
+"""
+Versioned ETags and a shared response cache for the escrow read endpoints.
+
+An escrow's version is the id of the last event indexed for it and of the
+last repair the reconciler made to it. A list's version is the same pair
+over every escrow its filters can match. Buyers, sellers, arbiters and
+tokens never change, so an address filter's version only moves when one
+of its escrows is created or changes state. State-only and unfiltered
+lists use the last event and repair overall. A version costs one indexed
+query, with the repair read in a subquery.
+
+ETags are derived from the version and the request, so a poll whose
+``If-None-Match`` still matches gets ``304 Not Modified`` without the
+escrows being loaded or serialized. Rendered responses are stored in the
+``CACHE`` cache under their ETag. When the indexer applies an event or
+the reconciler repairs an escrow, the versions move and every affected
+entry stops being used; unaffected filters keep theirs. Nothing has to
+be deleted, so this works with a per-process cache as well as a shared
+one.
+
+Token metadata is not part of the version. Responses embedding metadata
+whose lookup failed are therefore neither cached nor given an ETag, so
+they cannot outlive the RPC outage that caused them.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q, Subquery
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import EscrowEvent, EscrowRepair
+
+DEFAULTS = {
+    "ENABLED": True,
+    # Django cache alias holding rendered responses
+    "CACHE": "default",
+    # Seconds a rendered response is kept
+    "TIMEOUT": 300,
+}
+
+
+def response_cache_setting(name):
+    return getattr(settings, "ESCROW_RESPONSE_CACHE", {}).get(name, DEFAULTS[name])
+
+
+def last_change(*conditions, **filters):
+    """
+    Returns ``(last event id, last repair id)`` for escrows matching the
+    given filters, or ``None`` if nothing has been recorded for them.
+    """
+    last_repair = EscrowRepair.objects.filter(*conditions, **filters).order_by("-id").values("id")[:1]
+    # Every escrow has its creation event, so nothing is repaired where there are no events
+    version = (
+        EscrowEvent.objects.filter(*conditions, **filters).order_by("-id")
+        .values_list("id", Subquery(last_repair)).first()
+    )
+    return (version[0], version[1] or 0) if version else None
+
+
+def escrow_version(address):
+    return last_change(escrow__address=address)
+
+
+def list_version(filters, address_fields):
+    """
+    Returns the version of an escrow list filtered by ``filters``.
+    """
+    addresses = Q()
+    for field in address_fields:
+        if field in filters:
+            addresses &= Q(**{f"escrow__{field}": filters[field]})
+    # A state filter alone matches escrows entering and leaving that state
+    return last_change(addresses)
+
+
+def make_etag(request, version):
+    """
+    Returns a quoted ETag for ``request``'s response at ``version``.
+    """
+    key = f"{version}|{request.get_full_path()}|{request.accepted_media_type}"
+    return quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+
+class ConditionalGetMixin:
+    """
+    Answers GETs from a versioned ETag before the view does any other work.
+    Views define ``get_version()``, returning a version or ``None`` to serve
+    the request normally, and may set ``cacheable`` to False while building
+    a response that must not be stored.
+    """
+    cacheable = True
+
+    def get(self, request, *args, **kwargs):
+        version = self.get_version() if response_cache_setting("ENABLED") else None
+        if not version:
+            return super().get(request, *args, **kwargs)
+
+        self.etag = make_etag(request, version)
+        if self.etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return self.revalidated(Response(status=status.HTTP_304_NOT_MODIFIED))
+
+        cached = caches[response_cache_setting("CACHE")].get(self.cache_key())
+        if cached is not None:
+            content, content_type = cached
+            return self.revalidated(HttpResponse(content, content_type=content_type))
+        return super().get(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, "etag", None)
+        if etag and self.cacheable and isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+            response.render()
+            caches[response_cache_setting("CACHE")].set(
+                self.cache_key(), (response.content, response["Content-Type"]),
+                response_cache_setting("TIMEOUT"),
+            )
+            self.revalidated(response)
+        return response
+
+    def cache_key(self):
+        return f"escrows:response:{self.etag}"
+
+    def revalidated(self, response):
+        response["ETag"] = self.etag
+        # Clients may keep the response but must check it on every use
+        patch_cache_control(response, no_cache=True)
+        return response
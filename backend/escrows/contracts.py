@@ -0,0 +1,45 @@
+"""
+Batched reads of Escrow and ERC20 contract state.
+"""
+from .abi import decode_result, encode_call, normalize_address
+from .rpc import get_client
+
+# Field name, getter signature and return type of each Escrow view function
+ESCROW_GETTERS = [
+    ("buyer", "buyer()", "address"),
+    ("seller", "seller()", "address"),
+    ("arbiter", "arbiter()", "address"),
+    ("state", "currentState()", "uint8"),
+    ("token", "token()", "address"),
+    ("amount", "amount()", "uint256"),
+]
+
+
+def read_escrows(addresses, client=None, block="latest"):
+    """
+    Reads every public field of each escrow in as few round trips as the
+    client allows.
+
+    Returns ``{address: {field: value}}``; escrows with any failed call
+    map to ``None``.
+    """
+    client = client or get_client()
+    addresses = [normalize_address(address) for address in addresses]
+    calls = [
+        (address, encode_call(signature))
+        for address in addresses
+        for _, signature, _ in ESCROW_GETTERS
+    ]
+    results = iter(client.call_many(calls, block=block))
+
+    escrows = {}
+    for address in addresses:
+        raw = [next(results) for _ in ESCROW_GETTERS]
+        if any(data is None or data == "0x" for data in raw):
+            escrows[address] = None
+            continue
+        escrows[address] = {
+            field: decode_result(data, type_)
+            for (field, _, type_), data in zip(ESCROW_GETTERS, raw)
+        }
+    return escrows
@@ -0,0 +1,36 @@
+from django.db import models
+
+
+class Uint256Field(models.CharField):
+    """
+    Stores an unsigned 256-bit integer (e.g. a token amount) exactly.
+
+    Values are kept as decimal strings so they survive databases whose
+    numeric types cannot hold 78 digits, and are returned as Python ints.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", 78)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get("max_length") == 78:
+            del kwargs["max_length"]
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else int(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, int):
+            return value
+        return int(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        value = int(value)
+        if not 0 <= value < 2 ** 256:
+            raise ValueError(f"{value} is not a valid uint256")
+        return str(value)
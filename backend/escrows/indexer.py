@@ -0,0 +1,252 @@
+"""
+Ingests EscrowFactory and Escrow events into the database.
+
+Logs are fetched with range-chunked ``eth_getLogs`` calls, several ranges
+per JSON-RPC batch. Nodes that leave ``blockTimestamp`` out of logs, such
+as Hardhat, get one more batch of ``eth_getBlockByNumber`` calls for the
+blocks involved. Each range is applied in one transaction together with
+the checkpoint, so an interrupted run resumes from the last complete range
+without applying any event twice.
+"""
+import logging
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from .abi import EVENT_TOPICS, decode_event, normalize_address
+from .aggregates import locked_amount, record_created, record_transition
+from .models import Escrow, EscrowEvent, EscrowState, IndexerCheckpoint
+from .rpc import get_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "START_BLOCK": 0,
+    # Blocks per eth_getLogs range
+    "CHUNK_SIZE": 2000,
+    # Ranges fetched per JSON-RPC batch
+    "BATCH_SIZE": 5,
+    # Blocks to stay behind the head to avoid reorged logs
+    "CONFIRMATIONS": 0,
+}
+
+# Events emitted by individual Escrow contracts, and the state they move to.
+# `None` leaves the state unchanged.
+ESCROW_TRANSITIONS = {
+    "Deposited": EscrowState.AWAITING_DELIVERY,
+    "ItemShipped": EscrowState.COMPLETE,
+    "DisputeRaised": EscrowState.DISPUTED,
+    "Released": None,
+    "Refunded": EscrowState.REFUNDED,
+    "DisputeResolved": EscrowState.RESOLVED,
+}
+
+
+def indexer_setting(name):
+    return getattr(settings, "ESCROW_INDEXER", {}).get(name, DEFAULTS[name])
+
+
+def _json_args(args):
+    # uint256 values do not fit in JSON numbers reliably
+    return {key: str(value) if isinstance(value, int) else value for key, value in args.items()}
+
+
+def _block_timestamp(log):
+    value = log.get("blockTimestamp")
+    return datetime.fromtimestamp(int(value, 16), timezone.utc) if value else None
+
+
+def fetch_block_timestamps(client, blocks):
+    """
+    Returns ``{block number: unix timestamp}`` for ``blocks``, read with one
+    batch of ``eth_getBlockByNumber`` calls. Blocks the node does not know
+    are left out.
+    """
+    blocks = list(blocks)
+    results = client.batch([("eth_getBlockByNumber", [hex(block), False]) for block in blocks])
+    return {block: int(result["timestamp"], 16) for block, result in zip(blocks, results) if result}
+
+
+def backfill_block_timestamps(client=None, batch_size=500):
+    """
+    Sets ``block_timestamp`` on events indexed without one, reading
+    ``batch_size`` blocks per batch. Returns the number of events updated.
+    """
+    client = client or get_client()
+    updated = 0
+    after = -1
+    while True:
+        blocks = list(
+            EscrowEvent.objects.filter(block_timestamp__isnull=True, block_number__gt=after)
+            .order_by("block_number").values_list("block_number", flat=True).distinct()[:batch_size]
+        )
+        if not blocks:
+            return updated
+        timestamps = fetch_block_timestamps(client, blocks)
+        with transaction.atomic():
+            for block, seconds in timestamps.items():
+                updated += EscrowEvent.objects.filter(block_number=block, block_timestamp__isnull=True).update(
+                    block_timestamp=datetime.fromtimestamp(seconds, timezone.utc)
+                )
+        after = blocks[-1]
+
+
+class EscrowIndexer:
+    """
+    Follows one EscrowFactory and every Escrow it deploys.
+    """
+    checkpoint_name = "escrow-factory"
+
+    def __init__(self, client=None, factory_address=None, start_block=None,
+                 chunk_size=None, batch_size=None, confirmations=None):
+        self.client = client or get_client()
+        self.factory_address = normalize_address(factory_address or settings.ESCROW_FACTORY_ADDRESS)
+        self.start_block = indexer_setting("START_BLOCK") if start_block is None else start_block
+        self.chunk_size = chunk_size or indexer_setting("CHUNK_SIZE")
+        self.batch_size = batch_size or indexer_setting("BATCH_SIZE")
+        self.confirmations = indexer_setting("CONFIRMATIONS") if confirmations is None else confirmations
+
+    def last_indexed_block(self):
+        checkpoint = IndexerCheckpoint.objects.filter(name=self.checkpoint_name).first()
+        return checkpoint.block_number if checkpoint else self.start_block - 1
+
+    def run_once(self):
+        """
+        Indexes from the checkpoint up to the confirmed head.
+        Returns the number of events applied.
+        """
+        head = self.client.block_number() - self.confirmations
+        start = self.last_indexed_block() + 1
+        applied = 0
+
+        ranges = [
+            (from_block, min(from_block + self.chunk_size - 1, head))
+            for from_block in range(start, head + 1, self.chunk_size)
+        ]
+        for i in range(0, len(ranges), self.batch_size):
+            window = ranges[i:i + self.batch_size]
+            for (from_block, to_block), logs in zip(window, self.fetch_logs(window)):
+                applied += self.apply_range(to_block, logs)
+        return applied
+
+    def fetch_logs(self, ranges):
+        """
+        Fetches factory and escrow logs for each ``(from_block, to_block)`` in one batch.
+        Returns one merged, chain-ordered log list per range.
+        """
+        requests = []
+        for from_block, to_block in ranges:
+            block_range = {"fromBlock": hex(from_block), "toBlock": hex(to_block)}
+            requests.append(("eth_getLogs", [{
+                **block_range,
+                "address": self.factory_address,
+                "topics": [[EVENT_TOPICS["EscrowCreated"]]],
+            }]))
+            # Escrow addresses are unbounded, so filter by topic and drop
+            # logs from contracts we have not indexed
+            requests.append(("eth_getLogs", [{
+                **block_range,
+                "topics": [[EVENT_TOPICS[name] for name in ESCROW_TRANSITIONS]],
+            }]))
+
+        results = self.client.batch(requests)
+        merged = []
+        for factory_logs, escrow_logs in zip(results[::2], results[1::2]):
+            logs = [log for log in factory_logs + escrow_logs if not log.get("removed")]
+            logs.sort(key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)))
+            merged.append(logs)
+        self.fill_timestamps([log for logs in merged for log in logs])
+        return merged
+
+    def fill_timestamps(self, logs):
+        """
+        Sets ``blockTimestamp`` on logs the node returned without one, with
+        one batched ``eth_getBlockByNumber`` per distinct block.
+        """
+        blocks = sorted({int(log["blockNumber"], 16) for log in logs if not log.get("blockTimestamp")})
+        if not blocks:
+            return
+        timestamps = fetch_block_timestamps(self.client, blocks)
+        for log in logs:
+            if not log.get("blockTimestamp"):
+                seconds = timestamps.get(int(log["blockNumber"], 16))
+                log["blockTimestamp"] = hex(seconds) if seconds is not None else None
+
+    @transaction.atomic
+    def apply_range(self, to_block, logs):
+        """
+        Applies the logs of one block range and advances the checkpoint.
+        """
+        addresses = {normalize_address(log["address"]) for log in logs}
+        escrows = Escrow.objects.in_bulk(addresses, field_name="address")
+
+        applied = 0
+        for log in logs:
+            address = normalize_address(log["address"])
+            # Escrow events are fetched by topic alone, so any contract may have sent them
+            if address != self.factory_address and address not in escrows:
+                continue
+            try:
+                name, args = decode_event(log)
+            except ValueError:
+                logger.warning("Skipping undecodable log %s:%s from %s",
+                               log["transactionHash"], int(log["logIndex"], 16), address)
+                continue
+            if name is None:
+                continue
+            position = {
+                "block_number": int(log["blockNumber"], 16),
+                "log_index": int(log["logIndex"], 16),
+                "transaction_hash": log["transactionHash"],
+            }
+
+            if name == "EscrowCreated":
+                if address != self.factory_address:
+                    continue
+                escrow = self._create_escrow(args, position)
+                escrows[escrow.address] = escrow
+            else:
+                escrow = escrows.get(address)
+                if escrow is None:
+                    continue
+                self._transition(escrow, name)
+
+            EscrowEvent.objects.create(
+                escrow=escrow, name=name, args=_json_args(args), state=escrow.state,
+                block_timestamp=_block_timestamp(log), **position
+            )
+            applied += 1
+
+        IndexerCheckpoint.objects.update_or_create(
+            name=self.checkpoint_name, defaults={"block_number": to_block}
+        )
+        if applied:
+            logger.info("Indexed %d escrow events up to block %d", applied, to_block)
+        return applied
+
+    def _create_escrow(self, args, position):
+        escrow = Escrow.objects.create(
+            address=args["escrowAddress"],
+            buyer=args["buyer"],
+            seller=args["seller"],
+            arbiter=args["arbiter"],
+            token=args["token"],
+            amount=args["amount"],
+            **position,
+        )
+        record_created(escrow)
+        return escrow
+
+    def _transition(self, escrow, name):
+        old_state, old_locked = escrow.state, locked_amount(escrow)
+        new_state = ESCROW_TRANSITIONS[name]
+        update_fields = ["updated_at"]
+        if new_state is not None:
+            escrow.state = new_state
+            update_fields.append("state")
+        if name == "Released":
+            escrow.released = True
+            update_fields.append("released")
+        escrow.save(update_fields=update_fields)
+        record_transition(escrow, old_state, old_locked)
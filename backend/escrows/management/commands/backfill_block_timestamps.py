@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from escrows.indexer import backfill_block_timestamps
+from escrows.rpc import RPCError
+
+
+class Command(BaseCommand):
+    help = "Reads block timestamps from the node for escrow events indexed without one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Blocks read per JSON-RPC batch.")
+
+    def handle(self, *args, **options):
+        try:
+            updated = backfill_block_timestamps(batch_size=options["batch_size"])
+        except RPCError as e:
+            raise CommandError(f"RPC error: {e}")
+        self.stdout.write(f"updated={updated}")
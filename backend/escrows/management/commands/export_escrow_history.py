@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from escrows.export import FORMATS, Encoder, export_queryset, parse_filters, stream_export
+
+
+class Command(BaseCommand):
+    help = "Writes the escrow event history as NDJSON or CSV, streaming it in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--type", choices=list(FORMATS), default="ndjson")
+        parser.add_argument("--output", help="File to write; defaults to stdout.")
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output.")
+        parser.add_argument("--from-block", help="First block to include.")
+        parser.add_argument("--to-block", help="Last block to include.")
+        parser.add_argument("--since", help="Include events at or after this ISO date or datetime (UTC if no zone).")
+        parser.add_argument("--until", help="Include events before this ISO date or datetime.")
+        parser.add_argument("--event", help="Comma-separated event names; defaults to ESCROW_EXPORT['EVENTS'].")
+        parser.add_argument("--escrow", help="Only this escrow's events.")
+        parser.add_argument("--chunk-size", type=int, help="Rows read and written at a time.")
+
+    def handle(self, *args, **options):
+        if options["gzip"] and not options["output"]:
+            raise CommandError("--gzip requires --output.")
+        try:
+            queryset = export_queryset(**parse_filters(options))
+        except ValueError as e:
+            raise CommandError(str(e))
+        encoder = Encoder(options["type"], compress=options["gzip"])
+        chunks = stream_export(queryset, encoder, options["chunk_size"])
+
+        if options["output"]:
+            with open(options["output"], "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending="")
@@ -0,0 +1,47 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from escrows.indexer import EscrowIndexer
+from escrows.rpc import RPCError
+
+
+class Command(BaseCommand):
+    help = "Indexes EscrowFactory and Escrow events into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Catch up to the current head and exit instead of following the chain.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5.0,
+            help="Seconds to wait between polls for new blocks.",
+        )
+
+    def handle(self, *args, **options):
+        indexer = EscrowIndexer()
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+
+        while True:
+            try:
+                applied = indexer.run_once()
+            except RPCError as e:
+                if options["once"]:
+                    raise
+                self.stderr.write(f"RPC error, retrying: {e}")
+            else:
+                self.stdout.write(
+                    f"applied={applied} block={indexer.last_indexed_block()}"
+                )
+            if options["once"] or self._stopping:
+                break
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
+
+    def _stop(self, signum, frame):
+        self._stopping = True
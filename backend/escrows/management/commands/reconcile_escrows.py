@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from escrows.reconcile import EscrowReconciler
+
+
+class Command(BaseCommand):
+    help = "Checks every indexed escrow against its contract and repairs state that has drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="Escrows read per RPC batch (defaults to ESCROW_RECONCILER['BATCH_SIZE']).",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Batches read at once (defaults to ESCROW_RECONCILER['WORKERS']).",
+        )
+        parser.add_argument(
+            "--rpc-budget", type=float, default=None,
+            help="Most eth_calls per second, 0 for no limit (defaults to ESCROW_RECONCILER['RPC_BUDGET']).",
+        )
+        parser.add_argument(
+            "--max-batches", type=int, default=None,
+            help="Stop after this many batches; the next run resumes where this one stopped.",
+        )
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="Start a new pass instead of resuming an interrupted one.",
+        )
+
+    def handle(self, *args, **options):
+        reconciler = EscrowReconciler(
+            batch_size=options["batch_size"], workers=options["workers"], rpc_budget=options["rpc_budget"],
+        )
+        stats = reconciler.run(restart=options["restart"], max_batches=options["max_batches"])
+        if stats["block"] is None:
+            self.stdout.write("Nothing indexed yet.")
+            return
+        self.stdout.write(
+            f"checked={stats['checked']} repaired={stats['repaired']} skipped={stats['skipped']} "
+            f"unreadable={stats['unreadable']} underfunded={stats['underfunded']} "
+            f"block={stats['block']} complete={stats['complete']} "
+            f"elapsed={stats['elapsed']:.2f}s rate={stats['per_second']:.1f}/s"
+        )
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:28
+
+import django.db.models.deletion
+import escrows.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Escrow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=42, unique=True)),
+                ('buyer', models.CharField(db_index=True, max_length=42)),
+                ('seller', models.CharField(db_index=True, max_length=42)),
+                ('arbiter', models.CharField(db_index=True, max_length=42)),
+                ('token', models.CharField(db_index=True, max_length=42)),
+                ('amount', escrows.fields.Uint256Field()),
+                ('state', models.PositiveSmallIntegerField(choices=[(0, 'Awaiting payment'), (1, 'Awaiting delivery'), (2, 'Disputed'), (3, 'Complete'), (4, 'Refunded'), (5, 'Resolved')], db_index=True, default=0)),
+                ('released', models.BooleanField(default=False)),
+                ('block_number', models.PositiveBigIntegerField()),
+                ('log_index', models.PositiveIntegerField()),
+                ('transaction_hash', models.CharField(max_length=66)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IndexerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('block_number', models.PositiveBigIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EscrowEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32)),
+                ('args', models.JSONField(default=dict)),
+                ('state', models.PositiveSmallIntegerField(choices=[(0, 'Awaiting payment'), (1, 'Awaiting delivery'), (2, 'Disputed'), (3, 'Complete'), (4, 'Refunded'), (5, 'Resolved')])),
+                ('block_number', models.PositiveBigIntegerField()),
+                ('log_index', models.PositiveIntegerField()),
+                ('transaction_hash', models.CharField(max_length=66)),
+                ('escrow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='escrows.escrow')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['escrow', 'block_number', 'log_index'], name='escrows_esc_escrow__90d918_idx')],
+                'constraints': [models.UniqueConstraint(fields=('block_number', 'log_index'), name='unique_event_position')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrows', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='escrow',
+            name='arbiter',
+            field=models.CharField(max_length=42),
+        ),
+        migrations.AlterField(
+            model_name='escrow',
+            name='buyer',
+            field=models.CharField(max_length=42),
+        ),
+        migrations.AlterField(
+            model_name='escrow',
+            name='seller',
+            field=models.CharField(max_length=42),
+        ),
+        migrations.AlterField(
+            model_name='escrow',
+            name='state',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Awaiting payment'), (1, 'Awaiting delivery'), (2, 'Disputed'), (3, 'Complete'), (4, 'Refunded'), (5, 'Resolved')], default=0),
+        ),
+        migrations.AlterField(
+            model_name='escrow',
+            name='token',
+            field=models.CharField(max_length=42),
+        ),
+        migrations.AddIndex(
+            model_name='escrow',
+            index=models.Index(fields=['buyer', 'block_number', 'log_index'], name='escrow_buyer_position'),
+        ),
+        migrations.AddIndex(
+            model_name='escrow',
+            index=models.Index(fields=['seller', 'block_number', 'log_index'], name='escrow_seller_position'),
+        ),
+        migrations.AddIndex(
+            model_name='escrow',
+            index=models.Index(fields=['arbiter', 'block_number', 'log_index'], name='escrow_arbiter_position'),
+        ),
+        migrations.AddIndex(
+            model_name='escrow',
+            index=models.Index(fields=['token', 'block_number', 'log_index'], name='escrow_token_position'),
+        ),
+        migrations.AddIndex(
+            model_name='escrow',
+            index=models.Index(fields=['state', 'block_number', 'log_index'], name='escrow_state_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='escrow',
+            constraint=models.UniqueConstraint(fields=('block_number', 'log_index'), name='unique_escrow_position'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrows', '0002_escrow_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=42, unique=True)),
+                ('symbol', models.CharField(blank=True, max_length=64)),
+                ('decimals', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:36
+
+import escrows.fields
+from django.db import migrations, models
+
+
+ZERO_ADDRESS = "0x" + "0" * 40
+LOCKED_STATES = (1, 2, 3)
+
+
+def backfill_aggregates(apps, schema_editor):
+    """
+    Builds aggregates for escrows indexed before the table existed.
+    """
+    Escrow = apps.get_model("escrows", "Escrow")
+    EscrowAggregate = apps.get_model("escrows", "EscrowAggregate")
+
+    totals = {}
+    for escrow in Escrow.objects.iterator(chunk_size=2000):
+        locked = escrow.amount if escrow.state in LOCKED_STATES and not escrow.released else 0
+        roles = [("buyer", escrow.buyer), ("seller", escrow.seller)]
+        if escrow.arbiter != ZERO_ADDRESS:
+            roles.append(("arbiter", escrow.arbiter))
+        for role, address in roles:
+            key = (address, role, escrow.token, escrow.state)
+            count, total, locked_total = totals.get(key, (0, 0, 0))
+            totals[key] = (count + 1, total + escrow.amount, locked_total + locked)
+
+    EscrowAggregate.objects.bulk_create(
+        [
+            EscrowAggregate(
+                address=address, role=role, token=token, state=state,
+                count=count, total_amount=total, locked_amount=locked,
+            )
+            for (address, role, token, state), (count, total, locked) in totals.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrows', '0003_tokenmetadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EscrowAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=42)),
+                ('role', models.CharField(choices=[('buyer', 'Buyer'), ('seller', 'Seller'), ('arbiter', 'Arbiter')], max_length=7)),
+                ('token', models.CharField(max_length=42)),
+                ('state', models.PositiveSmallIntegerField(choices=[(0, 'Awaiting payment'), (1, 'Awaiting delivery'), (2, 'Disputed'), (3, 'Complete'), (4, 'Refunded'), (5, 'Resolved')])),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_amount', escrows.fields.Uint256Field(default=0)),
+                ('locked_amount', escrows.fields.Uint256Field(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('address', 'role', 'token', 'state'), name='unique_escrow_aggregate')],
+            },
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
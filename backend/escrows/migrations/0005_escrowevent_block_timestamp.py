@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrows', '0004_escrowaggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escrowevent',
+            name='block_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='escrowevent',
+            index=models.Index(fields=['block_timestamp'], name='event_block_timestamp'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrows', '0005_escrowevent_block_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EscrowRepair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('block_number', models.PositiveBigIntegerField()),
+                ('changes', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('escrow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='repairs', to='escrows.escrow')),
+            ],
+        ),
+    ]
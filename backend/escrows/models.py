@@ -0,0 +1,158 @@
+from django.db import models
+
+from .fields import Uint256Field
+
+
+class EscrowState(models.IntegerChoices):
+    """
+    Mirrors the ``State`` enum in ``contracts/Escrow.sol``.
+    """
+    AWAITING_PAYMENT = 0, "Awaiting payment"
+    AWAITING_DELIVERY = 1, "Awaiting delivery"
+    DISPUTED = 2, "Disputed"
+    COMPLETE = 3, "Complete"
+    REFUNDED = 4, "Refunded"
+    RESOLVED = 5, "Resolved"
+
+
+class Escrow(models.Model):
+    """
+    An Escrow contract deployed by the EscrowFactory, as seen by the indexer.
+    Addresses are stored lowercase.
+    """
+    address = models.CharField(max_length=42, unique=True)
+    buyer = models.CharField(max_length=42)
+    seller = models.CharField(max_length=42)
+    arbiter = models.CharField(max_length=42)
+    token = models.CharField(max_length=42)
+    amount = Uint256Field()
+
+    state = models.PositiveSmallIntegerField(
+        choices=EscrowState.choices, default=EscrowState.AWAITING_PAYMENT
+    )
+    # `release()` pays the seller without leaving the COMPLETE state
+    released = models.BooleanField(default=False)
+
+    # Position of the EscrowCreated log
+    block_number = models.PositiveBigIntegerField()
+    log_index = models.PositiveIntegerField()
+    transaction_hash = models.CharField(max_length=66)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # List filters seek on (filter, block_number, log_index) so keyset
+        # pages cost the same at any depth
+        constraints = [
+            models.UniqueConstraint(fields=["block_number", "log_index"], name="unique_escrow_position"),
+        ]
+        indexes = [
+            models.Index(fields=["buyer", "block_number", "log_index"], name="escrow_buyer_position"),
+            models.Index(fields=["seller", "block_number", "log_index"], name="escrow_seller_position"),
+            models.Index(fields=["arbiter", "block_number", "log_index"], name="escrow_arbiter_position"),
+            models.Index(fields=["token", "block_number", "log_index"], name="escrow_token_position"),
+            models.Index(fields=["state", "block_number", "log_index"], name="escrow_state_position"),
+        ]
+
+    def __str__(self):
+        return self.address
+
+
+class EscrowEvent(models.Model):
+    """
+    A decoded EscrowFactory or Escrow log, kept in chain order.
+    """
+    escrow = models.ForeignKey(Escrow, on_delete=models.CASCADE, related_name="events")
+    name = models.CharField(max_length=32)
+    args = models.JSONField(default=dict)
+    # Escrow state after this event was applied
+    state = models.PositiveSmallIntegerField(choices=EscrowState.choices)
+
+    block_number = models.PositiveBigIntegerField()
+    log_index = models.PositiveIntegerField()
+    transaction_hash = models.CharField(max_length=66)
+    # From the log's blockTimestamp; null if the node does not report it
+    block_timestamp = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["block_number", "log_index"], name="unique_event_position"),
+        ]
+        indexes = [
+            models.Index(fields=["escrow", "block_number", "log_index"]),
+            models.Index(fields=["block_timestamp"], name="event_block_timestamp"),
+        ]
+
+    def __str__(self):
+        return f"{self.name}@{self.block_number}:{self.log_index}"
+
+
+class EscrowRepair(models.Model):
+    """
+    A correction made by the reconciler where an indexed escrow disagreed with the chain.
+    """
+    escrow = models.ForeignKey(Escrow, on_delete=models.CASCADE, related_name="repairs")
+    # Block the chain was read at
+    block_number = models.PositiveBigIntegerField()
+    # {field: [indexed value, on-chain value]}
+    changes = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.escrow}@{self.block_number}: {', '.join(self.changes)}"
+
+
+class IndexerCheckpoint(models.Model):
+    """
+    The last block fully processed by a named indexer, so it can resume.
+    """
+    name = models.CharField(max_length=64, unique=True)
+    block_number = models.PositiveBigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.block_number}"
+
+
+class TokenMetadata(models.Model):
+    """
+    ERC20 metadata read once from chain and shared by every escrow using the token.
+    """
+    address = models.CharField(max_length=42, unique=True)
+    symbol = models.CharField(max_length=64, blank=True)
+    decimals = models.PositiveSmallIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.symbol or self.address
+
+
+class EscrowAggregate(models.Model):
+    """
+    Running totals of one address's escrows in one role, per token and state.
+    Maintained by the indexer in the same transaction as each event.
+    """
+
+    class Role(models.TextChoices):
+        BUYER = "buyer", "Buyer"
+        SELLER = "seller", "Seller"
+        ARBITER = "arbiter", "Arbiter"
+
+    address = models.CharField(max_length=42)
+    role = models.CharField(max_length=7, choices=Role.choices)
+    token = models.CharField(max_length=42)
+    state = models.PositiveSmallIntegerField(choices=EscrowState.choices)
+
+    count = models.PositiveIntegerField(default=0)
+    total_amount = Uint256Field(default=0)
+    # Deposited and not yet paid out, i.e. still held by the contracts
+    locked_amount = Uint256Field(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["address", "role", "token", "state"], name="unique_escrow_aggregate"),
+        ]
+
+    def __str__(self):
+        return f"{self.address} {self.role} {self.token} {self.get_state_display()}: {self.count}"
@@ -0,0 +1,83 @@
+import base64
+import binascii
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over ``(block_number, log_index)``, newest first.
+
+    The cursor is the position of the last row on the previous page, so each
+    page is an index range seek and costs the same at any depth, unlike
+    offset pagination which has to skip every earlier row.
+    """
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            block_number, log_index = position
+            # The first condition is a range the index can seek to; the second
+            # only filters rows tied on block_number
+            queryset = queryset.filter(block_number__lte=block_number).exclude(
+                block_number=block_number, log_index__gte=log_index
+            )
+
+        rows = list(queryset.order_by("-block_number", "-log_index")[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(last.block_number, last.log_index),
+        )
+
+    def encode_cursor(self, block_number, log_index):
+        return base64.urlsafe_b64encode(f"{block_number}:{log_index}".encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            block_number, log_index = base64.urlsafe_b64decode(encoded.encode()).decode().split(":")
+            return int(block_number), int(log_index)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,243 @@
+"""
+Reconciliation of indexed escrows against their contracts.
+
+The indexer only sees what the contracts log. ``confirmDelivery()`` moves
+an escrow to COMPLETE with an ``ItemShipped`` event, and ``release()``
+pays the seller without changing the state, so a missed or reorged log
+leaves the stored state or ``released`` flag wrong with nothing to
+correct it. The reconciler reads ``currentState()`` and the escrow's token
+balance for every indexed escrow, at the block the indexer has reached,
+and repairs what disagrees.
+
+Escrows are read in batches ordered by creation. Each batch is one
+``call_many()`` of two calls per escrow, and ``workers`` batches are read
+at once on a thread pool. Results are applied in order on the calling
+thread: repairs are written with one bulk update per batch, with the
+aggregates and an ``EscrowRepair`` row per escrow, in the same transaction
+as the checkpoint. An interrupted pass resumes after the last applied
+batch. ``rpc_budget`` caps the calls per second across all workers.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .abi import decode_result, encode_call
+from .aggregates import LOCKED_STATES, locked_amount, record_transition
+from .indexer import EscrowIndexer
+from .models import Escrow, EscrowEvent, EscrowRepair, EscrowState, IndexerCheckpoint
+from .rpc import get_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Escrows read per call_many()
+    "BATCH_SIZE": 200,
+    # Batches read at once
+    "WORKERS": 4,
+    # eth_calls per second across all workers; 0 for no limit
+    "RPC_BUDGET": 0,
+}
+
+
+def reconcile_setting(name):
+    return getattr(settings, "ESCROW_RECONCILER", {}).get(name, DEFAULTS[name])
+
+
+class RateLimiter:
+    """
+    Paces callers to ``rate`` units per second, allowing a burst of one second's worth.
+    """
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = clock()
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        if not self.rate:
+            return
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Taking more than is available leaves a debt later callers wait out
+            self._tokens -= cost
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self._sleep(wait)
+
+
+class EscrowReconciler:
+    """
+    Compares every indexed escrow with its contract and repairs drift.
+    """
+    checkpoint_name = "escrow-reconciler"
+
+    def __init__(self, client=None, batch_size=None, workers=None, rpc_budget=None, clock=time.monotonic):
+        self.client = client or get_client()
+        self.batch_size = batch_size or reconcile_setting("BATCH_SIZE")
+        self.workers = workers or reconcile_setting("WORKERS")
+        self.budget = RateLimiter(reconcile_setting("RPC_BUDGET") if rpc_budget is None else rpc_budget)
+        self._clock = clock
+
+    def last_reconciled_block(self):
+        # Escrows created up to this block have been reconciled in the current pass
+        checkpoint = IndexerCheckpoint.objects.filter(name=self.checkpoint_name).first()
+        return checkpoint.block_number if checkpoint else -1
+
+    def run(self, restart=False, max_batches=None):
+        """
+        Reconciles escrows from the checkpoint on, stopping after
+        ``max_batches`` if given. Returns a dict of counts and throughput.
+        """
+        if restart:
+            IndexerCheckpoint.objects.filter(name=self.checkpoint_name).delete()
+        stats = dict.fromkeys(("checked", "repaired", "skipped", "unreadable", "underfunded", "batches"), 0)
+        # Compare against the chain as of the block the database reflects
+        stats["block"] = block = IndexerCheckpoint.objects.filter(
+            name=EscrowIndexer.checkpoint_name
+        ).values_list("block_number", flat=True).first()
+        stats["complete"] = False
+        started = self._clock()
+
+        if block is not None:
+            batches = self.batches(self.last_reconciled_block())
+            pending = deque()
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="reconcile") as pool:
+                try:
+                    for batch in batches:
+                        if max_batches is not None and stats["batches"] + len(pending) >= max_batches:
+                            break
+                        pending.append((batch, pool.submit(self.read, batch, block)))
+                        # Keep every worker busy without reading far ahead of what is applied
+                        while len(pending) >= self.workers * 2:
+                            self._apply_next(pending, block, stats)
+                    else:
+                        stats["complete"] = True
+                    while pending:
+                        self._apply_next(pending, block, stats)
+                finally:
+                    for _, future in pending:
+                        future.cancel()
+            if stats["complete"]:
+                IndexerCheckpoint.objects.filter(name=self.checkpoint_name).delete()
+
+        stats["elapsed"] = self._clock() - started
+        stats["per_second"] = stats["checked"] / stats["elapsed"] if stats["elapsed"] else 0.0
+        if stats["repaired"]:
+            logger.info("Repaired %d of %d escrows at block %d", stats["repaired"], stats["checked"], block)
+        return stats
+
+    def batches(self, after_block):
+        """
+        Yields escrows created after ``after_block`` in batches that end on a block boundary.
+        """
+        while True:
+            batch = list(
+                Escrow.objects.filter(block_number__gt=after_block)
+                .order_by("block_number", "log_index")[:self.batch_size]
+            )
+            if not batch:
+                return
+            last = batch[-1]
+            batch += Escrow.objects.filter(block_number=last.block_number, log_index__gt=last.log_index).order_by(
+                "log_index"
+            )
+            yield batch
+            after_block = last.block_number
+
+    def read(self, batch, block):
+        """
+        Returns ``(state, token balance)`` for each escrow at ``block``, or
+        ``None`` where either call reverted.
+        """
+        calls = []
+        for escrow in batch:
+            calls += [
+                (escrow.address, encode_call("currentState()")),
+                (escrow.token, encode_call("balanceOf(address)", escrow.address)),
+            ]
+        self.budget.acquire(len(calls))
+        results = self.client.call_many(calls, block=hex(block))
+
+        readings = []
+        for state, balance in zip(results[::2], results[1::2]):
+            if state is None or balance is None:
+                readings.append(None)
+                continue
+            try:
+                readings.append((decode_result(state, "uint8"), decode_result(balance, "uint256")))
+            except ValueError:
+                # e.g. "0x" from an address with no code
+                readings.append(None)
+        return readings
+
+    @transaction.atomic
+    def apply(self, batch, readings, block, stats):
+        """
+        Repairs the escrows in ``batch`` whose stored state disagrees with
+        ``readings`` and advances the checkpoint.
+        """
+        ids = [escrow.id for escrow in batch]
+        escrows = Escrow.objects.select_for_update().in_bulk(ids)
+        # Escrows the indexer has moved past `block` since are already newer than the reading
+        moved = set(
+            EscrowEvent.objects.filter(escrow_id__in=ids, block_number__gt=block).values_list("escrow_id", flat=True)
+        )
+        now = timezone.now()
+        repaired, repairs = [], []
+
+        for escrow_id, reading in zip(ids, readings):
+            escrow = escrows.get(escrow_id)
+            stats["checked"] += 1
+            if escrow is None or escrow_id in moved:
+                stats["skipped"] += 1
+                continue
+            if reading is None:
+                stats["unreadable"] += 1
+                continue
+
+            state, balance = reading
+            # release() pays out without leaving COMPLETE; the balance shows whether it ran
+            released = state == EscrowState.COMPLETE and balance < escrow.amount
+            if state in LOCKED_STATES and not released and balance < escrow.amount:
+                stats["underfunded"] += 1
+                logger.warning("Escrow %s holds %d of %d tokens at block %d",
+                               escrow.address, balance, escrow.amount, block)
+
+            changes = {}
+            if escrow.state != state:
+                changes["state"] = [escrow.state, state]
+            if escrow.released != released:
+                changes["released"] = [escrow.released, released]
+            if not changes:
+                continue
+
+            repaired.append((escrow, escrow.state, locked_amount(escrow)))
+            escrow.state, escrow.released, escrow.updated_at = state, released, now
+            repairs.append(EscrowRepair(escrow=escrow, block_number=block, changes=changes))
+
+        if repaired:
+            Escrow.objects.bulk_update([escrow for escrow, _, _ in repaired], ["state", "released", "updated_at"])
+            for escrow, old_state, old_locked in repaired:
+                record_transition(escrow, old_state, old_locked)
+            EscrowRepair.objects.bulk_create(repairs)
+            stats["repaired"] += len(repaired)
+
+        IndexerCheckpoint.objects.update_or_create(
+            name=self.checkpoint_name, defaults={"block_number": batch[-1].block_number}
+        )
+        stats["batches"] += 1
+
+    def _apply_next(self, pending, block, stats):
+        batch, future = pending.popleft()
+        self.apply(batch, future.result(), block, stats)
@@ -0,0 +1,238 @@
+"""
+Ethereum JSON-RPC client shared by the escrow endpoints and background jobs.
+
+Requests go over a pool of keep-alive HTTP connections, with a limit on
+how many are in flight at once. ``call_many()`` coalesces ``eth_call``s
+into JSON-RPC batches, or into Multicall3 ``aggregate3`` calls when
+``ETH_RPC['MULTICALL_ADDRESS']`` is set, and sends the batches
+concurrently.
+"""
+import http.client
+import itertools
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from monitoring.metrics import track
+
+from .abi import decode_aggregate3, encode_aggregate3, normalize_address
+
+DEFAULTS = {
+    "TIMEOUT": 10,
+    # Idle keep-alive connections kept per client
+    "POOL_SIZE": 8,
+    # HTTP requests in flight at once, across all threads using the client
+    "MAX_CONCURRENCY": 8,
+    # eth_calls per JSON-RPC batch or per aggregate3 call
+    "MAX_BATCH_SIZE": 100,
+    "MULTICALL_ADDRESS": None,
+}
+
+
+def rpc_setting(name):
+    return getattr(settings, "ETH_RPC", {}).get(name, DEFAULTS[name])
+
+
+class RPCError(Exception):
+    """
+    Raised when the node returns a JSON-RPC error or an unusable response.
+    """
+
+    def __init__(self, message, code=None, data=None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of keep-alive HTTP(S) connections to one node.
+    """
+
+    def __init__(self, url, size, timeout):
+        parts = urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        )
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def post(self, body, headers):
+        """
+        Sends a POST over a pooled connection and returns the response body.
+        A stale keep-alive connection is retried once on a fresh one.
+        """
+        for attempt in range(2):
+            connection, reused = self._acquire()
+            try:
+                connection.request("POST", self.path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            if response.status >= 400:
+                raise RPCError(f"HTTP {response.status} from node", code=response.status)
+            return data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self.connection_class(self.host, self.port, timeout=self.timeout), False
+
+    def _release(self, connection):
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+
+class JSONRPCClient:
+    """
+    Sends JSON-RPC 2.0 requests to an Ethereum node over HTTP.
+    """
+
+    def __init__(self, url, timeout=None, pool_size=None, max_concurrency=None,
+                 max_batch_size=None, multicall_address=None):
+        self.url = url
+        self.max_concurrency = max_concurrency or rpc_setting("MAX_CONCURRENCY")
+        self.max_batch_size = max_batch_size or rpc_setting("MAX_BATCH_SIZE")
+        multicall_address = multicall_address or rpc_setting("MULTICALL_ADDRESS")
+        self.multicall_address = normalize_address(multicall_address) if multicall_address else None
+
+        self._pool = ConnectionPool(
+            url, pool_size or rpc_setting("POOL_SIZE"), timeout or rpc_setting("TIMEOUT")
+        )
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="rpc")
+        self._ids = itertools.count(1)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._pool.close()
+
+    def call(self, method, params=()):
+        """
+        Sends a single request and returns its result.
+        """
+        return self.batch([(method, params)])[0]
+
+    def batch(self, requests, raise_errors=True):
+        """
+        Sends ``[(method, params), ...]`` as one JSON-RPC batch.
+
+        Results are returned in request order. If any request failed,
+        raises ``RPCError``, or with ``raise_errors=False`` returns the
+        ``RPCError`` in that request's place.
+        """
+        if not requests:
+            return []
+        payload = [
+            {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": list(params)}
+            for method, params in requests
+        ]
+        responses = self._post(payload)
+        if not isinstance(responses, list):
+            # Some nodes answer a rejected batch with a single error object
+            responses = [responses]
+
+        by_id = {response.get("id"): response for response in responses}
+        results = []
+        for request in payload:
+            response = by_id.get(request["id"])
+            if response is None:
+                result = RPCError(f"No response for {request['method']}")
+            elif "error" in response:
+                error = response["error"]
+                result = RPCError(error.get("message", "RPC error"), error.get("code"), error.get("data"))
+            else:
+                result = response.get("result")
+            if raise_errors and isinstance(result, RPCError):
+                raise result
+            results.append(result)
+        return results
+
+    def block_number(self):
+        return int(self.call("eth_blockNumber"), 16)
+
+    def call_many(self, calls, block="latest"):
+        """
+        Executes ``[(to, calldata), ...]`` as read-only ``eth_call``s.
+
+        Returns the raw return data for each call in order, or ``None``
+        where the call reverted. Calls are grouped into batches of
+        ``max_batch_size`` that are sent concurrently.
+        """
+        calls = list(calls)
+        if not calls:
+            return []
+        chunks = [calls[i:i + self.max_batch_size] for i in range(0, len(calls), self.max_batch_size)]
+        send = self._multicall_chunk if self.multicall_address else self._batch_chunk
+
+        if len(chunks) == 1:
+            return send(chunks[0], block)
+        results = []
+        for chunk_results in self._executor.map(lambda chunk: send(chunk, block), chunks):
+            results.extend(chunk_results)
+        return results
+
+    def _batch_chunk(self, calls, block):
+        results = self.batch(
+            [("eth_call", [{"to": to, "data": data}, block]) for to, data in calls],
+            raise_errors=False,
+        )
+        return [None if isinstance(result, RPCError) else result for result in results]
+
+    def _multicall_chunk(self, calls, block):
+        data = self.call("eth_call", [{"to": self.multicall_address, "data": encode_aggregate3(calls)}, block])
+        return [return_data if success else None for success, return_data in decode_aggregate3(data)]
+
+    def _post(self, payload):
+        body = json.dumps(payload).encode()
+        operation = "batch" if isinstance(payload, list) else payload["method"]
+        with self._slots, track("rpc", operation):
+            try:
+                data = self._pool.post(body, {"Content-Type": "application/json"})
+            except (http.client.HTTPException, OSError) as e:
+                raise RPCError(f"RPC request to {self.url} failed: {e}") from e
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise RPCError(f"Invalid JSON from {self.url}") from e
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the process-wide client for ``ETH_RPC_URL``, so every caller
+    shares its connection pool and concurrency limit.
+    """
+    url = settings.ETH_RPC_URL
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = JSONRPCClient(url)
+        return client
@@ -0,0 +1,60 @@
+from rest_framework import serializers
+
+from .abi import normalize_address
+from .allowances import allowance_setting
+from .models import Escrow
+
+
+class AddressField(serializers.CharField):
+    """
+    An Ethereum address, normalized to lowercase.
+    """
+    default_error_messages = {'invalid': 'Enter a valid address.'}
+
+    def to_internal_value(self, data):
+        try:
+            return normalize_address(super().to_internal_value(data))
+        except ValueError:
+            self.fail('invalid')
+
+
+class EscrowSerializer(serializers.ModelSerializer):
+    """
+    Serializer for an indexed escrow.
+    Amounts are returned as strings since uint256 values overflow JSON numbers.
+    """
+    amount = serializers.CharField(read_only=True)
+    state_name = serializers.CharField(source='get_state_display', read_only=True)
+    token_metadata = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Escrow
+        fields = (
+            'address', 'buyer', 'seller', 'arbiter', 'token', 'token_metadata', 'amount',
+            'state', 'state_name', 'released',
+            'block_number', 'log_index', 'transaction_hash',
+        )
+        read_only_fields = fields
+
+    def get_token_metadata(self, obj):
+        # Resolved for the whole page up front by the view
+        return self.context.get('token_metadata', {}).get(obj.token)
+
+
+class AllowanceQuerySerializer(serializers.Serializer):
+    token = AddressField()
+    owner = AddressField()
+    spender = AddressField()
+
+
+class AllowanceSnapshotSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of (token, owner, spender) triples to read together.
+    """
+    items = serializers.ListField(child=AllowanceQuerySerializer(), allow_empty=False)
+
+    def validate_items(self, items):
+        limit = allowance_setting('MAX_ITEMS')
+        if len(items) > limit:
+            raise serializers.ValidationError(f'Ensure this field has no more than {limit} elements.')
+        return items
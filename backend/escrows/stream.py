@@ -0,0 +1,212 @@
+"""
+Server-sent event stream of escrow changes.
+
+Each ASGI worker runs one poller that reads newly indexed ``EscrowEvent``
+rows and fans every delta out to the connected subscribers whose filters
+match. The delta is serialized once, however many subscribers receive it.
+Each subscriber has a bounded buffer; a subscriber that falls behind is
+sent an ``overflow`` event and disconnected, and should refetch and
+reconnect with ``Last-Event-ID``.
+"""
+import asyncio
+import json
+import logging
+import weakref
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import EscrowEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Seconds between polls for new events when idle
+    "POLL_INTERVAL": 1.0,
+    # Events buffered per subscriber before it is disconnected
+    "BUFFER_SIZE": 100,
+    # Seconds between keep-alive comments on an idle stream
+    "HEARTBEAT": 15.0,
+    # Events replayed to a reconnecting subscriber before it must resync
+    "BACKLOG_LIMIT": 500,
+}
+
+
+def stream_setting(name):
+    return getattr(settings, "ESCROW_STREAM", {}).get(name, DEFAULTS[name])
+
+
+def to_delta(event):
+    escrow = event.escrow
+    return {
+        "id": event.id,
+        "type": "created" if event.name == "EscrowCreated" else "state",
+        "event": event.name,
+        "escrow": escrow.address,
+        "buyer": escrow.buyer,
+        "seller": escrow.seller,
+        "arbiter": escrow.arbiter,
+        "token": escrow.token,
+        "amount": str(escrow.amount),
+        "state": event.state,
+        "state_name": event.get_state_display(),
+        "block_number": event.block_number,
+        "log_index": event.log_index,
+        "transaction_hash": event.transaction_hash,
+    }
+
+
+def format_event(delta):
+    return f"id: {delta['id']}\nevent: escrow\ndata: {json.dumps(delta)}\n\n".encode()
+
+
+async def fetch_deltas(after_id, limit, addresses=(), participants=()):
+    """
+    Returns up to ``limit`` deltas for events after ``after_id``, oldest first.
+    """
+    queryset = EscrowEvent.objects.filter(id__gt=after_id).select_related("escrow").order_by("id")
+    if addresses:
+        queryset = queryset.filter(escrow__address__in=addresses)
+    if participants:
+        queryset = queryset.filter(
+            Q(escrow__buyer__in=participants)
+            | Q(escrow__seller__in=participants)
+            | Q(escrow__arbiter__in=participants)
+        )
+    return [to_delta(event) async for event in queryset[:limit]]
+
+
+class Subscription:
+    """
+    One connected client: its filters and bounded buffer.
+    """
+
+    def __init__(self, addresses=(), participants=(), buffer_size=None):
+        self.addresses = frozenset(addresses)
+        self.participants = frozenset(participants)
+        self.queue = asyncio.Queue(buffer_size or stream_setting("BUFFER_SIZE"))
+        self.overflowed = False
+
+    def matches(self, delta):
+        if self.addresses and delta["escrow"] not in self.addresses:
+            return False
+        if self.participants and self.participants.isdisjoint(
+            (delta["buyer"], delta["seller"], delta["arbiter"])
+        ):
+            return False
+        return True
+
+
+class EscrowEventHub:
+    """
+    Fans indexed escrow events out to the subscribers on one event loop.
+    """
+
+    def __init__(self, poll_interval=None, batch_size=None):
+        self.poll_interval = poll_interval or stream_setting("POLL_INTERVAL")
+        self.batch_size = batch_size or stream_setting("BUFFER_SIZE")
+        self.subscribers = set()
+        self.cursor = None
+        self._task = None
+
+    async def subscribe(self, subscription):
+        """
+        Adds ``subscription`` and starts polling. Returns once the cursor is
+        set, so a backlog read afterwards overlaps the live events instead of
+        leaving a gap.
+        """
+        self.subscribers.add(subscription)
+        if self.cursor is None:
+            latest = await EscrowEvent.objects.order_by("-id").values_list("id", flat=True).afirst()
+            # Another subscriber may have set it while this one waited
+            if self.cursor is None:
+                self.cursor = latest or 0
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+        if not self.subscribers and self._task is not None:
+            # The next subscriber starts from the tail again
+            self._task.cancel()
+            self._task = None
+            self.cursor = None
+
+    def publish(self, delta):
+        message = None
+        for subscription in list(self.subscribers):
+            if not subscription.matches(delta):
+                continue
+            message = message or format_event(delta)
+            try:
+                subscription.queue.put_nowait((delta["id"], message))
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                self.subscribers.discard(subscription)
+
+    async def _poll(self):
+        while self.subscribers:
+            try:
+                deltas = await fetch_deltas(self.cursor, self.batch_size)
+            except Exception:
+                # Keep polling; the subscribers would otherwise wait forever
+                logger.exception("Could not read escrow events after %s", self.cursor)
+                await asyncio.sleep(self.poll_interval)
+                continue
+            for delta in deltas:
+                self.cursor = delta["id"]
+                self.publish(delta)
+            if len(deltas) < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """
+    Returns the hub for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = EscrowEventHub()
+    return hub
+
+
+async def event_stream(subscription, last_event_id=None, hub=None):
+    """
+    Yields SSE messages for ``subscription``: first any backlog after
+    ``last_event_id``, then live events until the client disconnects.
+    """
+    hub = hub or get_hub()
+    try:
+        await hub.subscribe(subscription)
+        delivered = 0
+        if last_event_id is not None:
+            limit = stream_setting("BACKLOG_LIMIT")
+            backlog = await fetch_deltas(
+                last_event_id, limit + 1, subscription.addresses, subscription.participants
+            )
+            if len(backlog) > limit:
+                yield b"event: overflow\ndata: {}\n\n"
+                return
+            for delta in backlog:
+                delivered = delta["id"]
+                yield format_event(delta)
+
+        heartbeat = stream_setting("HEARTBEAT")
+        while True:
+            if subscription.overflowed and subscription.queue.empty():
+                yield b"event: overflow\ndata: {}\n\n"
+                return
+            try:
+                event_id, message = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            # Skip live events already replayed from the backlog
+            if event_id > delivered:
+                yield message
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,237 @@
+"""
+A local stub Ethereum JSON-RPC server for tests.
+
+``FakeChain`` holds blocks, logs and contract view functions in memory;
+``FakeRPCServer`` serves it over HTTP on a free localhost port, answering
+both single and batch requests, and records every request it receives.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .abi import (
+    SELECTORS,
+    decode_aggregate3_calls,
+    decode_word,
+    encode_aggregate3_result,
+    encode_event,
+    encode_result,
+    normalize_address,
+    split_words,
+)
+
+SIGNATURES = {selector: signature for signature, selector in SELECTORS.items()}
+
+
+class Revert(Exception):
+    pass
+
+
+class FakeChain:
+    """
+    In-memory chain state: a block height, a list of logs and contracts.
+
+    Contracts are dicts mapping a function signature to ``(return type,
+    value)``, where ``value`` may be a callable taking the decoded arguments.
+    """
+
+    # Block n is mined at GENESIS_TIME + n * BLOCK_TIME
+    GENESIS_TIME = 1_700_000_000
+    BLOCK_TIME = 12
+
+    def __init__(self, log_timestamps=True):
+        self.block_number = 0
+        self.logs = []
+        self.contracts = {}
+        self.multicall_address = None
+        # Hardhat and older nodes leave blockTimestamp out of logs
+        self.log_timestamps = log_timestamps
+        self._lock = threading.Lock()
+
+    def add_contract(self, address, functions):
+        self.contracts[normalize_address(address)] = dict(functions)
+
+    def add_multicall(self, address):
+        self.multicall_address = normalize_address(address)
+
+    def mine(self, blocks=1):
+        with self._lock:
+            self.block_number += blocks
+            return self.block_number
+
+    def emit(self, address, event, **args):
+        """
+        Appends an event log in a new block and returns the log.
+        """
+        topics, data = encode_event(event, **args)
+        with self._lock:
+            self.block_number += 1
+            log = {
+                "address": normalize_address(address),
+                "topics": topics,
+                "data": data,
+                "blockNumber": hex(self.block_number),
+                "blockTimestamp": hex(self.GENESIS_TIME + self.block_number * self.BLOCK_TIME),
+                "logIndex": "0x0",
+                "transactionHash": "0x" + format(len(self.logs) + 1, "x").rjust(64, "0"),
+                "removed": False,
+            }
+            self.logs.append(log)
+            return log
+
+    # JSON-RPC methods
+
+    def eth_blockNumber(self):
+        return hex(self.block_number)
+
+    def eth_chainId(self):
+        return hex(31337)
+
+    def eth_call(self, transaction, block="latest"):
+        to = normalize_address(transaction["to"])
+        data = transaction.get("data") or transaction.get("input") or "0x"
+        if to == self.multicall_address and data.startswith(SELECTORS["aggregate3((address,bool,bytes)[])"]):
+            results = []
+            for target, allow_failure, calldata in decode_aggregate3_calls(data):
+                try:
+                    results.append((True, self._execute(target, calldata)))
+                except Revert:
+                    if not allow_failure:
+                        raise
+                    results.append((False, "0x"))
+            return encode_aggregate3_result(results)
+        return self._execute(to, data)
+
+    def _execute(self, to, data):
+        signature = SIGNATURES.get(data[:10])
+        functions = self.contracts.get(to, {})
+        if signature not in functions:
+            raise Revert("execution reverted")
+        type_, value = functions[signature]
+        if callable(value):
+            types = signature[signature.index("(") + 1:-1].split(",") if not signature.endswith("()") else []
+            args = [decode_word(word, t) for word, t in zip(split_words(data[10:]), types)]
+            value = value(*args)
+        return encode_result(value, type_)
+
+    def eth_getBlockByNumber(self, block, full_transactions=False):
+        number = self.block_number if block == "latest" else int(block, 16)
+        if number > self.block_number:
+            return None
+        return {"number": hex(number), "timestamp": hex(self.GENESIS_TIME + number * self.BLOCK_TIME)}
+
+    def eth_getLogs(self, params):
+        from_block = int(params.get("fromBlock", "0x0"), 16)
+        to_block = int(params.get("toBlock", hex(self.block_number)), 16)
+        addresses = params.get("address")
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = {normalize_address(a) for a in addresses} if addresses else None
+        topic0 = (params.get("topics") or [None])[0]
+        if isinstance(topic0, str):
+            topic0 = [topic0]
+
+        logs = [
+            log for log in self.logs
+            if from_block <= int(log["blockNumber"], 16) <= to_block
+            and (addresses is None or log["address"] in addresses)
+            and (not topic0 or log["topics"][0] in topic0)
+        ]
+        if not self.log_timestamps:
+            logs = [{key: value for key, value in log.items() if key != "blockTimestamp"} for log in logs]
+        return logs
+
+
+class FakeRPCServer:
+    """
+    Serves a ``FakeChain`` over JSON-RPC. Use as a context manager or call
+    ``start()``/``stop()``; ``url`` is valid once started.
+    """
+
+    def __init__(self, chain=None):
+        self.chain = chain or FakeChain()
+        self.requests = []  # one entry per HTTP request: list of method names
+        self.connections = 0
+        self.max_in_flight = 0
+        self.delay = 0  # seconds added to every response
+        self._in_flight = 0
+        self._counter_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, request):
+        method = getattr(self.chain, request.get("method", ""), None)
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        if method is None:
+            response["error"] = {"code": -32601, "message": "Method not found"}
+            return response
+        try:
+            response["result"] = method(*request.get("params", []))
+        except Exception as e:
+            response["error"] = {"code": -32000, "message": str(e)}
+        return response
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._counter_lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                with server._counter_lock:
+                    server._in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                try:
+                    self._respond()
+                finally:
+                    with server._counter_lock:
+                        server._in_flight -= 1
+
+            def _respond(self):
+                if server.delay:
+                    time.sleep(server.delay)
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if isinstance(body, list):
+                    server.requests.append([r.get("method") for r in body])
+                    payload = [server.handle(r) for r in body]
+                else:
+                    server.requests.append([body.get("method")])
+                    payload = server.handle(body)
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
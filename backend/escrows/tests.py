@@ -0,0 +1,1237 @@
+import asyncio
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import stream
+from .abi import ZERO_ADDRESS, encode_call
+from .aggregates import record_created
+from .allowances import AllowanceService
+from .caching import escrow_version
+from .contracts import read_escrows
+from .export import Encoder, export_queryset, stream_export
+from .indexer import EscrowIndexer
+from .models import (
+    Escrow,
+    EscrowAggregate,
+    EscrowEvent,
+    EscrowRepair,
+    EscrowState,
+    IndexerCheckpoint,
+    TokenMetadata,
+)
+from .reconcile import EscrowReconciler, RateLimiter
+from .rpc import JSONRPCClient, RPCError
+from .stream import EscrowEventHub, Subscription
+from .tokens import TokenMetadataService, get_token_metadata_service
+from .testing import FakeRPCServer
+
+FACTORY = "0x5fbdb2315678afecb367f032d93f642f64180aa3"
+ESCROW = "0x" + "e1" * 20
+BUYER = "0x" + "b1" * 20
+SELLER = "0x" + "5e" * 20
+ARBITER = "0x" + "a1" * 20
+TOKEN = "0x" + "70" * 20
+
+
+class FakeChainTestCase(TestCase):
+    """
+    Runs each test against a fresh stub JSON-RPC server.
+    """
+
+    def setUp(self):
+        self.server = FakeRPCServer().start()
+        self.addCleanup(self.server.stop)
+        self.chain = self.server.chain
+        self.client = JSONRPCClient(self.server.url)
+        self.addCleanup(self.client.close)
+
+    def create_escrow(self, address=ESCROW, amount=10 ** 21, **overrides):
+        args = {
+            "escrowAddress": address,
+            "buyer": BUYER,
+            "seller": SELLER,
+            "arbiter": ARBITER,
+            "token": TOKEN,
+            "amount": amount,
+            **overrides,
+        }
+        return self.chain.emit(FACTORY, "EscrowCreated", **args)
+
+
+class EscrowIndexerTests(FakeChainTestCase):
+    def indexer(self, **kwargs):
+        return EscrowIndexer(client=self.client, factory_address=FACTORY, **kwargs)
+
+    def test_indexes_created_escrow(self):
+        """
+        Ensure an EscrowCreated log creates an escrow awaiting payment.
+        """
+        self.create_escrow()
+        self.assertEqual(self.indexer().run_once(), 1)
+
+        escrow = Escrow.objects.get(address=ESCROW)
+        self.assertEqual(escrow.buyer, BUYER)
+        self.assertEqual(escrow.seller, SELLER)
+        self.assertEqual(escrow.arbiter, ARBITER)
+        self.assertEqual(escrow.token, TOKEN)
+        self.assertEqual(escrow.amount, 10 ** 21)
+        self.assertEqual(escrow.state, EscrowState.AWAITING_PAYMENT)
+        self.assertEqual(escrow.events.get().args['amount'], str(10 ** 21))
+
+    def test_applies_state_transitions_in_order(self):
+        """
+        Ensure escrow events move the stored state through the contract's state machine.
+        """
+        self.create_escrow()
+        self.chain.emit(ESCROW, "Deposited", buyer=BUYER, depositedAmount=10 ** 21)
+        self.chain.emit(ESCROW, "ItemShipped", seller=SELLER)
+        self.chain.emit(ESCROW, "Released", seller=SELLER, releasedAmount=10 ** 21)
+        self.indexer().run_once()
+
+        escrow = Escrow.objects.get(address=ESCROW)
+        self.assertEqual(escrow.state, EscrowState.COMPLETE)
+        self.assertTrue(escrow.released)
+        self.assertEqual(
+            list(escrow.events.order_by('block_number').values_list('name', 'state')),
+            [
+                ('EscrowCreated', EscrowState.AWAITING_PAYMENT),
+                ('Deposited', EscrowState.AWAITING_DELIVERY),
+                ('ItemShipped', EscrowState.COMPLETE),
+                ('Released', EscrowState.COMPLETE),
+            ],
+        )
+
+    def test_ignores_logs_from_unknown_contracts(self):
+        """
+        Ensure lookalike logs from other factories or contracts are skipped.
+        """
+        self.create_escrow()
+        self.chain.emit("0x" + "99" * 20, "Deposited", buyer=BUYER, depositedAmount=1)
+        self.chain.emit(
+            "0x" + "98" * 20, "EscrowCreated", escrowAddress="0x" + "97" * 20,
+            buyer=BUYER, seller=SELLER, arbiter=ARBITER, token=TOKEN, amount=1,
+        )
+        self.assertEqual(self.indexer().run_once(), 1)
+        self.assertEqual(Escrow.objects.count(), 1)
+        self.assertEqual(Escrow.objects.get().state, EscrowState.AWAITING_PAYMENT)
+
+    def test_skips_same_topic_logs_with_another_layout(self):
+        """
+        Ensure a foreign or malformed log with one of our topics is skipped instead of failing the range.
+        """
+        self.create_escrow()
+        self.chain.emit(ESCROW, "Deposited", buyer=BUYER, depositedAmount=10 ** 21)
+        foreign = self.chain.emit("0x" + "99" * 20, "Deposited", buyer=BUYER, depositedAmount=1)
+        # A Deposited-topic log without the indexed buyer or any data
+        foreign.update(topics=foreign["topics"][:1], data="0x")
+        malformed = self.chain.emit(ESCROW, "Refunded", buyer=BUYER, refundedAmount=1)
+        malformed.update(topics=malformed["topics"][:1], data="0x")
+        self.chain.emit(ESCROW, "ItemShipped", seller=SELLER)
+
+        with self.assertLogs('escrows.indexer', 'WARNING'):
+            self.assertEqual(self.indexer().run_once(), 3)
+        self.assertEqual(Escrow.objects.get().state, EscrowState.COMPLETE)
+        self.assertEqual(IndexerCheckpoint.objects.get().block_number, 5)
+
+    def test_fetches_ranges_in_batches(self):
+        """
+        Ensure block ranges are chunked and several ranges share one JSON-RPC batch.
+        """
+        self.chain.mine(8)  # blocks 1-8
+        self.create_escrow()  # block 9
+        self.server.requests.clear()
+
+        self.indexer(chunk_size=2, batch_size=3).run_once()
+
+        # eth_blockNumber, then blocks 0-9 as 5 ranges in batches of 3 and 2 (two getLogs each)
+        self.assertEqual([len(r) for r in self.server.requests], [1, 6, 4])
+        self.assertEqual(Escrow.objects.count(), 1)
+
+    def test_reads_block_timestamps_missing_from_logs(self):
+        """
+        Ensure block times are read in one batch when the node leaves them out of logs.
+        """
+        self.chain.log_timestamps = False
+        self.create_escrow()  # block 1
+        self.chain.emit(ESCROW, "Deposited", buyer=BUYER, depositedAmount=10 ** 21)  # block 2
+        self.server.requests.clear()
+
+        self.indexer().run_once()
+
+        self.assertEqual(self.server.requests[-1], ['eth_getBlockByNumber', 'eth_getBlockByNumber'])
+        self.assertEqual(
+            [event.block_timestamp.isoformat() for event in EscrowEvent.objects.order_by('block_number')],
+            ['2023-11-14T22:13:32+00:00', '2023-11-14T22:13:44+00:00'],
+        )
+
+    def test_resumes_from_checkpoint(self):
+        """
+        Ensure a second run only fetches blocks after the stored checkpoint.
+        """
+        self.create_escrow()
+        indexer = self.indexer()
+        indexer.run_once()
+        self.assertEqual(IndexerCheckpoint.objects.get().block_number, 1)
+
+        self.chain.emit(ESCROW, "Deposited", buyer=BUYER, depositedAmount=10 ** 21)
+        self.server.requests.clear()
+        self.assertEqual(self.indexer().run_once(), 1)
+        self.assertEqual(IndexerCheckpoint.objects.get().block_number, 2)
+        self.assertEqual(EscrowEvent.objects.count(), 2)
+
+        # Nothing new: only the head is queried
+        self.server.requests.clear()
+        self.assertEqual(indexer.run_once(), 0)
+        self.assertEqual(self.server.requests, [['eth_blockNumber']])
+
+    def test_respects_confirmations(self):
+        """
+        Ensure logs newer than the confirmation depth are left for a later run.
+        """
+        self.create_escrow()
+        self.chain.mine(1)
+        self.assertEqual(self.indexer(confirmations=2).run_once(), 0)
+        self.chain.mine(1)
+        self.assertEqual(self.indexer(confirmations=2).run_once(), 1)
+
+    def test_index_escrows_command(self):
+        """
+        Ensure the management command catches up to the head with --once.
+        """
+        self.create_escrow()
+        out = StringIO()
+        with override_settings(ETH_RPC_URL=self.server.url, ESCROW_FACTORY_ADDRESS=FACTORY):
+            call_command('index_escrows', '--once', stdout=out)
+        self.assertIn('applied=1', out.getvalue())
+        self.assertTrue(Escrow.objects.filter(address=ESCROW).exists())
+
+
+def make_escrow(index, **fields):
+    """
+    Creates an indexed escrow directly, at log position ``index``.
+    """
+    defaults = {
+        "address": f"0x{index + 1:040x}",
+        "buyer": BUYER,
+        "seller": SELLER,
+        "arbiter": ARBITER,
+        "token": TOKEN,
+        "amount": 10 ** 18,
+        "block_number": index // 2,
+        "log_index": index % 2,
+        "transaction_hash": "0x" + "0" * 64,
+    }
+    defaults.update(fields)
+    return Escrow.objects.create(**defaults)
+
+
+class FakeChainAPITestCase(APITestCase):
+    """
+    Points the shared RPC client at a fresh stub server for API tests.
+    """
+
+    def setUp(self):
+        self.server = FakeRPCServer().start()
+        self.addCleanup(self.server.stop)
+        self.chain = self.server.chain
+        get_token_metadata_service().cache.clear()
+        cache.clear()
+        override = override_settings(ETH_RPC_URL=self.server.url)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class EscrowListAPITests(FakeChainAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('escrow-list')
+
+    def test_lists_newest_first(self):
+        """
+        Ensure escrows are listed in reverse chain order with string amounts.
+        """
+        for i in range(3):
+            make_escrow(i)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row['address'] for row in response.data['results']],
+            [f"0x{i:040x}" for i in (3, 2, 1)],
+        )
+        self.assertEqual(response.data['results'][0]['amount'], str(10 ** 18))
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_walks_every_row_once(self):
+        """
+        Ensure following `next` links visits each escrow exactly once, including rows sharing a block.
+        """
+        for i in range(7):
+            make_escrow(i)
+        seen = []
+        url = f"{self.url}?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(row['address'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [f"0x{i:040x}" for i in range(7, 0, -1)])
+
+    def test_filters_by_participant_token_and_state(self):
+        """
+        Ensure list filters combine and accept mixed-case addresses and state names.
+        """
+        other = "0x" + "0f" * 20
+        make_escrow(0)
+        make_escrow(1, buyer=other)
+        make_escrow(2, buyer=other, state=EscrowState.DISPUTED)
+        make_escrow(3, token=other)
+
+        response = self.client.get(self.url, {'buyer': other.upper().replace('0X', '0x')})
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = self.client.get(self.url, {'buyer': other, 'state': 'disputed'})
+        self.assertEqual([row['state'] for row in response.data['results']], [EscrowState.DISPUTED])
+
+        response = self.client.get(self.url, {'token': other})
+        self.assertEqual(len(response.data['results']), 1)
+
+        response = self.client.get(self.url, {'seller': SELLER, 'state': EscrowState.AWAITING_PAYMENT})
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_rejects_invalid_filters_and_cursors(self):
+        """
+        Ensure malformed filters return 400 and malformed cursors return 404.
+        """
+        self.assertEqual(self.client.get(self.url, {'buyer': 'nope'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'state': 'LOST'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'cursor': '!!'}).status_code, status.HTTP_404_NOT_FOUND)
+
+
+def escrow_functions(buyer=BUYER, state=EscrowState.AWAITING_PAYMENT, amount=10 ** 18):
+    return {
+        "buyer()": ("address", buyer),
+        "seller()": ("address", SELLER),
+        "arbiter()": ("address", ARBITER),
+        "currentState()": ("uint8", state),
+        "token()": ("address", TOKEN),
+        "amount()": ("uint256", amount),
+    }
+
+
+class RPCClientTests(FakeChainTestCase):
+    def test_call_many_coalesces_calls_into_batches(self):
+        """
+        Ensure many eth_calls are sent as a few JSON-RPC batches over reused connections.
+        """
+        addresses = [f"0x{i:040x}" for i in range(1, 11)]
+        for address in addresses:
+            self.chain.add_contract(address, escrow_functions())
+        client = JSONRPCClient(self.server.url, max_batch_size=20, max_concurrency=2)
+        self.addCleanup(client.close)
+
+        escrows = read_escrows(addresses, client=client)
+
+        # 10 escrows x 6 getters in batches of 20
+        self.assertEqual(sorted(len(r) for r in self.server.requests), [20, 20, 20])
+        self.assertLessEqual(self.server.connections, 2)
+        self.assertEqual(escrows[addresses[0]]['buyer'], BUYER)
+        self.assertEqual(escrows[addresses[0]]['amount'], 10 ** 18)
+
+        read_escrows(addresses, client=client)
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_call_many_uses_multicall_when_configured(self):
+        """
+        Ensure calls are aggregated into one aggregate3 eth_call per chunk when Multicall is deployed.
+        """
+        multicall = "0x" + "ca" * 20
+        self.chain.add_multicall(multicall)
+        self.chain.add_contract(ESCROW, escrow_functions(state=EscrowState.DISPUTED))
+        client = JSONRPCClient(self.server.url, multicall_address=multicall)
+        self.addCleanup(client.close)
+
+        escrows = read_escrows([ESCROW, "0x" + "dd" * 20], client=client)
+
+        self.assertEqual(self.server.requests, [['eth_call']])
+        self.assertEqual(escrows[ESCROW]['state'], EscrowState.DISPUTED)
+        self.assertIsNone(escrows["0x" + "dd" * 20])
+
+    def test_concurrency_limit(self):
+        """
+        Ensure no more requests are in flight than the configured concurrency limit.
+        """
+        self.chain.add_contract(ESCROW, escrow_functions())
+        self.server.delay = 0.05
+        client = JSONRPCClient(self.server.url, max_batch_size=1, max_concurrency=3)
+        self.addCleanup(client.close)
+
+        client.call_many([(ESCROW, encode_call("buyer()"))] * 12)
+        self.assertEqual(self.server.max_in_flight, 3)
+
+    def test_reverted_calls_and_rpc_errors(self):
+        """
+        Ensure reverted calls come back as None and JSON-RPC errors raise RPCError.
+        """
+        self.assertEqual(self.client.call_many([(ESCROW, encode_call("buyer()"))]), [None])
+        with self.assertRaises(RPCError):
+            self.client.call("eth_unknownMethod")
+
+
+def token_functions(symbol="TKN", decimals=18):
+    return {"symbol()": ("string", symbol), "decimals()": ("uint8", decimals)}
+
+
+class TokenMetadataTests(FakeChainTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = TokenMetadataService(client=self.client, maxsize=2)
+
+    def test_falls_back_from_cache_to_database_to_rpc(self):
+        """
+        Ensure a miss is fetched over RPC once, persisted, and then served from memory.
+        """
+        self.chain.add_contract(TOKEN, token_functions())
+
+        self.assertEqual(self.service.get(TOKEN), {'symbol': 'TKN', 'decimals': 18})
+        self.assertTrue(TokenMetadata.objects.filter(address=TOKEN, symbol='TKN').exists())
+        self.assertEqual(self.service.get(TOKEN.upper().replace('0X', '0x'))['symbol'], 'TKN')
+
+        # A fresh process finds it in the database without RPC
+        other = TokenMetadataService(client=self.client)
+        self.server.requests.clear()
+        self.assertEqual(other.get(TOKEN)['decimals'], 18)
+        self.assertEqual(self.server.requests, [])
+
+        self.assertEqual(self.service.stats()['rpc_fetches'], 1)
+        self.assertEqual(self.service.stats()['cache_hits'], 1)
+        self.assertEqual(other.stats()['db_hits'], 1)
+
+    def test_batches_misses_and_bounds_cache(self):
+        """
+        Ensure several misses share one RPC batch and the LRU stays within its size.
+        """
+        tokens = [f"0x{i:040x}" for i in range(1, 4)]
+        for i, token in enumerate(tokens):
+            self.chain.add_contract(token, token_functions(symbol=f"T{i}"))
+
+        metadata = self.service.get_many(tokens)
+
+        self.assertEqual(self.server.requests, [['eth_call'] * 6])
+        self.assertEqual([metadata[t]['symbol'] for t in tokens], ['T0', 'T1', 'T2'])
+        self.assertEqual(len(self.service.cache), 2)
+
+    def test_unreadable_tokens_are_not_retried(self):
+        """
+        Ensure a contract without ERC20 metadata is remembered as missing in memory.
+        """
+        self.assertIsNone(self.service.get(TOKEN))
+        self.assertIsNone(self.service.get(TOKEN))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertFalse(TokenMetadata.objects.exists())
+
+    def test_bytes32_symbol(self):
+        """
+        Ensure tokens returning a bytes32 symbol are decoded.
+        """
+        self.chain.add_contract(TOKEN, {
+            "symbol()": ("uint256", int.from_bytes(b"MKR".ljust(32, b"\0"), "big")),
+            "decimals()": ("uint8", 18),
+        })
+        self.assertEqual(self.service.get(TOKEN)['symbol'], 'MKR')
+
+
+class TokenMetadataConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.server = FakeRPCServer().start()
+        self.addCleanup(self.server.stop)
+        self.client = JSONRPCClient(self.server.url)
+        self.addCleanup(self.client.close)
+        self.service = TokenMetadataService(client=self.client)
+        self.server.chain.add_contract(TOKEN, token_functions())
+
+    def test_concurrent_misses_are_coalesced(self):
+        """
+        Ensure threads missing on the same token wait for a single fetch.
+        """
+        self.server.delay = 0.2
+        results = []
+
+        def lookup():
+            results.append(self.service.get(TOKEN))
+            connection.close()
+
+        threads = [threading.Thread(target=lookup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(results, [{'symbol': 'TKN', 'decimals': 18}] * 4)
+        self.assertEqual(self.service.stats()['coalesced'], 3)
+
+
+class EscrowAPITokenMetadataTests(FakeChainAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.chain.add_contract(TOKEN, token_functions(symbol="USDC", decimals=6))
+
+    def test_list_embeds_token_metadata_with_one_fetch(self):
+        """
+        Ensure a page of escrows sharing a token triggers a single metadata fetch.
+        """
+        for i in range(5):
+            make_escrow(i)
+        response = self.client.get(reverse('escrow-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {row['token_metadata']['symbol'] for row in response.data['results']}, {'USDC'}
+        )
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_detail_embeds_token_metadata(self):
+        """
+        Ensure the detail endpoint resolves addresses case-insensitively and embeds metadata.
+        """
+        escrow = make_escrow(0)
+        response = self.client.get(reverse('escrow-detail', args=[escrow.address.upper().replace('0X', '0x')]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['address'], escrow.address)
+        self.assertEqual(response.data['token_metadata'], {'symbol': 'USDC', 'decimals': 6})
+
+        response = self.client.get(reverse('escrow-detail', args=["0x" + "00" * 20]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stats_endpoint_is_admin_only(self):
+        """
+        Ensure cache counters are exposed to staff users only.
+        """
+        url = reverse('token-metadata-stats')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        admin = get_user_model().objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('cache_hits', response.data)
+
+
+class EscrowAggregateTests(FakeChainTestCase):
+    def aggregates(self, address):
+        return {
+            (row.role, row.state): (row.count, row.total_amount, row.locked_amount)
+            for row in EscrowAggregate.objects.filter(address=address, count__gt=0)
+        }
+
+    def test_created_escrow_counts_for_each_participant(self):
+        """
+        Ensure a new escrow adds one to its buyer, seller and arbiter totals.
+        """
+        self.create_escrow(amount=100)
+        self.create_escrow(address="0x" + "e2" * 20, amount=50, arbiter=ZERO_ADDRESS)
+        EscrowIndexer(client=self.client, factory_address=FACTORY).run_once()
+
+        waiting = EscrowState.AWAITING_PAYMENT
+        self.assertEqual(self.aggregates(BUYER), {('buyer', waiting): (2, 150, 0)})
+        self.assertEqual(self.aggregates(SELLER), {('seller', waiting): (2, 150, 0)})
+        self.assertEqual(self.aggregates(ARBITER), {('arbiter', waiting): (1, 100, 0)})
+        self.assertFalse(EscrowAggregate.objects.filter(address=ZERO_ADDRESS).exists())
+
+    def test_transitions_move_counts_and_locked_value(self):
+        """
+        Ensure state changes move the escrow between states and track the value still locked.
+        """
+        self.create_escrow(amount=100)
+        self.chain.emit(ESCROW, "Deposited", buyer=BUYER, depositedAmount=100)
+        indexer = EscrowIndexer(client=self.client, factory_address=FACTORY)
+        indexer.run_once()
+        self.assertEqual(
+            self.aggregates(BUYER), {('buyer', EscrowState.AWAITING_DELIVERY): (1, 100, 100)}
+        )
+
+        self.chain.emit(ESCROW, "ItemShipped", seller=SELLER)
+        indexer.run_once()
+        self.assertEqual(self.aggregates(BUYER), {('buyer', EscrowState.COMPLETE): (1, 100, 100)})
+
+        self.chain.emit(ESCROW, "Released", seller=SELLER, releasedAmount=100)
+        indexer.run_once()
+        self.assertEqual(self.aggregates(BUYER), {('buyer', EscrowState.COMPLETE): (1, 100, 0)})
+        self.assertEqual(
+            EscrowAggregate.objects.get(
+                address=BUYER, state=EscrowState.AWAITING_PAYMENT
+            ).count,
+            0,
+        )
+
+
+class EscrowSummaryAPITests(FakeChainAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('escrow-summary')
+        self.chain.add_contract(TOKEN, token_functions(symbol="USDC", decimals=6))
+
+    def test_summarizes_roles_and_value_locked(self):
+        """
+        Ensure the summary reports counts per role and state and value locked per token.
+        """
+        record_created(make_escrow(0, amount=100, state=EscrowState.AWAITING_DELIVERY))
+        record_created(make_escrow(1, amount=40, state=EscrowState.DISPUTED))
+        record_created(make_escrow(2, amount=7, buyer=SELLER, seller=BUYER))
+
+        get_token_metadata_service().get(TOKEN)
+        # Token metadata is cached, leaving the single aggregate read
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'address': BUYER.upper().replace('0X', '0x')})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['address'], BUYER)
+        self.assertEqual(response.data['roles']['buyer'], {
+            'count': 2,
+            'by_state': {'AWAITING_DELIVERY': 1, 'DISPUTED': 1},
+            'value_locked': {TOKEN: '140'},
+        })
+        self.assertEqual(response.data['roles']['seller'], {
+            'count': 1, 'by_state': {'AWAITING_PAYMENT': 1}, 'value_locked': {},
+        })
+        self.assertEqual(response.data['roles']['arbiter']['count'], 0)
+        self.assertEqual(response.data['token_metadata'], {TOKEN: {'symbol': 'USDC', 'decimals': 6}})
+
+    def test_requires_valid_address(self):
+        """
+        Ensure a missing or malformed address is rejected.
+        """
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'address': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def delta(event_id, escrow=ESCROW, buyer=BUYER):
+    return {"id": event_id, "escrow": escrow, "buyer": buyer, "seller": SELLER, "arbiter": ARBITER}
+
+
+def parse_sse(chunk):
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().splitlines())
+    return fields.get('event'), json.loads(fields['data']) if 'data' in fields else None
+
+
+class EscrowEventHubTests(TestCase):
+    def test_publish_fans_out_to_matching_subscribers_once(self):
+        """
+        Ensure each delta is serialized once and only queued for matching subscribers.
+        """
+        hub = EscrowEventHub()
+        everyone = Subscription()
+        by_address = Subscription(addresses=[ESCROW])
+        by_participant = Subscription(participants=["0x" + "0f" * 20])
+        hub.subscribers.update({everyone, by_address, by_participant})
+
+        hub.publish(delta(1))
+        hub.publish(delta(2, escrow="0x" + "e2" * 20))
+
+        self.assertEqual(everyone.queue.qsize(), 2)
+        self.assertEqual(by_address.queue.qsize(), 1)
+        self.assertEqual(by_participant.queue.qsize(), 0)
+        self.assertIs(everyone.queue.get_nowait()[1], by_address.queue.get_nowait()[1])
+
+    def test_slow_subscriber_is_dropped_when_buffer_fills(self):
+        """
+        Ensure a subscriber whose buffer is full is disconnected instead of growing without bound.
+        """
+        hub = EscrowEventHub()
+        slow = Subscription(buffer_size=2)
+        hub.subscribers.add(slow)
+        for event_id in range(1, 4):
+            hub.publish(delta(event_id))
+
+        self.assertTrue(slow.overflowed)
+        self.assertNotIn(slow, hub.subscribers)
+        self.assertEqual(slow.queue.qsize(), 2)
+
+    async def test_cursor_is_set_before_subscribe_returns(self):
+        """
+        Ensure events indexed between subscribing and reading a backlog are still pushed live.
+        """
+        escrow = await sync_to_async(make_escrow)(0)
+        first = await EscrowEvent.objects.acreate(
+            escrow=escrow, name='EscrowCreated', state=EscrowState.AWAITING_PAYMENT,
+            block_number=0, log_index=0, transaction_hash='0x',
+        )
+        hub = EscrowEventHub(poll_interval=0.01)
+        subscription = Subscription()
+        await hub.subscribe(subscription)
+        try:
+            self.assertEqual(hub.cursor, first.id)
+            second = await EscrowEvent.objects.acreate(
+                escrow=escrow, name='Deposited', state=EscrowState.AWAITING_DELIVERY,
+                block_number=1, log_index=0, transaction_hash='0x',
+            )
+            event_id, _ = await asyncio.wait_for(subscription.queue.get(), 5)
+            self.assertEqual(event_id, second.id)
+        finally:
+            hub.unsubscribe(subscription)
+
+    async def test_poll_survives_a_failed_query(self):
+        """
+        Ensure an error reading events is logged and polling carries on delivering later events.
+        """
+        escrow = await sync_to_async(make_escrow)(0)
+        real_fetch_deltas = stream.fetch_deltas
+        failures = [DatabaseError('connection lost')]
+
+        async def fetch_deltas(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return await real_fetch_deltas(*args, **kwargs)
+
+        hub = EscrowEventHub(poll_interval=0.01)
+        subscription = Subscription()
+        with mock.patch('escrows.stream.fetch_deltas', fetch_deltas), \
+                self.assertLogs('escrows.stream', 'ERROR'):
+            await hub.subscribe(subscription)
+            try:
+                event = await EscrowEvent.objects.acreate(
+                    escrow=escrow, name='EscrowCreated', state=EscrowState.AWAITING_PAYMENT,
+                    block_number=0, log_index=0, transaction_hash='0x',
+                )
+                event_id, _ = await asyncio.wait_for(subscription.queue.get(), 5)
+                self.assertEqual(event_id, event.id)
+                self.assertEqual(failures, [])
+            finally:
+                hub.unsubscribe(subscription)
+
+
+@override_settings(ESCROW_STREAM={'POLL_INTERVAL': 0.01, 'HEARTBEAT': 5})
+class EscrowStreamAPITests(TestCase):
+    async def read_event(self, stream):
+        while True:
+            chunk = await asyncio.wait_for(anext(stream), 5)
+            if not chunk.startswith(b':'):
+                return parse_sse(chunk)
+
+    async def test_stream_replays_backlog_then_pushes_live_deltas(self):
+        """
+        Ensure a reconnecting client gets missed events, then new ones as they are indexed.
+        """
+        escrow = await sync_to_async(make_escrow)(0)
+        other = await sync_to_async(make_escrow)(1, buyer="0x" + "0f" * 20, seller="0x" + "0e" * 20)
+        for item in (escrow, other):
+            await EscrowEvent.objects.acreate(
+                escrow=item, name='EscrowCreated', state=EscrowState.AWAITING_PAYMENT,
+                block_number=item.block_number, log_index=item.log_index, transaction_hash='0x',
+            )
+
+        response = await self.async_client.get(
+            reverse('escrow-stream'), {'participant': BUYER}, headers={'Last-Event-ID': '0'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            name, data = await self.read_event(stream)
+            self.assertEqual((name, data['type'], data['escrow']), ('escrow', 'created', escrow.address))
+
+            await EscrowEvent.objects.acreate(
+                escrow=other, name='Deposited', state=EscrowState.AWAITING_DELIVERY,
+                block_number=10, log_index=0, transaction_hash='0x',
+            )
+            await EscrowEvent.objects.acreate(
+                escrow=escrow, name='Deposited', state=EscrowState.AWAITING_DELIVERY,
+                block_number=11, log_index=0, transaction_hash='0x',
+            )
+            name, data = await self.read_event(stream)
+            self.assertEqual(data['type'], 'state')
+            self.assertEqual(data['escrow'], escrow.address)
+            self.assertEqual(data['state'], EscrowState.AWAITING_DELIVERY)
+        finally:
+            await stream.aclose()
+
+    async def test_rejects_invalid_filters(self):
+        """
+        Ensure malformed filters are rejected before the stream opens.
+        """
+        response = await self.async_client.get(reverse('escrow-stream'), {'participant': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refused_under_wsgi(self):
+        """
+        Ensure the endless stream is refused rather than tying up a WSGI worker.
+        """
+        response = self.client.get(reverse('escrow-stream'))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+
+class EscrowExportTests(APITestCase):
+    def setUp(self):
+        server = self.server = FakeRPCServer().start()
+        self.addCleanup(server.stop)
+        rpc = JSONRPCClient(server.url)
+        self.addCleanup(rpc.close)
+
+        chain = server.chain
+        chain.emit(FACTORY, "EscrowCreated", escrowAddress=ESCROW, buyer=BUYER, seller=SELLER,
+                   arbiter=ARBITER, token=TOKEN, amount=10 ** 21)
+        chain.emit(ESCROW, "Deposited", buyer=BUYER, depositedAmount=10 ** 21)
+        chain.emit(ESCROW, "ItemShipped", seller=SELLER)
+        chain.emit(ESCROW, "Released", seller=SELLER, releasedAmount=10 ** 21)
+        EscrowIndexer(client=rpc, factory_address=FACTORY).run_once()
+
+        admin = get_user_model().objects.create_user('auditor', 'auditor@example.com', 'password', is_staff=True)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(admin).access_token}'}
+
+    def export(self, **params):
+        response = self.client.get(reverse('escrow-export'), params, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content)
+
+    def rows(self, **params):
+        return [json.loads(line) for line in self.export(**params).decode().splitlines()]
+
+    def test_exports_history_in_chain_order(self):
+        """
+        Ensure the export lists creation and money-moving events, oldest first, with block times.
+        """
+        rows = self.rows()
+        self.assertEqual([row['event'] for row in rows], ['EscrowCreated', 'Deposited', 'Released'])
+        self.assertEqual(rows[0]['args']['buyer'], BUYER)
+        self.assertEqual(rows[0]['amount'], str(10 ** 21))
+        self.assertEqual(rows[2]['state'], 'Complete')
+        self.assertEqual(rows[0]['block_timestamp'], '2023-11-14T22:13:32+00:00')
+
+    def test_filters(self):
+        """
+        Ensure block ranges, time ranges and event names narrow the export.
+        """
+        self.assertEqual([row['block_number'] for row in self.rows(from_block=2, to_block=3)], [2])
+        # Blocks are 12 seconds apart from 2023-11-14T22:13:20Z
+        self.assertEqual(
+            [row['event'] for row in self.rows(since='2023-11-14T22:13:40Z', until='2023-11-14T22:14:08Z')],
+            ['Deposited'],
+        )
+        self.assertEqual([row['event'] for row in self.rows(event='ItemShipped')], ['ItemShipped'])
+        self.assertEqual(self.rows(since='2023-11-15'), [])
+
+        response = self.client.get(reverse('escrow-export'), {'since': 'yesterday'}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', response.data)
+
+    def test_rejects_time_filters_over_events_without_timestamps(self):
+        """
+        Ensure time filters fail loudly rather than skip events indexed without a block time.
+        """
+        EscrowEvent.objects.filter(name='Deposited').update(block_timestamp=None)
+
+        response = self.client.get(reverse('escrow-export'), {'since': '2023-11-14'}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', response.data)
+        with self.assertRaisesMessage(CommandError, 'no block timestamp'):
+            call_command('export_escrow_history', '--until', '2024-01-01', stdout=StringIO())
+
+        # Block filters still reach them, and ranges without them can still be filtered by time
+        self.assertEqual([row['event'] for row in self.rows(from_block=2, to_block=2)], ['Deposited'])
+        self.assertEqual(len(self.rows(to_block=1, since='2023-11-14')), 1)
+
+    def test_backfills_missing_timestamps_from_the_node(self):
+        """
+        Ensure events indexed without a block time get one from the node, after which time filters work.
+        """
+        EscrowEvent.objects.update(block_timestamp=None)
+        response = self.client.get(reverse('escrow-export'), {'since': '2023-11-14'}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('backfill_block_timestamps', response.data['since'])
+
+        out = StringIO()
+        with override_settings(ETH_RPC_URL=self.server.url):
+            call_command('backfill_block_timestamps', '--batch-size', '2', stdout=out)
+        self.assertIn('updated=4', out.getvalue())
+        self.assertEqual(
+            [row['event'] for row in self.rows(since='2023-11-14T22:13:40Z', until='2023-11-14T22:14:08Z')],
+            ['Deposited'],
+        )
+
+    def test_gzipped_csv(self):
+        """
+        Ensure CSV exports have a header row and can be gzipped.
+        """
+        response = self.client.get(reverse('escrow-export'), {'type': 'csv', 'gzip': '1'}, **self.auth)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('escrow-history.csv.gz', response['Content-Disposition'])
+        rows = list(csv.DictReader(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()))
+        self.assertEqual([row['event'] for row in rows], ['EscrowCreated', 'Deposited', 'Released'])
+        self.assertEqual(json.loads(rows[1]['args'])['depositedAmount'], str(10 ** 21))
+
+    def test_admin_only(self):
+        """
+        Ensure only staff can export.
+        """
+        response = self.client.get(reverse('escrow-export'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_streams_one_chunk_per_batch(self):
+        """
+        Ensure rows are encoded and handed on a chunk at a time.
+        """
+        chunks = list(stream_export(export_queryset(), Encoder('ndjson'), chunk_size=1))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(chunks[-1], b'')
+
+    async def test_asgi_streams_async_iterator(self):
+        """
+        Ensure exports served through ASGI stream from an async iterator.
+        """
+        response = await self.async_client.get(reverse('escrow-export'), headers={
+            'Authorization': self.auth['HTTP_AUTHORIZATION'],
+        })
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def test_wsgi_streams_sync_iterator(self):
+        """
+        Ensure exports served through WSGI stream from a plain iterator.
+        """
+        response = self.client.get(reverse('escrow-export'), **self.auth)
+        self.assertFalse(response.is_async)
+
+    def test_command(self):
+        """
+        Ensure the management command writes the same export to stdout or a gzipped file.
+        """
+        out = StringIO()
+        call_command('export_escrow_history', '--event', 'Deposited,Released', stdout=out)
+        self.assertEqual([json.loads(line)['event'] for line in out.getvalue().splitlines()], ['Deposited', 'Released'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'history.csv.gz')
+            call_command('export_escrow_history', '--type', 'csv', '--gzip', '--output', path, '--to-block', '1')
+            with gzip.open(path, 'rt') as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 1)
+
+
+SPENDER = "0x" + "5b" * 20
+
+
+def erc20_functions(balances, allowances):
+    return {
+        "balanceOf(address)": ("uint256", lambda owner: balances.get(owner, 0)),
+        "allowance(address,address)": ("uint256", lambda owner, spender: allowances.get((owner, spender), 0)),
+    }
+
+
+class AllowanceServiceTests(FakeChainTestCase):
+    def setUp(self):
+        super().setUp()
+        self.balances = {BUYER: 5 * 10 ** 18}
+        self.allowances = {(BUYER, ESCROW): 10 ** 18}
+        self.chain.add_contract(TOKEN, erc20_functions(self.balances, self.allowances))
+        self.service = AllowanceService(client=self.client, head_ttl=60)
+
+    def test_reads_distinct_calls_in_one_batch(self):
+        """
+        Ensure triples sharing an owner read its balance once, all in one batch at one block.
+        """
+        self.chain.mine(7)
+        block, results = self.service.snapshot([
+            (TOKEN, BUYER, ESCROW),
+            (TOKEN, BUYER.upper().replace('0X', '0x'), SPENDER),
+            (TOKEN, BUYER, ESCROW),
+        ])
+        self.assertEqual(block, 7)
+        self.assertEqual([r['allowance'] for r in results], [10 ** 18, 0, 10 ** 18])
+        self.assertEqual({r['balance'] for r in results}, {5 * 10 ** 18})
+        self.assertEqual(self.server.requests, [['eth_blockNumber'], ['eth_call'] * 3])
+
+    def test_cached_until_the_head_moves(self):
+        """
+        Ensure repeated snapshots within a block cost no RPC and a new block is read afresh.
+        """
+        self.service.snapshot([(TOKEN, BUYER, ESCROW)])
+        self.server.requests.clear()
+        self.allowances[(BUYER, ESCROW)] = 0
+
+        _, results = self.service.snapshot([(TOKEN, BUYER, ESCROW)])
+        self.assertEqual(results[0]['allowance'], 10 ** 18)
+        self.assertEqual(self.server.requests, [])
+
+        self.chain.mine()
+        with mock.patch('escrows.allowances.time.monotonic', return_value=time.monotonic() + 61):
+            block, results = self.service.snapshot([(TOKEN, BUYER, ESCROW)])
+        self.assertEqual(block, 1)
+        self.assertEqual(results[0]['allowance'], 0)
+        self.assertEqual(self.service.stats()['cache_hits'], 2)
+
+    def test_reverting_token(self):
+        """
+        Ensure calls to a contract without ERC20 functions come back as None.
+        """
+        _, results = self.service.snapshot([(ESCROW, BUYER, SPENDER)])
+        self.assertIsNone(results[0]['allowance'])
+        self.assertIsNone(results[0]['balance'])
+
+
+class AllowanceSnapshotAPITests(FakeChainAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('escrow-allowances')
+        self.chain.add_contract(TOKEN, erc20_functions({BUYER: 3}, {(BUYER, ESCROW): 2}))
+
+    def test_snapshot(self):
+        """
+        Ensure allowances and balances are returned as strings, in request order.
+        """
+        response = self.client.post(self.url, {'items': [
+            {'token': TOKEN, 'owner': BUYER, 'spender': ESCROW},
+            {'token': TOKEN, 'owner': SELLER, 'spender': ESCROW},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['block'], 0)
+        self.assertEqual(
+            [(r['owner'], r['allowance'], r['balance']) for r in response.data['results']],
+            [(BUYER, '2', '3'), (SELLER, '0', '0')],
+        )
+
+    @override_settings(ESCROW_ALLOWANCES={'MAX_ITEMS': 1})
+    def test_rejects_invalid_requests(self):
+        """
+        Ensure malformed addresses, empty batches and oversized batches return 400.
+        """
+        item = {'token': TOKEN, 'owner': BUYER, 'spender': ESCROW}
+        for items in ([], [{**item, 'owner': 'nope'}], [item, item]):
+            response = self.client.post(self.url, {'items': items}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_node_down(self):
+        """
+        Ensure an unreachable node returns 503.
+        """
+        self.server.stop()
+        response = self.client.post(self.url, {'items': [{'token': TOKEN, 'owner': BUYER, 'spender': ESCROW}]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class EscrowConditionalGetTests(FakeChainAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.chain.add_contract(TOKEN, token_functions())
+        self.rpc = JSONRPCClient(self.server.url)
+        self.addCleanup(self.rpc.close)
+        self.other = "0x" + "e2" * 20
+        for address, buyer in ((ESCROW, BUYER), (self.other, SELLER)):
+            self.chain.emit(FACTORY, "EscrowCreated", escrowAddress=address, buyer=buyer, seller=SELLER,
+                            arbiter=ARBITER, token=TOKEN, amount=10 ** 18)
+        self.index()
+
+    def index(self):
+        EscrowIndexer(client=self.rpc, factory_address=FACTORY).run_once()
+
+    def test_detail_revalidates_without_serializing(self):
+        """
+        Ensure a matching If-None-Match gets 304 from the version queries alone, until the escrow changes.
+        """
+        url = reverse('escrow-detail', args=[ESCROW])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        self.chain.emit(ESCROW, "Deposited", buyer=BUYER, depositedAmount=10 ** 18)
+        self.index()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['state'], EscrowState.AWAITING_DELIVERY)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_serves_rendered_responses_from_cache(self):
+        """
+        Ensure an unchanged response is served from the cache without loading escrows.
+        """
+        url = reverse('escrow-list')
+        first = self.client.get(url)
+        requests = len(self.server.requests)
+        with self.assertNumQueries(1):
+            second = self.client.get(url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(len(self.server.requests), requests)
+
+    def test_failed_token_lookups_are_not_cached(self):
+        """
+        Ensure a response built while token metadata could not be fetched is neither cached nor revalidated.
+        """
+        url = reverse('escrow-detail', args=[ESCROW])
+        with mock.patch.object(JSONRPCClient, 'call_many', side_effect=RPCError('unavailable')), \
+                self.assertLogs('escrows.tokens', 'WARNING'):
+            response = self.client.get(url)
+        self.assertIsNone(response.data['token_metadata'])
+        self.assertFalse(response.has_header('ETag'))
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['token_metadata'], {'symbol': 'TKN', 'decimals': 18})
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_unreadable_tokens_are_cached(self):
+        """
+        Ensure metadata known to be missing does not keep a response out of the cache.
+        """
+        self.chain.contracts.clear()
+        response = self.client.get(reverse('escrow-detail', args=[ESCROW]))
+        self.assertIsNone(response.data['token_metadata'])
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_list_versions_follow_their_filters(self):
+        """
+        Ensure a change moves the ETags of lists that can contain the escrow, and only those.
+        """
+        url = reverse('escrow-list')
+        queries = [{}, {'buyer': BUYER}, {'buyer': SELLER}, {'state': 'AWAITING_PAYMENT'}, {'page_size': 1}]
+        before = [self.client.get(url, query)['ETag'] for query in queries]
+        self.assertEqual(len(set(before)), len(queries))
+
+        self.chain.emit(self.other, "Deposited", buyer=SELLER, depositedAmount=10 ** 18)
+        self.index()
+        after = [self.client.get(url, query)['ETag'] for query in queries]
+        self.assertEqual([b == a for b, a in zip(before, after)], [False, True, False, False, False])
+
+        response = self.client.get(url, {'state': 'AWAITING_PAYMENT'}, HTTP_IF_NONE_MATCH=before[3])
+        self.assertEqual([row['address'] for row in response.json()['results']], [ESCROW])
+
+    def test_unversioned_and_disabled(self):
+        """
+        Ensure escrows without indexed events, and a disabled cache, get no ETag.
+        """
+        self.assertFalse(self.client.get(reverse('escrow-detail', args=["0x" + "00" * 20])).has_header('ETag'))
+        with override_settings(ESCROW_RESPONSE_CACHE={'ENABLED': False}):
+            self.assertFalse(self.client.get(reverse('escrow-list')).has_header('ETag'))
+
+
+class EscrowReconcilerTests(FakeChainTestCase):
+    def setUp(self):
+        super().setUp()
+        self.states, self.balances = {}, {}
+        self.chain.add_contract(TOKEN, {
+            "balanceOf(address)": ("uint256", lambda owner: self.balances.get(owner, 0)),
+        })
+        self.addresses = [f"0x{i:040x}" for i in range(1, 5)]
+        for address in self.addresses:
+            self.create_escrow(address=address)
+            self.states[address] = EscrowState.AWAITING_PAYMENT
+        # The last escrow has no contract, e.g. on a pruned node
+        for address in self.addresses[:3]:
+            self.chain.add_contract(address, {
+                "currentState()": ("uint8", lambda address=address: self.states[address]),
+            })
+        EscrowIndexer(client=self.client, factory_address=FACTORY).run_once()
+
+    def reconciler(self, **kwargs):
+        return EscrowReconciler(client=self.client, **{'batch_size': 1, 'workers': 2, **kwargs})
+
+    def test_repairs_drift(self):
+        """
+        Ensure missed deposits and releases are repaired with the aggregates, and recorded.
+        """
+        paid, released, _, _ = self.addresses
+        self.states[paid] = EscrowState.AWAITING_DELIVERY
+        self.balances[paid] = 10 ** 21
+        # Shipped and released with neither log indexed
+        self.states[released] = EscrowState.COMPLETE
+        version = escrow_version(released)
+
+        stats = self.reconciler().run()
+
+        self.assertEqual(
+            {key: stats[key] for key in ('checked', 'repaired', 'unreadable', 'underfunded', 'batches')},
+            {'checked': 4, 'repaired': 2, 'unreadable': 1, 'underfunded': 0, 'batches': 4},
+        )
+        self.assertTrue(stats['complete'])
+        escrows = Escrow.objects.in_bulk([paid, released], field_name='address')
+        self.assertEqual(escrows[paid].state, EscrowState.AWAITING_DELIVERY)
+        self.assertEqual((escrows[released].state, escrows[released].released), (EscrowState.COMPLETE, True))
+        self.assertEqual(
+            EscrowRepair.objects.get(escrow=escrows[released]).changes,
+            {'state': [EscrowState.AWAITING_PAYMENT, EscrowState.COMPLETE], 'released': [False, True]},
+        )
+        self.assertNotEqual(escrow_version(released), version)
+
+        buyer = EscrowAggregate.objects.filter(address=BUYER, role='buyer')
+        self.assertEqual(buyer.get(state=EscrowState.AWAITING_DELIVERY).locked_amount, 10 ** 21)
+        self.assertEqual(buyer.get(state=EscrowState.COMPLETE).locked_amount, 0)
+        self.assertEqual(buyer.get(state=EscrowState.AWAITING_PAYMENT).count, 2)
+
+        # Each escrow costs one batch of two calls, and a second pass finds nothing
+        self.assertIn(['eth_call', 'eth_call'], self.server.requests)
+        self.assertEqual(self.reconciler(batch_size=10).run()['repaired'], 0)
+
+    def test_resumes_from_checkpoint(self):
+        """
+        Ensure an interrupted pass resumes after the last applied batch.
+        """
+        first = self.reconciler().run(max_batches=3)
+        self.assertEqual((first['checked'], first['complete']), (3, False))
+        self.assertEqual(IndexerCheckpoint.objects.get(name='escrow-reconciler').block_number, 3)
+
+        second = self.reconciler().run()
+        self.assertEqual((second['checked'], second['complete']), (1, True))
+        self.assertFalse(IndexerCheckpoint.objects.filter(name='escrow-reconciler').exists())
+
+        self.reconciler().run(max_batches=1)
+        self.assertEqual(self.reconciler().run(restart=True)['checked'], 4)
+
+    def test_skips_escrows_indexed_past_the_reading(self):
+        """
+        Ensure a reading older than the escrow's latest event does not undo it.
+        """
+        address = self.addresses[0]
+        self.chain.emit(address, "Deposited", buyer=BUYER, depositedAmount=10 ** 21)
+        EscrowIndexer(client=self.client, factory_address=FACTORY).run_once()
+
+        stats = dict.fromkeys(('checked', 'repaired', 'skipped', 'unreadable', 'underfunded', 'batches'), 0)
+        batch = [Escrow.objects.get(address=address)]
+        self.reconciler().apply(batch, [(EscrowState.AWAITING_PAYMENT, 0)], 4, stats)
+        self.assertEqual((stats['skipped'], stats['repaired']), (1, 0))
+        self.assertEqual(Escrow.objects.get(address=address).state, EscrowState.AWAITING_DELIVERY)
+
+    def test_command(self):
+        """
+        Ensure the command reports what it checked and repaired.
+        """
+        self.states[self.addresses[0]] = EscrowState.DISPUTED
+        out = StringIO()
+        with override_settings(ETH_RPC_URL=self.server.url), self.assertLogs('escrows.reconcile', 'WARNING'):
+            call_command('reconcile_escrows', '--batch-size', '2', '--rpc-budget', '1000', stdout=out)
+        self.assertIn('checked=4 repaired=1 skipped=0 unreadable=1 underfunded=1', out.getvalue())
+
+    def test_rate_limiter(self):
+        """
+        Ensure the RPC budget allows a one second burst and then paces callers.
+        """
+        now, slept = [0.0], []
+        limiter = RateLimiter(10, clock=lambda: now[0], sleep=slept.append)
+        limiter.acquire(10)
+        self.assertEqual(slept, [])
+        limiter.acquire(5)
+        self.assertEqual(slept, [0.5])
+        now[0] = 1.0
+        limiter.acquire(10)
+        self.assertEqual(slept, [0.5, 0.5])
@@ -0,0 +1,218 @@
+"""
+ERC20 token metadata (symbol and decimals) lookups.
+
+Lookups go through three layers: a bounded in-process LRU, the
+``TokenMetadata`` table, and finally batched ``symbol()``/``decimals()``
+calls over RPC. Concurrent misses for the same token share one fetch.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .abi import decode_result, encode_call, normalize_address
+from .models import TokenMetadata
+from .rpc import RPCError, get_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "CACHE_SIZE": 1024,
+}
+
+# Cached for tokens whose metadata could not be read, e.g. non-ERC20 contracts
+MISSING = object()
+
+
+def token_setting(name):
+    return getattr(settings, "TOKEN_METADATA", {}).get(name, DEFAULTS[name])
+
+
+class LRUCache:
+    """
+    A thread-safe mapping that evicts the least recently used key past ``maxsize``.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TokenMetadataService:
+    """
+    Resolves token addresses to ``{"symbol": ..., "decimals": ...}``.
+    """
+
+    def __init__(self, client=None, maxsize=None):
+        self._client = client
+        self.cache = LRUCache(maxsize or token_setting("CACHE_SIZE"))
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(("cache_hits", "db_hits", "rpc_fetches", "coalesced", "failures"), 0)
+
+    @property
+    def client(self):
+        return self._client or get_client()
+
+    def stats(self):
+        """
+        Returns a snapshot of the hit/miss counters and the cache size.
+        """
+        with self._lock:
+            return {**self._counters, "cache_size": len(self.cache)}
+
+    def get(self, address):
+        return self.get_many([address])[normalize_address(address)]
+
+    def is_unreadable(self, address):
+        """
+        Returns whether ``address`` is known to have no readable metadata, as
+        opposed to a lookup that failed and will be retried.
+        """
+        return self.cache.get(normalize_address(address)) is MISSING
+
+    def get_many(self, addresses):
+        """
+        Returns ``{address: metadata or None}`` for every address given.
+        """
+        addresses = {normalize_address(address) for address in addresses}
+        results, misses = {}, []
+        for address in addresses:
+            cached = self.cache.get(address)
+            if cached is None:
+                misses.append(address)
+            else:
+                results[address] = None if cached is MISSING else cached
+        self._count("cache_hits", len(addresses) - len(misses))
+        if not misses:
+            return results
+
+        # Claim the misses nobody else is fetching; wait on the rest
+        owned, waiting = {}, {}
+        with self._lock:
+            for address in misses:
+                if address in self._in_flight:
+                    waiting[address] = self._in_flight[address]
+                else:
+                    owned[address] = self._in_flight[address] = Future()
+            self._counters["coalesced"] += len(waiting)
+
+        if owned:
+            try:
+                fetched = self._load(list(owned))
+            except Exception as e:
+                for future in owned.values():
+                    future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for address in owned:
+                        self._in_flight.pop(address, None)
+            for address, future in owned.items():
+                future.set_result(fetched.get(address))
+                results[address] = fetched.get(address)
+
+        for address, future in waiting.items():
+            try:
+                results[address] = future.result()
+            except Exception:
+                results[address] = None
+        return results
+
+    def _load(self, addresses):
+        found = {
+            row.address: {"symbol": row.symbol, "decimals": row.decimals}
+            for row in TokenMetadata.objects.filter(address__in=addresses)
+        }
+        self._count("db_hits", len(found))
+
+        unreadable = []
+        missing = [address for address in addresses if address not in found]
+        if missing:
+            fetched = self._fetch(missing)
+            if fetched is not None:
+                found.update(fetched)
+                unreadable = [address for address in missing if address not in fetched]
+
+        for address, metadata in found.items():
+            self.cache.set(address, metadata)
+        for address in unreadable:
+            self.cache.set(address, MISSING)
+        return found
+
+    def _fetch(self, addresses):
+        self._count("rpc_fetches", len(addresses))
+        calls = []
+        for address in addresses:
+            calls += [(address, encode_call("symbol()")), (address, encode_call("decimals()"))]
+        try:
+            results = self.client.call_many(calls)
+        except RPCError:
+            # Returning None leaves these uncached so the next request retries
+            logger.warning("Could not fetch token metadata", exc_info=True)
+            self._count("failures", len(addresses))
+            return None
+
+        fetched = {}
+        for address, symbol, decimals in zip(addresses, results[::2], results[1::2]):
+            if symbol is None and decimals is None:
+                continue
+            try:
+                fetched[address] = {
+                    "symbol": decode_result(symbol, "string") if symbol else "",
+                    "decimals": decode_result(decimals, "uint8") if decimals else None,
+                }
+            except ValueError:
+                continue
+
+        self._count("failures", len(addresses) - len(fetched))
+        TokenMetadata.objects.bulk_create(
+            [TokenMetadata(address=address, **metadata) for address, metadata in fetched.items()],
+            ignore_conflicts=True,
+        )
+        return fetched
+
+    def _count(self, counter, amount=1):
+        if amount:
+            with self._lock:
+                self._counters[counter] += amount
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_token_metadata_service():
+    """
+    Returns the process-wide token metadata service.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TokenMetadataService()
+        return _service
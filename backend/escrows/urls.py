@@ -0,0 +1,21 @@
+from django.urls import path, re_path
+
+from .views import (
+    AllowanceSnapshotView,
+    EscrowDetailView,
+    EscrowExportView,
+    EscrowListView,
+    EscrowSummaryView,
+    TokenMetadataStatsView,
+    escrow_stream,
+)
+
+urlpatterns = [
+    path('', EscrowListView.as_view(), name='escrow-list'),
+    path('summary/', EscrowSummaryView.as_view(), name='escrow-summary'),
+    path('stream/', escrow_stream, name='escrow-stream'),
+    path('allowances/', AllowanceSnapshotView.as_view(), name='escrow-allowances'),
+    path('export/', EscrowExportView.as_view(), name='escrow-export'),
+    path('tokens/stats/', TokenMetadataStatsView.as_view(), name='token-metadata-stats'),
+    re_path(r'^(?P<address>0x[0-9a-fA-F]{40})/$', EscrowDetailView.as_view(), name='escrow-detail'),
+]
@@ -0,0 +1,246 @@
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import generics, status, views
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.response import Response
+
+from .abi import normalize_address
+from .allowances import get_allowance_service
+from .caching import ConditionalGetMixin, escrow_version, list_version
+from .export import FORMATS, Encoder, astream_export, export_queryset, parse_filters, stream_export
+from .models import Escrow, EscrowAggregate, EscrowState
+from .pagination import KeysetPagination
+from .serializers import AllowanceSnapshotSerializer, EscrowSerializer
+from .stream import Subscription, event_stream
+from .tokens import get_token_metadata_service
+
+
+def parse_address(value, field):
+    try:
+        return normalize_address(value)
+    except ValueError:
+        raise ValidationError({field: 'Enter a valid address.'})
+
+
+def parse_address_list(value, field):
+    return [parse_address(address.strip(), field) for address in value.split(',') if address.strip()]
+
+
+def served_through_asgi(request):
+    """
+    Returns whether ``request`` came through ASGI rather than WSGI.
+    """
+    # Every WSGI environ carries wsgi.input; an ASGI request's META never does
+    return 'wsgi.input' not in request.META
+
+
+def parse_state(value):
+    if value.isdigit() and int(value) in EscrowState.values:
+        return int(value)
+    try:
+        return EscrowState[value.upper()].value
+    except KeyError:
+        raise ValidationError({'state': 'Enter a valid escrow state.'})
+
+
+class TokenMetadataMixin:
+    """
+    Embeds token metadata in escrow responses, resolved in one batch per response.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        instance = args[0] if args else kwargs.get('instance')
+        escrows = instance if isinstance(instance, (list, tuple)) else [instance]
+        kwargs.setdefault('context', self.get_serializer_context())
+        service = get_token_metadata_service()
+        metadata = service.get_many({escrow.token for escrow in escrows if escrow is not None})
+        if any(value is None and not service.is_unreadable(token) for token, value in metadata.items()):
+            # A failed lookup; the next request should retry it rather than reuse this response
+            self.cacheable = False
+        kwargs['context']['token_metadata'] = metadata
+        return self.get_serializer_class()(*args, **kwargs)
+
+
+class EscrowListView(ConditionalGetMixin, TokenMetadataMixin, generics.ListAPIView):
+    """
+    API view listing indexed escrows, newest first.
+    Filter with ?buyer=, ?seller=, ?arbiter=, ?token= and ?state=.
+    Responses carry an ETag that changes when a matching escrow does.
+    """
+    serializer_class = EscrowSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [AllowAny]
+
+    address_filters = ('buyer', 'seller', 'arbiter', 'token')
+
+    def get_filters(self):
+        params = self.request.query_params
+        filters = {}
+        for field in self.address_filters:
+            if params.get(field):
+                filters[field] = parse_address(params[field], field)
+        if params.get('state'):
+            filters['state'] = parse_state(params['state'])
+        return filters
+
+    def get_queryset(self):
+        return Escrow.objects.filter(**self.get_filters())
+
+    def get_version(self):
+        return list_version(self.get_filters(), self.address_filters)
+
+
+class EscrowDetailView(ConditionalGetMixin, TokenMetadataMixin, generics.RetrieveAPIView):
+    """
+    API view for a single indexed escrow.
+    Responses carry an ETag that changes when the escrow does.
+    """
+    serializer_class = EscrowSerializer
+    permission_classes = [AllowAny]
+    queryset = Escrow.objects.all()
+    lookup_field = 'address'
+
+    def get_object(self):
+        self.kwargs['address'] = parse_address(self.kwargs['address'], 'address')
+        return super().get_object()
+
+    def get_version(self):
+        return escrow_version(parse_address(self.kwargs['address'], 'address'))
+
+
+class EscrowSummaryView(views.APIView):
+    """
+    API view returning one address's escrow counts per role and state, and the
+    value it has locked per token. Served from maintained aggregates in one
+    indexed read, however many escrows the address has.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        if not request.query_params.get('address'):
+            raise ValidationError({'address': 'This query parameter is required.'})
+        address = parse_address(request.query_params['address'], 'address')
+
+        roles = {
+            role: {'count': 0, 'by_state': {}, 'value_locked': {}}
+            for role in EscrowAggregate.Role.values
+        }
+        locked = {}
+        for aggregate in EscrowAggregate.objects.filter(address=address, count__gt=0):
+            summary = roles[aggregate.role]
+            state = EscrowState(aggregate.state).name
+            summary['count'] += aggregate.count
+            summary['by_state'][state] = summary['by_state'].get(state, 0) + aggregate.count
+            if aggregate.locked_amount:
+                locked.setdefault(aggregate.role, {}).setdefault(aggregate.token, 0)
+                locked[aggregate.role][aggregate.token] += aggregate.locked_amount
+
+        tokens = set()
+        for role, amounts in locked.items():
+            roles[role]['value_locked'] = {token: str(amount) for token, amount in amounts.items()}
+            tokens.update(amounts)
+
+        return Response(
+            {
+                'address': address,
+                'roles': roles,
+                'token_metadata': get_token_metadata_service().get_many(tokens) if tokens else {},
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class TokenMetadataStatsView(views.APIView):
+    """
+    API view exposing this process's token metadata cache counters.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_token_metadata_service().stats(), status=status.HTTP_200_OK)
+
+
+class AllowanceSnapshotView(views.APIView):
+    """
+    API view reading many ERC20 allowances and balances in one response, all
+    as of the same block. Values are strings, or null where the token call
+    reverted.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = AllowanceSnapshotSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        block, results = get_allowance_service().snapshot(
+            (item['token'], item['owner'], item['spender']) for item in serializer.validated_data['items']
+        )
+        for result in results:
+            for field in ('allowance', 'balance'):
+                if result[field] is not None:
+                    result[field] = str(result[field])
+        return Response({'block': block, 'results': results}, status=status.HTTP_200_OK)
+
+
+class EscrowExportView(views.APIView):
+    """
+    API view streaming the escrow event history as NDJSON or, with ?type=csv,
+    CSV. Filter with ?from_block=, ?to_block=, ?since=, ?until=, ?event= and
+    ?escrow=; add ?gzip=1 for a gzipped file.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        export_type = params.get('type', 'ndjson')
+        compress = params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        try:
+            queryset = export_queryset(**parse_filters(params))
+            encoder = Encoder(export_type, compress=compress)
+        except ValueError as e:
+            field, _, message = str(e).partition(': ')
+            raise ValidationError({field: message})
+
+        # ASGI reads a sync iterator into memory before sending it
+        if served_through_asgi(request):
+            content = astream_export(queryset, encoder)
+        else:
+            content = stream_export(queryset, encoder)
+
+        filename = f'escrow-history.{export_type}' + ('.gz' if compress else '')
+        response = StreamingHttpResponse(
+            content, content_type='application/gzip' if compress else FORMATS[export_type],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+async def escrow_stream(request):
+    """
+    Streams escrow deltas as server-sent events. Serve through ASGI.
+    Filter with ?address= and ?participant= (comma-separated); reconnecting
+    clients send Last-Event-ID to replay what they missed.
+    """
+    if not served_through_asgi(request):
+        # The stream never ends, so under WSGI it would hold a worker for good
+        return JsonResponse(
+            {'detail': 'The escrow stream is only served through ASGI.'}, status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+    try:
+        addresses = parse_address_list(request.GET.get('address', ''), 'address')
+        participants = parse_address_list(request.GET.get('participant', ''), 'participant')
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return JsonResponse({'last_event_id': ['Enter a valid event id.']}, status=status.HTTP_400_BAD_REQUEST)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    subscription = Subscription(addresses=addresses, participants=participants)
+    response = StreamingHttpResponse(
+        event_stream(subscription, last_event_id=last_event_id),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
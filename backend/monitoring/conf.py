@@ -0,0 +1,20 @@
+from django.conf import settings
+
+DEFAULTS = {
+    "METRICS_ENABLED": True,
+    # When set, /metrics requires "Authorization: Bearer <token>"
+    "METRICS_TOKEN": None,
+    # Share of requests profiled, from 0.0 to 1.0
+    "PROFILE_SAMPLE_RATE": 0.0,
+    # Requests carrying this header with a token from `profile_report --issue-token` are always profiled
+    "PROFILE_HEADER": "X-Profile-Token",
+    "PROFILE_TOKEN_MAX_AGE": 3600,
+    # Where profiles are written, one subdirectory per view
+    "PROFILE_DIR": "profiles",
+    # Profiles kept; the oldest are deleted beyond this
+    "PROFILE_MAX_FILES": 500,
+}
+
+
+def monitoring_setting(name):
+    return getattr(settings, "MONITORING", {}).get(name, DEFAULTS[name])
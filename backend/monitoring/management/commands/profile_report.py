@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.profiling import collapse, issue_token, load_stats, profile_dir
+
+SORT_KEYS = ("tottime", "cumulative", "ncalls")
+
+
+class Command(BaseCommand):
+    help = "Aggregates saved request profiles into a hot-function report or collapsed stacks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dir", default=None,
+            help="Profile directory (defaults to MONITORING['PROFILE_DIR']).",
+        )
+        parser.add_argument(
+            "--view", default=None,
+            help="Only include profiles of this URL name.",
+        )
+        parser.add_argument(
+            "--top", type=int, default=25,
+            help="Number of functions to list.",
+        )
+        parser.add_argument(
+            "--sort", choices=SORT_KEYS, default="tottime",
+            help="Order functions by own time, cumulative time or call count.",
+        )
+        parser.add_argument(
+            "--collapsed", default=None,
+            help="Also write collapsed stacks to this file, for flamegraph.pl or speedscope.",
+        )
+        parser.add_argument(
+            "--issue-token", action="store_true",
+            help="Print a header value that forces profiling, then exit.",
+        )
+
+    def handle(self, *args, **options):
+        if options["issue_token"]:
+            self.stdout.write(issue_token())
+            return
+
+        directory = options["dir"] or profile_dir()
+        stats, count = load_stats(directory, options["view"])
+        if stats is None:
+            raise CommandError(f"No profiles found in {directory}.")
+
+        self.stdout.write(f"{count} profiles, {stats.total_tt:.3f}s profiled")
+        stats.stream = self.stdout
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["top"])
+
+        if options["collapsed"]:
+            # Collapse from unstripped stats so same-named functions stay distinct
+            stats, _ = load_stats(directory, options["view"])
+            with open(options["collapsed"], "w") as f:
+                for line in collapse(stats):
+                    f.write(line + "\n")
+            self.stdout.write(f"Wrote collapsed stacks to {options['collapsed']}")
@@ -0,0 +1,225 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Counters and histograms live in a module-level registry and are updated
+under a per-metric lock; an observation is a dict lookup, a bisect and a
+few additions. Each process exports its own values, so scrape every
+worker (or run one worker per scrape target).
+
+``track()`` times a block of code, records it in a histogram and also
+adds it to the current request's breakdown, which ``MetricsMiddleware``
+reports per view.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            lines += self._samples()
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        return [f"{self.name}{self._labels(key)} {_number(value)}" for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        return [f"{self.name}{self._labels(key)} {_number(value)}" for key, value in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, **labels):
+        counts = self._values.get(self._key(labels))
+        return sum(counts[:-1]) if counts else 0
+
+    def sum(self, **labels):
+        counts = self._values.get(self._key(labels))
+        return counts[-1] if counts else 0
+
+    def _samples(self):
+        lines = []
+        for key, counts in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.setdefault(metric.name, metric)
+        return existing
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "Time to produce a response, by view.",
+    ("view", "method", "status"),
+)
+REQUEST_DB_QUERIES = histogram(
+    "http_request_db_queries", "Database queries per request, by view.", ("view",), COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = histogram(
+    "http_request_db_seconds", "Time spent in database queries per request, by view.", ("view",),
+)
+REQUEST_EXTERNAL_SECONDS = histogram(
+    "http_request_external_seconds",
+    "Time spent in tracked external calls per request, by view and kind.", ("view", "kind"),
+)
+EXTERNAL_SECONDS = histogram(
+    "external_call_duration_seconds", "Duration of tracked external calls.", ("kind", "operation"),
+)
+EXTERNAL_ERRORS = counter(
+    "external_call_errors_total", "Tracked external calls that raised.", ("kind", "operation"),
+)
+
+
+class RequestStats:
+    """
+    Per-request totals, collected while the request is handled.
+    """
+    __slots__ = ("db_queries", "db_seconds", "external")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.external = {}
+
+    def add_external(self, kind, seconds):
+        self.external[kind] = self.external.get(kind, 0.0) + seconds
+
+
+current_request = contextvars.ContextVar("current_request_stats", default=None)
+
+
+@contextmanager
+def track(kind, operation):
+    """
+    Times an external call such as ``track("rpc", "eth_call")``.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        EXTERNAL_ERRORS.inc(kind=kind, operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        EXTERNAL_SECONDS.observe(elapsed, kind=kind, operation=operation)
+        stats = current_request.get()
+        if stats is not None:
+            stats.add_external(kind, elapsed)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else f"{value:.1f}"
+    return str(value)
@@ -0,0 +1,106 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .conf import monitoring_setting
+from .metrics import (
+    REQUEST_DB_QUERIES,
+    REQUEST_DB_SECONDS,
+    REQUEST_EXTERNAL_SECONDS,
+    REQUEST_SECONDS,
+    RequestStats,
+    current_request,
+)
+
+
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """
+    Records latency per view, method and status, the database queries and
+    time each request spends, and time in tracked external calls.
+
+    Place it first in ``MIDDLEWARE`` so it times the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = monitoring_setting("METRICS_ENABLED")
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            # Queries run on sync_to_async threads, which see this context
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        view = view_label(request)
+        REQUEST_SECONDS.observe(elapsed, view=view, method=request.method, status=response.status_code)
+        REQUEST_DB_QUERIES.observe(stats.db_queries, view=view)
+        REQUEST_DB_SECONDS.observe(stats.db_seconds, view=view)
+        for kind, seconds in stats.external.items():
+            REQUEST_EXTERNAL_SECONDS.observe(seconds, view=view, kind=kind)
+
+
+class QueryTimer:
+    """
+    A database ``execute_wrapper`` adding each query to the current request's totals.
+    """
+    __slots__ = ()
+
+    def __call__(self, execute, sql, params, many, context):
+        stats = current_request.get()
+        if stats is None:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats.db_queries += 1
+            stats.db_seconds += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver timing queries on every connection.
+
+    Wrapping connections per request would miss queries that ASGI runs on
+    sync_to_async threads, which have connections of their own.
+    """
+    if not any(isinstance(wrapper, QueryTimer) for wrapper in connection.execute_wrappers):
+        # First, so execute_wrapper() blocks, which pop the last wrapper, leave it in place
+        connection.execute_wrappers.insert(0, QueryTimer())
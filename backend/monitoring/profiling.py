@@ -0,0 +1,199 @@
+"""
+Sampled cProfile capture of live requests.
+
+``ProfilingMiddleware`` profiles a random ``PROFILE_SAMPLE_RATE`` share of
+requests, plus any request carrying a valid signed ``PROFILE_HEADER``
+token, and writes one ``.prof`` file per request under
+``PROFILE_DIR/<view>/``. Only the newest ``PROFILE_MAX_FILES`` are kept.
+The ``profile_report`` command aggregates them into a hot-function table
+or collapsed stacks for flamegraph tools.
+
+cProfile only sees the thread it is enabled on. Requests served through
+ASGI are therefore not profiled, nor are async views under WSGI, which
+``async_to_sync`` runs on an event loop thread of their own. Password
+hashes run in the hashing pool's worker processes appear only as time
+spent waiting on a future.
+"""
+import cProfile
+import itertools
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+
+from .conf import monitoring_setting
+from .middleware import view_label
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = "monitoring.profiling"
+
+_sequence = itertools.count()
+
+
+def profile_dir():
+    return Path(settings.BASE_DIR) / monitoring_setting("PROFILE_DIR")
+
+
+def issue_token():
+    """
+    Returns a header value that makes requests profiled until it expires.
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def valid_token(value):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            value, max_age=monitoring_setting("PROFILE_TOKEN_MAX_AGE")
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def should_profile(request):
+    token = request.headers.get(monitoring_setting("PROFILE_HEADER"))
+    if token is not None:
+        return valid_token(token)
+    rate = monitoring_setting("PROFILE_SAMPLE_RATE")
+    return rate > 0 and random.random() < rate
+
+
+def _view_dir(view):
+    return re.sub(r"[^\w.-]", "_", view)
+
+
+def save_profile(profile, view, directory=None):
+    """
+    Writes ``profile`` under ``directory/<view>/`` and prunes old profiles.
+    """
+    directory = Path(directory or profile_dir())
+    target = directory / _view_dir(view)
+    target.mkdir(parents=True, exist_ok=True)
+    path = target / f"{time.time_ns()}-{os.getpid()}-{next(_sequence)}.prof"
+    profile.dump_stats(path)
+    rotate(directory, monitoring_setting("PROFILE_MAX_FILES"))
+    return path
+
+
+def rotate(directory, max_files):
+    files = sorted(Path(directory).glob("*/*.prof"), key=lambda path: path.name)
+    for path in files[:max(0, len(files) - max_files)]:
+        path.unlink(missing_ok=True)
+
+
+def load_stats(directory=None, view=None):
+    """
+    Merges every saved profile, or one view's, into a ``pstats.Stats``.
+    Returns ``(stats, number of profiles)``; ``stats`` is None if there are none.
+    """
+    directory = Path(directory or profile_dir())
+    pattern = f"{_view_dir(view)}/*.prof" if view else "*/*.prof"
+    files = sorted(directory.glob(pattern))
+    if not files:
+        return None, 0
+    stats = pstats.Stats(str(files[0]))
+    for path in files[1:]:
+        stats.add(str(path))
+    return stats, len(files)
+
+
+def collapse(stats, max_depth=64):
+    """
+    Converts profile data into collapsed stacks (``a;b;c microseconds``).
+
+    cProfile records caller/callee pairs rather than whole stacks, so time
+    is split between call paths in proportion to each caller's share of the
+    calls. The result is an approximation, but it is what flamegraph tools
+    expect as input.
+    """
+    entries = stats.stats
+    children = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    lines = {}
+
+    def walk(func, stack, budget):
+        _, _, tottime, cumtime, _ = entries[func]
+        stack = stack + (_label(func),)
+        share = budget / cumtime if cumtime else 0
+        own = tottime * share
+        if own > 0:
+            key = ";".join(stack)
+            lines[key] = lines.get(key, 0) + own
+        if len(stack) >= max_depth:
+            return
+        for child, edge_time in children.get(func, ()):
+            if _label(child) in stack:
+                continue  # recursion
+            walk(child, stack, edge_time * share)
+
+    # Functions called from frames entered before profiling started have
+    # callers with no entries of their own. Mutual recursion, such as
+    # Django's middleware chain, can leave the outermost frame with callers
+    # too; the function with the most cumulative time is then the root.
+    roots = [func for func, entry in entries.items() if not any(caller in entries for caller in entry[4])]
+    outermost = max(entries, key=lambda func: entries[func][3])
+    if sum(entries[root][3] for root in roots) < entries[outermost][3]:
+        roots.append(outermost)
+    for root in roots:
+        walk(root, (), entries[root][3])
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in sorted(lines.items()) if seconds >= 1e-6]
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{name} ({Path(filename).name}:{line})"
+
+
+class ProfilingMiddleware:
+    """
+    Profiles sampled or explicitly requested requests with cProfile.
+
+    Async requests are passed through untouched. Their views run on
+    sync_to_async threads, and the event loop thread interleaves other
+    requests, so a profile of either thread would misattribute the work.
+    Profiles of async views served through WSGI are discarded: the view
+    ran on another thread, so they would show little more than waiting.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        if not should_profile(request):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.disable()
+        match = getattr(request, "resolver_match", None)
+        if match is not None and iscoroutinefunction(match.func):
+            logger.debug("Not saving profile of async view %s", view_label(request))
+            return response
+        try:
+            save_profile(profile, view_label(request))
+        except OSError:
+            logger.warning("Could not save request profile", exc_info=True)
+        return response
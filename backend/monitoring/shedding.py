@@ -0,0 +1,230 @@
+"""
+Adaptive concurrency limiting and load shedding.
+
+``AdaptiveLimiter`` caps the requests a process works on at once. The cap
+follows observed latency with a gradient rule: it grows while recent
+latency stays within ``TOLERANCE`` times the long-run average, and shrinks
+in proportion as recent latency rises above that. When the database or
+mail server slows down, the cap falls. Excess requests are then refused at
+once instead of queueing in the worker until they time out.
+
+``LoadSheddingMiddleware`` admits each request by its URL name's priority
+class. A class may fill only its ``PRIORITIES`` share of the limit, so
+lower classes are shed first as the limit falls. A request that cannot be
+admitted waits up to ``QUEUE_TIMEOUT`` for a slot. At most ``MAX_QUEUE``
+wait at once. A request still not admitted gets an immediate 503 with
+``Retry-After``. Async requests are never queued.
+
+The current limit, requests in flight, queue depth and shed requests are
+exported on ``/metrics``.
+"""
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.http import JsonResponse
+
+from .metrics import counter, gauge
+from .middleware import view_label
+
+DEFAULTS = {
+    "ENABLED": True,
+    "INITIAL_LIMIT": 20,
+    "MIN_LIMIT": 4,
+    "MAX_LIMIT": 200,
+    # Weight of each new estimate in the limit, from 0.0 to 1.0
+    "SMOOTHING": 0.2,
+    # Recent latency may exceed the long-run average by this factor before the limit falls
+    "TOLERANCE": 1.5,
+    # Requests averaged into the long-run latency
+    "LONG_WINDOW": 600,
+    "MAX_QUEUE": 50,
+    # Seconds a request waits for a slot before it is shed
+    "QUEUE_TIMEOUT": 0.05,
+    # Share of the limit each priority class may use
+    "PRIORITIES": {"critical": 1.0, "default": 0.8, "low": 0.5},
+    # URL name -> priority class; others are "default"
+    "ROUTES": {},
+    # URL names that are never limited
+    "EXEMPT": ("metrics",),
+    "RETRY_AFTER": 1,
+}
+
+CONCURRENCY_LIMIT = gauge("concurrency_limit", "Requests this process currently works on at once, at most.")
+CONCURRENCY_IN_FLIGHT = gauge("concurrency_in_flight", "Requests being handled under the concurrency limit.")
+CONCURRENCY_QUEUE_DEPTH = gauge("concurrency_queue_depth", "Requests waiting for a concurrency slot.")
+REQUESTS_SHED = counter("http_requests_shed_total", "Requests refused with 503 by the limiter.", ("priority",))
+
+
+def shedding_setting(name):
+    return getattr(settings, "LOAD_SHEDDING", {}).get(name, DEFAULTS[name])
+
+
+class AdaptiveLimiter:
+    """
+    A concurrency limit adjusted from the latency of completed requests.
+    """
+
+    def __init__(self, initial_limit=None, min_limit=None, max_limit=None, smoothing=None,
+                 tolerance=None, long_window=None, max_queue=None):
+        def setting(value, name):
+            return shedding_setting(name) if value is None else value
+
+        self.min_limit = setting(min_limit, "MIN_LIMIT")
+        self.max_limit = setting(max_limit, "MAX_LIMIT")
+        self.limit = float(setting(initial_limit, "INITIAL_LIMIT"))
+        self.smoothing = setting(smoothing, "SMOOTHING")
+        self.tolerance = setting(tolerance, "TOLERANCE")
+        self.max_queue = setting(max_queue, "MAX_QUEUE")
+        self._long_alpha = 2 / (setting(long_window, "LONG_WINDOW") + 1)
+        self._long = None
+        self._short = None
+        self.in_flight = 0
+        self.queued = 0
+        self._condition = threading.Condition(threading.Lock())
+
+    def _admits(self, share):
+        return self.in_flight < max(1, int(self.limit * share))
+
+    def acquire(self, share=1.0, timeout=0.0):
+        """
+        Takes a slot if fewer than ``share`` of the limit are in use, waiting
+        up to ``timeout`` seconds for one. Returns whether it got one.
+        """
+        with self._condition:
+            if not self._admits(share):
+                if timeout <= 0 or self.queued >= self.max_queue:
+                    return False
+                deadline = time.monotonic() + timeout
+                self.queued += 1
+                try:
+                    while not self._admits(share):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        self._condition.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.in_flight += 1
+            return True
+
+    def release(self, latency):
+        """
+        Frees a slot taken by ``acquire`` for a request that took ``latency`` seconds.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._update(latency)
+            # Waiters have different shares, so any of them may now fit
+            self._condition.notify_all()
+
+    def _update(self, latency):
+        if self._long is None:
+            self._long = self._short = latency
+        self._short += (latency - self._short) * 0.5
+        self._long += (latency - self._long) * self._long_alpha
+        # Let the baseline come back down quickly once a slowdown is over
+        if self._long > 2 * self._short:
+            self._long *= 0.95
+
+        gradient = max(0.5, min(1.0, self.tolerance * self._long / max(self._short, 1e-9)))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        # Don't grow a limit the traffic isn't using
+        if new_limit > self.limit and self.in_flight < self.limit / 2:
+            return
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = min(self.max_limit, max(self.min_limit, new_limit))
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """
+    Returns the process-wide concurrency limiter.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AdaptiveLimiter()
+        return _limiter
+
+
+def _reset_limiter(setting, **kwargs):
+    global _limiter
+    if setting == "LOAD_SHEDDING":
+        with _limiter_lock:
+            _limiter = None
+
+
+setting_changed.connect(_reset_limiter, dispatch_uid="monitoring.shedding")
+
+
+def publish(limiter):
+    CONCURRENCY_LIMIT.set(int(limiter.limit))
+    CONCURRENCY_IN_FLIGHT.set(limiter.in_flight)
+    CONCURRENCY_QUEUE_DEPTH.set(limiter.queued)
+
+
+class LoadSheddingMiddleware:
+    """
+    Admits requests through the concurrency limiter by priority class and
+    answers the rest with 503.
+
+    Place it after ``MetricsMiddleware`` so shed requests are still counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(request)
+
+    async def __acall__(self, request):
+        # Waiting for a slot would block the event loop
+        request._shedding_timeout = 0
+        try:
+            return await self.get_response(request)
+        finally:
+            self.release(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not shedding_setting("ENABLED"):
+            return None
+        view = view_label(request)
+        if view in shedding_setting("EXEMPT"):
+            return None
+
+        priority = shedding_setting("ROUTES").get(view, "default")
+        share = shedding_setting("PRIORITIES")[priority]
+        timeout = getattr(request, "_shedding_timeout", shedding_setting("QUEUE_TIMEOUT"))
+        limiter = get_limiter()
+        admitted = limiter.acquire(share, timeout)
+        publish(limiter)
+        if not admitted:
+            REQUESTS_SHED.inc(priority=priority)
+            response = JsonResponse({"detail": "Server is overloaded, try again shortly."}, status=503)
+            response["Retry-After"] = str(shedding_setting("RETRY_AFTER"))
+            return response
+        request._shedding_slot = (limiter, time.perf_counter())
+        return None
+
+    def release(self, request):
+        slot = request.__dict__.pop("_shedding_slot", None)
+        if slot is not None:
+            limiter, start = slot
+            limiter.release(time.perf_counter() - start)
+            publish(limiter)
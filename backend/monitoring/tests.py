@@ -0,0 +1,286 @@
+import tempfile
+import threading
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .metrics import (
+    EXTERNAL_SECONDS,
+    REQUEST_DB_QUERIES,
+    REQUEST_SECONDS,
+    Counter,
+    Histogram,
+    RequestStats,
+    current_request,
+    track,
+)
+from .profiling import issue_token
+from .shedding import REQUESTS_SHED, AdaptiveLimiter, get_limiter
+
+
+class MetricTests(TestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        """
+        Ensure histograms render cumulative buckets, sum and count per label set.
+        """
+        histogram = Histogram('latency_seconds', 'Latency.', ('view',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, view='a')
+        histogram.observe(0.5, view='a')
+        histogram.observe(5, view='a')
+
+        self.assertEqual(histogram.render(), [
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{view="a",le="0.1"} 1',
+            'latency_seconds_bucket{view="a",le="1.0"} 2',
+            'latency_seconds_bucket{view="a",le="+Inf"} 3',
+            'latency_seconds_sum{view="a"} 5.55',
+            'latency_seconds_count{view="a"} 3',
+        ])
+
+    def test_counter_escapes_label_values(self):
+        """
+        Ensure label values are escaped as the exposition format requires.
+        """
+        counter = Counter('errors_total', 'Errors.', ('reason',))
+        counter.inc(reason='say "hi"')
+        counter.inc(2, reason='say "hi"')
+        self.assertEqual(counter.render()[-1], 'errors_total{reason="say \\"hi\\""} 3')
+
+    def test_track_adds_to_current_request(self):
+        """
+        Ensure tracked calls are recorded globally and in the active request's breakdown.
+        """
+        before = EXTERNAL_SECONDS.count(kind='rpc', operation='eth_call')
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            with track('rpc', 'eth_call'):
+                pass
+        finally:
+            current_request.reset(token)
+        self.assertEqual(EXTERNAL_SECONDS.count(kind='rpc', operation='eth_call'), before + 1)
+        self.assertIn('rpc', stats.external)
+
+
+class MetricsMiddlewareTests(TestCase):
+    def test_records_latency_and_queries_per_view(self):
+        """
+        Ensure each request is recorded under its URL name and status with its query count.
+        """
+        labels = {'view': 'escrow-list', 'method': 'GET', 'status': 200}
+        before = REQUEST_SECONDS.count(**labels)
+        queries_before = REQUEST_DB_QUERIES.sum(view='escrow-list')
+
+        self.assertEqual(self.client.get(reverse('escrow-list')).status_code, 200)
+
+        self.assertEqual(REQUEST_SECONDS.count(**labels), before + 1)
+        self.assertGreater(REQUEST_DB_QUERIES.sum(view='escrow-list'), queries_before)
+
+    async def test_records_queries_of_async_requests(self):
+        """
+        Ensure requests served through ASGI also record the queries their views run.
+        """
+        labels = {'view': 'escrow-list', 'method': 'GET', 'status': 200}
+        before = REQUEST_SECONDS.count(**labels)
+        queries_before = REQUEST_DB_QUERIES.sum(view='escrow-list')
+
+        self.assertEqual((await self.async_client.get(reverse('escrow-list'))).status_code, 200)
+
+        self.assertEqual(REQUEST_SECONDS.count(**labels), before + 1)
+        self.assertGreater(REQUEST_DB_QUERIES.sum(view='escrow-list'), queries_before)
+
+    def test_metrics_endpoint(self):
+        """
+        Ensure /metrics serves the Prometheus text format.
+        """
+        self.client.get('/no-such-page/')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('view="unmatched",method="GET",status="404"', body)
+
+    @override_settings(MONITORING={'METRICS_TOKEN': 'secret'})
+    def test_metrics_token(self):
+        """
+        Ensure a configured token is required to scrape metrics.
+        """
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = Path(directory.name)
+
+    def settings_for(self, **overrides):
+        return override_settings(MONITORING={'PROFILE_DIR': str(self.dir), **overrides})
+
+    def profiles(self, view='*'):
+        return sorted(self.dir.glob(f'{view}/*.prof'))
+
+    def test_samples_requests_per_view(self):
+        """
+        Ensure sampled requests are written as cProfile dumps under their view name.
+        """
+        with self.settings_for(PROFILE_SAMPLE_RATE=1.0):
+            self.client.get(reverse('escrow-list'))
+        self.assertEqual(len(self.profiles('escrow-list')), 1)
+
+        with self.settings_for(PROFILE_SAMPLE_RATE=0.0):
+            self.client.get(reverse('escrow-list'))
+        self.assertEqual(len(self.profiles()), 1)
+
+    def test_signed_header_forces_profiling(self):
+        """
+        Ensure only a validly signed header turns profiling on for a request.
+        """
+        with self.settings_for():
+            self.client.get(reverse('escrow-list'), HTTP_X_PROFILE_TOKEN='forged')
+            self.assertEqual(self.profiles(), [])
+            self.client.get(reverse('escrow-list'), HTTP_X_PROFILE_TOKEN=issue_token())
+        self.assertEqual(len(self.profiles('escrow-list')), 1)
+
+    def test_async_views_are_not_saved_under_wsgi(self):
+        """
+        Ensure async views, which run off the profiled thread under WSGI, leave no misleading profile.
+        """
+        with self.settings_for(PROFILE_SAMPLE_RATE=1.0):
+            self.client.get(reverse('verify-email'), {'token': 'invalid'})
+        self.assertEqual(self.profiles(), [])
+
+    def test_rotates_old_profiles(self):
+        """
+        Ensure only the newest PROFILE_MAX_FILES profiles are kept.
+        """
+        with self.settings_for(PROFILE_SAMPLE_RATE=1.0, PROFILE_MAX_FILES=2):
+            for _ in range(4):
+                self.client.get(reverse('escrow-list'))
+        self.assertEqual(len(self.profiles()), 2)
+
+    def test_profile_report(self):
+        """
+        Ensure the report lists hot functions and can write collapsed stacks.
+        """
+        with self.settings_for(PROFILE_SAMPLE_RATE=1.0):
+            self.client.get(reverse('escrow-list'))
+            self.client.get(reverse('metrics'))
+            out = StringIO()
+            collapsed = self.dir / 'stacks.txt'
+            call_command(
+                'profile_report', '--view', 'escrow-list', '--top', '5', '--collapsed', str(collapsed), stdout=out
+            )
+        self.assertIn('1 profiles', out.getvalue())
+        self.assertIn('tottime', out.getvalue())
+        lines = collapsed.read_text().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+
+class LoadSheddingTests(TestCase):
+    def limiter(self, **overrides):
+        options = dict(initial_limit=20, min_limit=4, max_limit=200, smoothing=0.2,
+                       tolerance=1.5, long_window=100, max_queue=10)
+        return AdaptiveLimiter(**{**options, **overrides})
+
+    def run_rounds(self, limiter, latency, rounds=30):
+        for _ in range(rounds):
+            slots = int(limiter.limit)
+            for _ in range(slots):
+                self.assertTrue(limiter.acquire())
+            for _ in range(slots):
+                limiter.release(latency)
+
+    def test_limit_follows_latency(self):
+        """
+        Ensure the limit grows while latency is steady, falls when it rises and recovers after.
+        """
+        limiter = self.limiter()
+        self.run_rounds(limiter, 0.01)
+        grown = limiter.limit
+        self.assertGreater(grown, 20)
+
+        for _ in range(int(limiter.limit)):
+            limiter.acquire()
+        for _ in range(20):
+            limiter.release(0.1)
+        self.assertLess(limiter.limit, grown / 2)
+        self.assertGreaterEqual(limiter.limit, 4)
+        for _ in range(limiter.in_flight):
+            limiter.release(0.1)
+
+        slowed = limiter.limit
+        self.run_rounds(limiter, 0.01)
+        self.assertGreater(limiter.limit, slowed)
+
+    def test_unused_limit_does_not_grow(self):
+        """
+        Ensure the limit stays put while traffic uses less than half of it.
+        """
+        limiter = self.limiter()
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release(0.01)
+        self.assertEqual(limiter.limit, 20)
+
+    def test_priority_shares(self):
+        """
+        Ensure a priority class can only fill its share of the limit.
+        """
+        limiter = self.limiter(initial_limit=10)
+        self.assertEqual([limiter.acquire(0.5) for _ in range(6)], [True] * 5 + [False])
+        self.assertTrue(limiter.acquire(1.0))
+
+    def test_queued_request_gets_freed_slot(self):
+        """
+        Ensure a request waits for a slot up to its timeout, unless the queue is full.
+        """
+        limiter = self.limiter(initial_limit=4)
+        for _ in range(4):
+            limiter.acquire()
+        self.assertFalse(limiter.acquire(timeout=0.01))
+        timer = threading.Timer(0.05, limiter.release, (0.01,))
+        timer.start()
+        self.assertTrue(limiter.acquire(timeout=5))
+        timer.join()
+        self.assertEqual(limiter.queued, 0)
+
+        full = self.limiter(initial_limit=4, max_queue=0)
+        for _ in range(4):
+            full.acquire()
+        self.assertFalse(full.acquire(timeout=5))
+
+    def test_middleware_sheds_low_priority_first(self):
+        """
+        Ensure low priority routes get a fast 503 first while critical and exempt ones get through.
+        """
+        shedding = {
+            'INITIAL_LIMIT': 2, 'MIN_LIMIT': 2, 'QUEUE_TIMEOUT': 0,
+            'ROUTES': {'register': 'low', 'token_obtain_pair': 'critical'},
+        }
+        with override_settings(LOAD_SHEDDING=shedding):
+            limiter = get_limiter()
+            self.assertTrue(limiter.acquire())
+            shed = REQUESTS_SHED.value(priority='low')
+
+            response = self.client.post(reverse('register'), {}, content_type='application/json')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            self.assertEqual(REQUESTS_SHED.value(priority='low'), shed + 1)
+
+            response = self.client.post(reverse('token_obtain_pair'), {}, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(limiter.in_flight, 1)
+
+            metrics = self.client.get(reverse('metrics')).content.decode()
+            self.assertIn('concurrency_limit 2', metrics)
+            self.assertIn('concurrency_in_flight 1', metrics)
+            self.assertIn('http_requests_shed_total{priority="low"}', metrics)
@@ -0,0 +1,18 @@
+import hmac
+
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .metrics import registry
+from .conf import monitoring_setting
+
+
+def metrics(request):
+    """
+    Serves this process's metrics in the Prometheus text format.
+    """
+    token = monitoring_setting("METRICS_TOKEN")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied, token):
+            return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")